@@ -1,16 +1,27 @@
-from cachetools import TTLCache
+from cachetools import TLRUCache
 from typing import Any
 from app.config import get_settings
 
 SET = get_settings()
 
-# Simple in-memory TTL cache. For Redis, replace with aioredis operations.
-cache = TTLCache(maxsize=4096, ttl=SET.CACHE_TTL_SECONDS)
+
+def _ttu(_key: str, value: tuple, now: float) -> float:
+    # Entries are stored as (ttl_seconds, value) so each key can carry its own TTL.
+    return now + value[0]
+
+
+# Process-local L1 cache. The shared Redis L2 lives in app/cache/redis_cache.py.
+cache = TLRUCache(maxsize=SET.CACHE_MAXSIZE, ttu=_ttu)
 
 
 def cache_get(key: str) -> Any | None:
-    return cache.get(key)
+    entry = cache.get(key)
+    return entry[1] if entry is not None else None
+
+
+def cache_set(key: str, value: Any, ttl: float | None = None):
+    cache[key] = (SET.CACHE_TTL_SECONDS if ttl is None else ttl, value)
 
 
-def cache_set(key: str, value: Any):
-    cache[key] = value
+def cache_delete(key: str):
+    cache.pop(key, None)
@@ -0,0 +1,43 @@
+"""
+Async Redis tier used as a shared L2 behind the process-local TTL cache.
+
+All uvicorn workers and replicas pointing at the same `REDIS_URL` share one
+keyspace, so a view result fetched by one worker is reused by the others.
+Values are opaque bytes; callers are responsible for (de)serialization.
+"""
+from __future__ import annotations
+from typing import Any, Optional
+
+KEY_PREFIX = "axess:"
+
+
+class RedisCache:
+    def __init__(self, client: Any, prefix: str = KEY_PREFIX):
+        # `client` is a `redis.asyncio.Redis` or anything exposing the same
+        # get/set/delete/aclose coroutines (e.g. an in-process fake in tests).
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, timeout: Optional[float] = None) -> "RedisCache":
+        try:
+            from redis import asyncio as aioredis
+        except ImportError as e:  # pragma: no cover - depends on the environment
+            raise RuntimeError(
+                "REDIS_URL is set but the 'redis' package is not installed "
+                "(pip install 'redis>=5.0')."
+            ) from e
+        # Socket timeouts so a hung server fails calls instead of holding them.
+        return cls(aioredis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout))
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+
+    async def delete(self, key: str):
+        await self.client.delete(self.prefix + key)
+
+    async def close(self):
+        await self.client.aclose()
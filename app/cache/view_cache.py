@@ -0,0 +1,198 @@
+"""
+Read-through cache for Aptos view calls.
+
+Results are keyed on the normalized view payload (function + type args + args)
+and stored in the process-local TTL cache (L1) with a per-function TTL taken
+from `Settings.VIEW_CACHE_TTLS`. When an L2 tier is attached (Redis, shared by
+all workers) it is consulted on L1 misses and written through on loads, with
+values stored as orjson bytes. Every L2 call gets `l2_timeout` seconds; errors
+and timeouts count as misses, and the write-through runs in the background so
+a miss never waits on Redis twice. Concurrent misses for the same key are coalesced
+so only one upstream call is in flight per key at any time.
+
+Entries remember the ledger version they were read at (when the loader
+reports one, see `get_or_load_versioned`), so callers can tell how fresh a
+hit is and the indexer can drop entries older than a write it has seen
+(`invalidate_before`). Reads pinned to a ledger version get their own keys.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+import orjson
+
+from app.cache.memory_cache import cache_delete, cache_get, cache_set
+from app.cache.redis_cache import RedisCache
+from app.config import get_settings
+from app.utils.tracing import span, tag
+
+SET = get_settings()
+logger = logging.getLogger(__name__)
+
+Loader = Callable[[Dict[str, Any]], Awaitable[Any]]
+# Returns (result, ledger version it was read at or None)
+VersionedLoader = Callable[[Dict[str, Any]], Awaitable[Tuple[Any, Optional[int]]]]
+
+
+def view_cache_key(payload: Dict[str, Any], ledger_version: Optional[int] = None) -> str:
+    """
+    Normalize a view payload into a stable cache key. Arguments are stringified
+    so `get_job(7)` and `get_job("7")` share an entry.
+    """
+    function = payload.get("function", "")
+    type_args = [str(a) for a in payload.get("type_arguments") or []]
+    args = [a if isinstance(a, (list, dict)) else str(a) for a in payload.get("arguments") or []]
+    key = "view|" + function + "|" + orjson.dumps([type_args, args], option=orjson.OPT_SORT_KEYS).decode()
+    return key if ledger_version is None else f"{key}@{ledger_version}"
+
+
+def view_function_name(function: str) -> str:
+    """`0xabc::escrow::get_job` -> `get_job`."""
+    return function.rsplit("::", 1)[-1]
+
+
+class ViewCache:
+    def __init__(
+        self,
+        ttls: Dict[str, int] | None = None,
+        default_ttl: int | None = None,
+        l2: RedisCache | None = None,
+        l2_timeout: float | None = None,
+    ):
+        self.ttls = dict(SET.VIEW_CACHE_TTLS if ttls is None else ttls)
+        self.default_ttl = SET.CACHE_TTL_SECONDS if default_ttl is None else default_ttl
+        self.l2 = l2
+        self.l2_timeout = SET.VIEW_CACHE_L2_TIMEOUT_MS / 1000 if l2_timeout is None else l2_timeout
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Background write-throughs, referenced until done.
+        self._l2_writes: Set[asyncio.Task] = set()
+        self.stats = {
+            "l1_hits": 0,
+            "l1_misses": 0,
+            "l2_hits": 0,
+            "l2_misses": 0,
+            "l2_errors": 0,
+            "l2_timeouts": 0,
+            "coalesced": 0,
+            "errors": 0,
+            "invalidations": 0,
+        }
+
+    def ttl_for(self, function: str) -> int:
+        if function in self.ttls:
+            return self.ttls[function]
+        return self.ttls.get(view_function_name(function), self.default_ttl)
+
+    async def get_or_load(self, payload: Dict[str, Any], loader: Loader) -> Any:
+        async def versioned(p: Dict[str, Any]) -> Tuple[Any, Optional[int]]:
+            return await loader(p), None
+
+        result, _ = await self.get_or_load_versioned(payload, versioned)
+        return result
+
+    async def get_or_load_versioned(
+        self,
+        payload: Dict[str, Any],
+        loader: VersionedLoader,
+        ledger_version: Optional[int] = None,
+    ) -> Tuple[Any, Optional[int]]:
+        """(result, ledger version it was read at); `ledger_version` keys a pinned read."""
+        key = view_cache_key(payload, ledger_version)
+        ttl = self.ttl_for(payload.get("function", ""))
+
+        if ttl > 0:
+            hit = cache_get(key)
+            if hit is not None:
+                self.stats["l1_hits"] += 1
+                tag(cache="l1")
+                return hit
+            self.stats["l1_misses"] += 1
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            tag(cache="coalesced")
+        else:
+            # The load runs in its own task so that a cancelled caller (client
+            # went away) does not cancel the fetch for everyone else.
+            task = asyncio.ensure_future(self._load(key, ttl, payload, loader))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._done(k, t))
+        return await asyncio.shield(task)
+
+    async def _load(
+        self, key: str, ttl: int, payload: Dict[str, Any], loader: VersionedLoader
+    ) -> Tuple[Any, Optional[int]]:
+        if ttl > 0 and self.l2 is not None:
+            with span("cache.l2"):
+                raw = await self._l2_get(key)
+            if raw is not None:
+                self.stats["l2_hits"] += 1
+                tag(cache="l2")
+                stored = orjson.loads(raw)
+                if isinstance(stored, dict) and "value" in stored:
+                    entry = (stored["value"], stored.get("ledger_version"))
+                else:
+                    entry = (stored, None)  # written before entries carried a version
+                cache_set(key, entry, ttl)
+                return entry
+            self.stats["l2_misses"] += 1
+
+        result, version = await loader(payload)
+        if ttl > 0 and result is not None:
+            cache_set(key, (result, version), ttl)
+            if self.l2 is not None:
+                write = asyncio.ensure_future(
+                    self._l2_set(key, orjson.dumps({"value": result, "ledger_version": version}), ttl)
+                )
+                self._l2_writes.add(write)
+                write.add_done_callback(self._l2_writes.discard)
+        return result, version
+
+    async def _l2_call(self, op: str, key: str, call: Awaitable[Any]) -> Any:
+        # A broken or hung L2 must never fail or stall a request: errors and
+        # timeouts are counted and reported as None (a miss).
+        try:
+            return await asyncio.wait_for(call, self.l2_timeout)
+        except asyncio.TimeoutError:
+            self.stats["l2_errors"] += 1
+            self.stats["l2_timeouts"] += 1
+            logger.warning("L2 cache %s timed out after %ss for %s", op, self.l2_timeout, key)
+        except Exception as e:
+            self.stats["l2_errors"] += 1
+            logger.warning("L2 cache %s failed for %s: %s", op, key, e)
+        return None
+
+    async def _l2_get(self, key: str) -> bytes | None:
+        return await self._l2_call("get", key, self.l2.get(key))
+
+    async def _l2_set(self, key: str, value: bytes, ttl: int):
+        await self._l2_call("set", key, self.l2.set(key, value, ttl))
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            # Also marks the exception as retrieved when every waiter went away.
+            self.stats["errors"] += 1
+
+    async def invalidate_before(self, payload: Dict[str, Any], ledger_version: int) -> bool:
+        """
+        Drop the (unpinned) entry for `payload` unless this worker knows it was
+        read at or after `ledger_version`. Returns whether it was dropped.
+        """
+        hit = cache_get(view_cache_key(payload))
+        if hit is not None and hit[1] is not None and hit[1] >= ledger_version:
+            return False
+        await self.invalidate(payload)
+        self.stats["invalidations"] += 1
+        return True
+
+    async def invalidate(self, payload: Dict[str, Any]):
+        key = view_cache_key(payload)
+        cache_delete(key)
+        if self.l2 is not None:
+            await self._l2_call("delete", key, self.l2.delete(key))
+
+
+view_cache = ViewCache()
@@ -1,49 +1,305 @@
 # File: app/clients/aptos.py
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Collection, Dict, List, Optional, Sequence
 import httpx
-from loguru import logger
 from app.config import get_settings
+from app.cache.view_cache import view_cache, view_function_name
+from app.clients.endpoints import NodeEndpoint
+from app.clients.ratelimit import PriorityTokenBucket
+from app.clients.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+from app.utils.fanout import is_overload_error
+from app.utils.metrics import aptos_view_duration
+from app.utils.tracing import span
+from app.utils.ledger import (
+    LedgerVersionUnavailable,
+    note_ledger_version,
+    parse_ledger_headers,
+    pinned_version,
+)
 
 SET = get_settings()
+logger = logging.getLogger(__name__)
 
 # We will keep this for later, but we will override it in the router for debugging
 MARKETPLACE_LISTING_TYPE = f"{SET.APTOS_MARKETPLACE_ADDRESS}::marketplace::Listing"
 
 
 class AptosClient:
-    def __init__(self, base_url: str | None = None):
-        self.base_url = base_url or SET.APTOS_NODE_URL
-        self.http = httpx.AsyncClient(base_url=self.base_url, timeout=10)
+    """
+    Fullnode REST client over one or more endpoints (APTOS_NODE_URLS).
+
+    Each call goes to the endpoint with the best latency/error score (see
+    NodeEndpoint). Overload failures are retried on another endpoint, and view
+    calls can be hedged: if the first node hasn't answered within its own
+    p`hedge_percentile` latency, the same call is sent to the next-best node
+    and the first success wins.
+
+    Every response's ledger version is recorded (`ledger_version` is the newest
+    seen from any node). `view` reports the version each result reflects to the
+    current request (see app/utils/ledger.py) and honours `pinned_ledger`.
+    """
+
+    def __init__(
+        self,
+        base_url: str | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+        http2: bool | None = None,
+        timeout: httpx.Timeout | None = None,
+        retry: RetryPolicy | None = None,
+        breaker_factory: Callable[[str], CircuitBreaker] | None = None,
+        base_urls: Sequence[str] | None = None,
+        hedge: bool | None = None,
+        limiter: PriorityTokenBucket | None = None,
+    ):
+        urls = list(base_urls or ([base_url] if base_url else SET.APTOS_NODE_URLS))
+        self.base_url = urls[0]
+        http2 = SET.APTOS_HTTP2 if http2 is None else http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError as e:  # pragma: no cover - depends on the environment
+                raise RuntimeError(
+                    "APTOS_HTTP2=true requires the 'h2' package (pip install 'httpx[http2]')."
+                ) from e
+        breaker_factory = breaker_factory or (
+            lambda url: CircuitBreaker(url, SET.APTOS_BREAKER_FAILURES, SET.APTOS_BREAKER_RESET_SECONDS)
+        )
+        self.endpoints = [
+            NodeEndpoint(
+                url,
+                httpx.AsyncClient(
+                    base_url=url,
+                    transport=transport,
+                    http2=http2,
+                    limits=httpx.Limits(
+                        max_connections=SET.APTOS_MAX_CONNECTIONS,
+                        max_keepalive_connections=SET.APTOS_MAX_KEEPALIVE_CONNECTIONS,
+                        keepalive_expiry=SET.APTOS_KEEPALIVE_EXPIRY_SECONDS,
+                    ),
+                    timeout=timeout or httpx.Timeout(
+                        SET.APTOS_READ_TIMEOUT_SECONDS,
+                        connect=SET.APTOS_CONNECT_TIMEOUT_SECONDS,
+                        pool=SET.APTOS_POOL_TIMEOUT_SECONDS,
+                    ),
+                ),
+                breaker_factory(url),
+                alpha=SET.APTOS_EWMA_ALPHA,
+            )
+            for url in urls
+        ]
+        self.retry = retry or RetryPolicy(
+            SET.APTOS_RETRY_ATTEMPTS, SET.APTOS_RETRY_BASE_DELAY_SECONDS, SET.APTOS_RETRY_MAX_DELAY_SECONDS
+        )
+        # Every attempt (retries and hedges included) spends a quota token.
+        self.limiter = limiter or PriorityTokenBucket(SET.APTOS_RATE_LIMIT_RPS, SET.APTOS_RATE_LIMIT_BURST)
+        self.hedge = SET.APTOS_HEDGE_ENABLED if hedge is None else hedge
+        self.hedge_percentile = SET.APTOS_HEDGE_PERCENTILE
+        self.hedge_min_delay = SET.APTOS_HEDGE_MIN_DELAY_MS / 1000
+        self.stats = {"requests": 0, "attempts": 0, "retries": 0, "errors": 0, "hedges": 0, "hedge_wins": 0}
+        self.ledger_version: Optional[int] = None
+        self.ledger_timestamp_usec: Optional[int] = None
+
+    def _pick(self, exclude: Collection[NodeEndpoint] = ()) -> Optional[NodeEndpoint]:
+        candidates = [e for e in self.endpoints if e not in exclude and e.breaker.available()]
+        return min(candidates, key=NodeEndpoint.score) if candidates else None
+
+    async def _attempt(self, endpoint: NodeEndpoint, method: str, url: str, **kwargs) -> httpx.Response:
+        await self.limiter.acquire()
+        endpoint.breaker.before_call()
+        self.stats["attempts"] += 1
+        endpoint.in_flight += 1
+        started = time.monotonic()
+        try:
+            r = await endpoint.http.request(method, url, **kwargs)
+            if r.status_code == 429 or r.status_code >= 500:
+                r.raise_for_status()
+        except asyncio.CancelledError:
+            # Lost a hedge race (or the caller went away): no verdict on the node.
+            endpoint.stats["cancelled"] += 1
+            endpoint.breaker.release()
+            raise
+        except Exception as e:
+            if is_overload_error(e):
+                endpoint.record_failure()
+                endpoint.breaker.on_failure()
+            else:
+                endpoint.breaker.release()
+            raise
+        finally:
+            endpoint.in_flight -= 1
+        endpoint.record_success(time.monotonic() - started)
+        endpoint.breaker.on_success()
+        self._note_ledger(endpoint, r)
+        return r
+
+    def _note_ledger(self, endpoint: NodeEndpoint, r: httpx.Response):
+        version, timestamp = parse_ledger_headers(r.headers)
+        if version is None:
+            return
+        endpoint.ledger_version = version
+        if self.ledger_version is None or version > self.ledger_version:
+            self.ledger_version = version
+            self.ledger_timestamp_usec = timestamp
+
+    async def _hedged(self, primary: NodeEndpoint, method: str, url: str, **kwargs) -> httpx.Response:
+        backup = self._pick(exclude=(primary,))
+        delay = primary.percentile(self.hedge_percentile)
+        if backup is None or delay is None:
+            return await self._attempt(primary, method, url, **kwargs)
+
+        first = asyncio.ensure_future(self._attempt(primary, method, url, **kwargs))
+        try:
+            done, _ = await asyncio.wait({first}, timeout=max(delay, self.hedge_min_delay))
+        except asyncio.CancelledError:
+            # asyncio.wait doesn't cancel what it waits on: settle the attempt
+            # here or it keeps its rate-limit token, in-flight slot and probe.
+            first.cancel()
+            await asyncio.gather(first, return_exceptions=True)
+            raise
+        if done:
+            return first.result()
+
+        self.stats["hedges"] += 1
+        backup.stats["hedges"] += 1
+        second = asyncio.ensure_future(self._attempt(backup, method, url, **kwargs))
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.stats["hedge_wins"] += 1
+                            backup.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            # Settle the loser so its in-flight count and breaker probe are released.
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _request(self, method: str, url: str, hedge: bool = False, **kwargs) -> httpx.Response:
+        """
+        One read call. Overload failures (429/5xx, timeouts, connection errors)
+        are retried with jittered backoff, preferring an endpoint not tried yet,
+        and counted by that endpoint's circuit breaker. When every endpoint's
+        breaker is open this raises CircuitOpenError without calling a node.
+        Every call this client makes is a read, so all are retryable.
+        Other statuses (e.g. 404) are returned for the caller to handle.
+        """
+        self.stats["requests"] += 1
+        endpoint = self._pick()
+        if endpoint is None:
+            raise CircuitOpenError("aptos", min(e.breaker.retry_after() for e in self.endpoints))
+        tried: List[NodeEndpoint] = []
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                if hedge and self.hedge and len(self.endpoints) > 1:
+                    return await self._hedged(endpoint, method, url, **kwargs)
+                return await self._attempt(endpoint, method, url, **kwargs)
+            except Exception as e:
+                tried.append(endpoint)
+                retry_on = (
+                    self._pick(exclude=tried) or self._pick()
+                    if is_overload_error(e) and attempt < self.retry.attempts
+                    else None
+                )
+                if retry_on is None:
+                    self.stats["errors"] += 1
+                    raise
+                delay = self.retry.delay(attempt)
+                logger.warning(
+                    "Aptos %s %s failed on %s (%r); retry %s on %s in %.2fs",
+                    method, url, endpoint.url, e, attempt, retry_on.url, delay,
+                )
+                self.stats["retries"] += 1
+                endpoint = retry_on
+                await asyncio.sleep(delay)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "ledger_version": self.ledger_version,
+            "ledger_timestamp_usec": self.ledger_timestamp_usec,
+            "rate_limit": self.limiter.snapshot(),
+            "endpoints": [e.snapshot() for e in self.endpoints],
+        }
 
     async def get_account_resources(self, account: str) -> List[Dict[str, Any]]:
         url = f"/accounts/{account}/resources"
-        r = await self.http.get(url)
+        r = await self._request("GET", url)
         r.raise_for_status()
         return r.json()
 
     async def get_resource(self, account: str, typ: str) -> Optional[Dict[str, Any]]:
         url = f"/accounts/{account}/resource/{typ}"
-
-        # --- THIS IS THE NEW, CRITICAL DEBUGGING LINE ---
-        print(f"\n[!!!] MAKING REQUEST TO APTOS NODE:")
-        print(f"[!!!] URL: {self.base_url}{url}\n")
-        # --- END OF NEW DEBUGGING LINE ---
-
-        r = await self.http.get(url)
+        logger.debug("GET %s%s", self.base_url, url)
+        r = await self._request("GET", url)
         if r.status_code == 404:
             return None
         r.raise_for_status()
         return r.json()
 
-    async def view(self, payload: Dict[str, Any]) -> Any:
-        # Aptos view functions endpoint
-        r = await self.http.post("/view", json=payload)
+    async def get_events(
+        self,
+        account: str,
+        event_handle: str,
+        field_name: str,
+        start: int = 0,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        # Events from an EventHandle field, ordered by sequence number.
+        url = f"/accounts/{account}/events/{event_handle}/{field_name}"
+        r = await self._request("GET", url, params={"start": start, "limit": limit})
         r.raise_for_status()
+        note_ledger_version(parse_ledger_headers(r.headers)[0])
         return r.json()
 
+    async def view(self, payload: Dict[str, Any], cache: bool = True) -> Any:
+        # Identical concurrent calls are coalesced and results cached per function TTL.
+        # Inside `pinned_ledger(v)` the call is made (and cached) at ledger version v.
+        pinned = pinned_version()
+        with span("view." + view_function_name(payload.get("function", ""))):
+            if not cache:
+                result, version = await self._view_at(payload, pinned)
+            else:
+                result, version = await view_cache.get_or_load_versioned(
+                    payload, lambda p: self._view_at(p, pinned), ledger_version=pinned
+                )
+        note_ledger_version(version)
+        return result
+
+    async def _view_at(self, payload: Dict[str, Any], ledger_version: Optional[int] = None):
+        """(result, ledger version it reflects) from the Aptos view functions endpoint."""
+        params = {"ledger_version": ledger_version} if ledger_version is not None else None
+        function = view_function_name(payload.get("function", ""))
+        started = time.perf_counter()
+        try:
+            with span("aptos"):
+                r = await self._request("POST", "/view", hedge=True, json=payload, params=params)
+            if ledger_version is not None and r.status_code in (404, 410):
+                # Pruned (410) or not reached yet by this node (404)
+                raise LedgerVersionUnavailable(ledger_version, r.status_code)
+            r.raise_for_status()
+        except Exception:
+            aptos_view_duration.observe(time.perf_counter() - started, function, "error")
+            raise
+        aptos_view_duration.observe(time.perf_counter() - started, function, "ok")
+        if ledger_version is not None:
+            return r.json(), ledger_version
+        return r.json(), parse_ledger_headers(r.headers)[0]
+
     async def close(self):
-        await self.http.aclose()
+        for endpoint in self.endpoints:
+            await endpoint.http.aclose()
 
 
 aptos_client = AptosClient()
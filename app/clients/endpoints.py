@@ -0,0 +1,79 @@
+"""
+Per-fullnode health tracking for latency-aware routing.
+
+Each `NodeEndpoint` owns its httpx client and circuit breaker and keeps an
+EWMA of successful-call latency and of the error rate, plus a small window of
+recent latencies for percentile-based hedging. `score()` is what the client
+minimizes when picking a node: endpoints with no samples yet score 0 so they
+get tried, in-flight calls count against a node (so a burst spreads out), and
+errors inflate the score sharply. The last ledger version the node reported
+is kept too, which shows how far a node lags the others.
+"""
+from __future__ import annotations
+import math
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+import httpx
+
+from app.clients.resilience import CircuitBreaker
+
+
+class NodeEndpoint:
+    def __init__(
+        self,
+        url: str,
+        http: httpx.AsyncClient,
+        breaker: CircuitBreaker,
+        alpha: float = 0.2,
+        window: int = 128,
+    ):
+        self.url = url
+        self.http = http
+        self.breaker = breaker
+        self.alpha = alpha
+        self.ewma_latency: Optional[float] = None  # seconds, successful calls only
+        self.ewma_error = 0.0
+        self.in_flight = 0
+        self.ledger_version: Optional[int] = None
+        self._recent: Deque[float] = deque(maxlen=window)
+        self.stats = {"requests": 0, "errors": 0, "cancelled": 0, "hedges": 0, "hedge_wins": 0}
+
+    def record_success(self, latency: float):
+        self.stats["requests"] += 1
+        self._recent.append(latency)
+        if self.ewma_latency is None:
+            self.ewma_latency = latency
+        else:
+            self.ewma_latency += self.alpha * (latency - self.ewma_latency)
+        self.ewma_error *= 1 - self.alpha
+
+    def record_failure(self):
+        self.stats["requests"] += 1
+        self.stats["errors"] += 1
+        self.ewma_error += self.alpha * (1 - self.ewma_error)
+
+    def score(self) -> float:
+        if self.ewma_latency is None:
+            return 0.0
+        return self.ewma_latency * (1 + self.in_flight) * (1 + 10 * self.ewma_error)
+
+    def percentile(self, p: float, min_samples: int = 10) -> Optional[float]:
+        if len(self._recent) < min_samples:
+            return None
+        ordered = sorted(self._recent)
+        return ordered[min(len(ordered) - 1, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50, p99 = self.percentile(50, 1), self.percentile(99, 1)
+        return {
+            "url": self.url,
+            "ewma_latency_ms": round(self.ewma_latency * 1000, 2) if self.ewma_latency is not None else None,
+            "ewma_error_rate": round(self.ewma_error, 4),
+            "p50_ms": round(p50 * 1000, 2) if p50 is not None else None,
+            "p99_ms": round(p99 * 1000, 2) if p99 is not None else None,
+            "in_flight": self.in_flight,
+            "ledger_version": self.ledger_version,
+            **self.stats,
+            "breaker": self.breaker.snapshot(),
+        }
@@ -0,0 +1,126 @@
+"""
+Client-side token bucket with priority classes for fullnode calls.
+
+Fullnodes enforce request quotas, so every HTTP attempt the AptosClient makes
+takes a token (`rate` per second, bursts up to `burst`). When the bucket is
+empty, callers queue per priority class and are released strictly in class
+order as tokens refill: user-facing calls ("interactive") go first, bulk work
+(listing fan-outs, the indexer, WS-side validation) absorbs the throttling.
+
+The class is taken from a context variable, so code sets it once around a
+unit of work and every view call underneath - including tasks it spawns -
+inherits it:
+
+    with call_priority(BULK):
+        await fanout.map(...)
+"""
+from __future__ import annotations
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, Optional
+
+INTERACTIVE = "interactive"
+NORMAL = "normal"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, NORMAL, BULK)  # highest first
+
+_priority: ContextVar[str] = ContextVar("aptos_call_priority", default=NORMAL)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+@contextmanager
+def call_priority(priority: str) -> Iterator[None]:
+    if priority not in PRIORITIES:
+        raise ValueError(f"Unknown priority class: {priority!r}")
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class PriorityTokenBucket:
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        # rate <= 0 disables limiting.
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.burst
+        self._updated = time.monotonic()
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {p: deque() for p in PRIORITIES}
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.stats: Dict[str, Dict[str, float]] = {
+            p: {"acquired": 0, "queued": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0} for p in PRIORITIES
+        }
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _has_waiters(self) -> bool:
+        return any(self._waiters[p] for p in PRIORITIES)
+
+    async def acquire(self, priority: Optional[str] = None):
+        if self.rate <= 0:
+            return
+        priority = priority or current_priority()
+        stats = self.stats[priority]
+        self._refill()
+        if self.tokens >= 1 and not self._has_waiters():
+            self.tokens -= 1
+            stats["acquired"] += 1
+            return
+
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[priority].append(waiter)
+        stats["queued"] += 1
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.tokens += 1  # granted as we were cancelled: give the token back
+            else:
+                try:
+                    self._waiters[priority].remove(waiter)
+                except ValueError:
+                    pass  # already popped (and skipped) by the dispatcher
+            raise
+        waited = (time.monotonic() - started) * 1000
+        stats["acquired"] += 1
+        stats["wait_ms_total"] += waited
+        stats["wait_ms_max"] = max(stats["wait_ms_max"], waited)
+
+    async def _dispatch(self):
+        while self._has_waiters():
+            self._refill()
+            while self.tokens >= 1:
+                waiter = next((self._waiters[p].popleft() for p in PRIORITIES if self._waiters[p]), None)
+                if waiter is None:
+                    return
+                if not waiter.done():
+                    self.tokens -= 1
+                    waiter.set_result(None)
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def snapshot(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"rate": self.rate, "burst": self.burst, "tokens": round(self.tokens, 2)}
+        for p in PRIORITIES:
+            s = self.stats[p]
+            waited = s["queued"]
+            out[p] = {
+                "acquired": s["acquired"],
+                "queued": waited,
+                "waiting": len(self._waiters[p]),
+                "wait_ms_avg": round(s["wait_ms_total"] / waited, 2) if waited else 0.0,
+                "wait_ms_max": round(s["wait_ms_max"], 2),
+            }
+        return out
@@ -0,0 +1,99 @@
+"""
+Retry and circuit-breaking primitives for upstream (fullnode) calls.
+
+`RetryPolicy` spaces attempts with "full jitter" exponential backoff so a
+fleet of workers retrying after the same blip doesn't hit the node in
+lockstep. `CircuitBreaker` opens after `failure_threshold` consecutive
+overload failures (429/5xx, timeouts, connection errors - see
+`is_overload_error`) and then fails fast with `CircuitOpenError` for
+`reset_timeout` seconds, after which one probe call is let through
+(half-open): success closes the circuit, failure re-opens it.
+"""
+from __future__ import annotations
+import random
+import time
+from typing import Any, Dict, Optional
+
+
+class CircuitOpenError(RuntimeError):
+    """The upstream is considered unhealthy; the call was not attempted."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit is open; retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class RetryPolicy:
+    def __init__(self, attempts: int = 3, base_delay: float = 0.1, max_delay: float = 2.0):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, rng: Optional[random.Random] = None) -> float:
+        """Sleep before retry number `attempt` (1-based): uniform in [0, min(max, base * 2^(attempt-1))]."""
+        cap = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return (rng or random).uniform(0, cap)
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self.stats = {"opened": 0, "rejected": 0, "successes": 0, "failures": 0}
+
+    def available(self) -> bool:
+        """Whether before_call() would let a call through right now (no side effects)."""
+        if self.state == self.OPEN:
+            return time.monotonic() >= self.opened_at + self.reset_timeout
+        if self.state == self.HALF_OPEN:
+            return not self._probe_in_flight
+        return True
+
+    def retry_after(self) -> float:
+        if self.state == self.OPEN:
+            return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+        return 0.0
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go out now."""
+        if self.state == self.OPEN:
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(self.name, remaining)
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(self.name, self.reset_timeout)
+            self._probe_in_flight = True
+
+    def on_success(self):
+        self.stats["successes"] += 1
+        self.failures = 0
+        self._probe_in_flight = False
+        self.state = self.CLOSED
+
+    def on_failure(self):
+        self.stats["failures"] += 1
+        self._probe_in_flight = False
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.stats["opened"] += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """The call ended in a way that says nothing about node health (e.g. a client-side bug)."""
+        self._probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures, **self.stats}
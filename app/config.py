@@ -1,19 +1,184 @@
 from pydantic import BaseModel
 from functools import lru_cache
+from typing import Dict, List, Tuple
 import os
 
 
+def _parse_ttls(raw: str) -> Dict[str, int]:
+    """
+    Parse "get_job=5,get_listing_view=5" into {"get_job": 5, "get_listing_view": 5}.
+    Keys may be short view names or fully-qualified `addr::module::fn` names.
+    """
+    ttls: Dict[str, int] = {}
+    for part in raw.split(","):
+        name, sep, ttl = part.strip().partition("=")
+        if sep and name.strip():
+            ttls[name.strip()] = int(ttl)
+    return ttls
+
+
+def _parse_tiers(raw: str) -> List[Tuple[int, int]]:
+    """
+    Parse "1:120,10:180" into [(1, 120), (10, 180)] (bucket seconds, buckets kept).
+    """
+    tiers: List[Tuple[int, int]] = []
+    for part in raw.split(","):
+        step, sep, capacity = part.strip().partition(":")
+        if sep:
+            tiers.append((int(step), int(capacity)))
+    return tiers
+
+
+def _parse_levels(raw: str) -> Dict[str, str]:
+    """
+    Parse "app.routers.ws=WARNING,httpx=WARNING" into {"app.routers.ws": "WARNING", "httpx": "WARNING"}.
+    """
+    levels: Dict[str, str] = {}
+    for part in raw.split(","):
+        name, sep, level = part.strip().partition("=")
+        if sep and name.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
 class Settings(BaseModel):
     APTOS_NODE_URL: str = os.getenv(
         "APTOS_NODE_URL", "https://fullnode.testnet.aptoslabs.com/v1"
     )
+    # Several fullnodes, comma-separated; defaults to APTOS_NODE_URL alone.
+    APTOS_NODE_URLS: List[str] = [
+        u.strip()
+        for u in os.getenv(
+            "APTOS_NODE_URLS", os.getenv("APTOS_NODE_URL", "https://fullnode.testnet.aptoslabs.com/v1")
+        ).split(",")
+        if u.strip()
+    ]
+    # Smoothing for the per-node latency / error-rate EWMAs used to route calls.
+    APTOS_EWMA_ALPHA: float = float(os.getenv("APTOS_EWMA_ALPHA", "0.2"))
+    # Hedged view calls: when the chosen node is slower than its own pNN latency,
+    # send the same call to the next-best node and take the first answer.
+    APTOS_HEDGE_ENABLED: bool = os.getenv("APTOS_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+    APTOS_HEDGE_PERCENTILE: float = float(os.getenv("APTOS_HEDGE_PERCENTILE", "95"))
+    APTOS_HEDGE_MIN_DELAY_MS: float = float(os.getenv("APTOS_HEDGE_MIN_DELAY_MS", "20"))
     APTOS_MARKETPLACE_ADDRESS: str = os.getenv(
         "APTOS_MARKETPLACE_ADDRESS",
         "0xc6cb811e72af6ce5036b2d8812536ce2fd6213a403a892a8b6b7154443da19ba",
     )
     APTOS_ESCROW_ADDRESS: str = os.getenv("APTOS_ESCROW_ADDRESS", "0x...escrow")
+    # Fullnode HTTP client: connection pool, keep-alive, optional HTTP/2 (needs
+    # `pip install httpx[http2]`) and split timeouts.
+    APTOS_MAX_CONNECTIONS: int = int(os.getenv("APTOS_MAX_CONNECTIONS", "100"))
+    APTOS_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("APTOS_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    APTOS_KEEPALIVE_EXPIRY_SECONDS: float = float(os.getenv("APTOS_KEEPALIVE_EXPIRY_SECONDS", "30"))
+    APTOS_HTTP2: bool = os.getenv("APTOS_HTTP2", "false").lower() in ("1", "true", "yes")
+    APTOS_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("APTOS_CONNECT_TIMEOUT_SECONDS", "3"))
+    APTOS_READ_TIMEOUT_SECONDS: float = float(os.getenv("APTOS_READ_TIMEOUT_SECONDS", "10"))
+    APTOS_POOL_TIMEOUT_SECONDS: float = float(os.getenv("APTOS_POOL_TIMEOUT_SECONDS", "5"))
+    # Retries (jittered exponential backoff) for 429/5xx/timeouts/connection errors
+    APTOS_RETRY_ATTEMPTS: int = int(os.getenv("APTOS_RETRY_ATTEMPTS", "3"))
+    APTOS_RETRY_BASE_DELAY_SECONDS: float = float(os.getenv("APTOS_RETRY_BASE_DELAY_SECONDS", "0.1"))
+    APTOS_RETRY_MAX_DELAY_SECONDS: float = float(os.getenv("APTOS_RETRY_MAX_DELAY_SECONDS", "2"))
+    # Client-side quota for fullnode calls (0 = unlimited). When throttled,
+    # interactive calls are released before normal ones, bulk ones last.
+    APTOS_RATE_LIMIT_RPS: float = float(os.getenv("APTOS_RATE_LIMIT_RPS", "0"))
+    APTOS_RATE_LIMIT_BURST: float = float(os.getenv("APTOS_RATE_LIMIT_BURST", "20"))
+    # Circuit breaker: open after N consecutive failures, probe again after the reset time
+    APTOS_BREAKER_FAILURES: int = int(os.getenv("APTOS_BREAKER_FAILURES", "5"))
+    APTOS_BREAKER_RESET_SECONDS: float = float(os.getenv("APTOS_BREAKER_RESET_SECONDS", "10"))
     CACHE_TTL_SECONDS: int = int(os.getenv("CACHE_TTL_SECONDS", "10"))
+    CACHE_MAXSIZE: int = int(os.getenv("CACHE_MAXSIZE", "4096"))
+    # Per view-function TTLs (seconds). Functions not listed use CACHE_TTL_SECONDS;
+    # a TTL of 0 disables caching (calls are still coalesced).
+    VIEW_CACHE_TTLS: Dict[str, int] = _parse_ttls(
+        os.getenv(
+            "VIEW_CACHE_TTLS",
+            "get_listing_view=5,get_job=5,get_jobs_by_renter=10,get_host_reputation=30",
+        )
+    )
+    # Parsed job history per renter (GET /renters/{address}/jobs); entries live as
+    # long as the get_jobs_by_renter view TTL.
+    RENTER_JOBS_CACHE_SIZE: int = int(os.getenv("RENTER_JOBS_CACHE_SIZE", "1024"))
+    # Max distinct ids per POST /jobs:batchGet, /hosts:batchGet, /reputation:batchGet.
+    BATCH_GET_MAX_IDS: int = int(os.getenv("BATCH_GET_MAX_IDS", "100"))
     REDIS_URL: str | None = os.getenv("REDIS_URL")
+    # Budget for one L2 (Redis) view cache call; a slower one counts as an L2
+    # error and the request falls back to the fullnode.
+    VIEW_CACHE_L2_TIMEOUT_MS: float = float(os.getenv("VIEW_CACHE_L2_TIMEOUT_MS", "100"))
+    # "memory" (single worker) or "redis" (sessions/presence/commands shared via REDIS_URL)
+    SHARED_STATE_BACKEND: str = os.getenv("SHARED_STATE_BACKEND", "memory")
+    # max-age for Cache-Control on ETag'd read endpoints (browsers/CDN revalidate after this).
+    HTTP_CACHE_MAX_AGE: int = int(os.getenv("HTTP_CACHE_MAX_AGE", "2"))
+    # Session records (memory backend): dropped GRACE seconds after the job's
+    # max_end_time, ERROR_TTL after a session_error, otherwise TTL after the
+    # last update; least recently used evicted past MAX. With SNAPSHOT_PATH
+    # set (off by default), snapshotted to that SQLite file every
+    # SNAPSHOT_SECONDS and reloaded on startup.
+    SESSION_MAX_RECORDS: int = int(os.getenv("SESSION_MAX_RECORDS", "100000"))
+    SESSION_TTL_SECONDS: float = float(os.getenv("SESSION_TTL_SECONDS", "86400"))
+    SESSION_ERROR_TTL_SECONDS: float = float(os.getenv("SESSION_ERROR_TTL_SECONDS", "600"))
+    SESSION_EXPIRY_GRACE_SECONDS: float = float(os.getenv("SESSION_EXPIRY_GRACE_SECONDS", "60"))
+    SESSION_SNAPSHOT_PATH: str = os.getenv("SESSION_SNAPSHOT_PATH", "")
+    SESSION_SNAPSHOT_SECONDS: float = float(os.getenv("SESSION_SNAPSHOT_SECONDS", "5"))
+    # How often the online-listings snapshot is re-validated on-chain.
+    LISTINGS_REFRESH_SECONDS: float = float(os.getenv("LISTINGS_REFRESH_SECONDS", "15"))
+    # Adaptive (AIMD) concurrency for multi-address fan-outs against the fullnode.
+    FANOUT_INITIAL_CONCURRENCY: int = int(os.getenv("FANOUT_INITIAL_CONCURRENCY", "16"))
+    FANOUT_MIN_CONCURRENCY: int = int(os.getenv("FANOUT_MIN_CONCURRENCY", "2"))
+    FANOUT_MAX_CONCURRENCY: int = int(os.getenv("FANOUT_MAX_CONCURRENCY", "64"))
+    FANOUT_TARGET_LATENCY_MS: float = float(os.getenv("FANOUT_TARGET_LATENCY_MS", "500"))
+    FANOUT_DEADLINE_SECONDS: float = float(os.getenv("FANOUT_DEADLINE_SECONDS", "10"))
+    # Billing tick / keepalive interval for /jobs/{job_id}/session/stream.
+    SESSION_STREAM_TICK_SECONDS: float = float(os.getenv("SESSION_STREAM_TICK_SECONDS", "1"))
+    # Per-host outbound WebSocket queue: size, overflow policy (drop_oldest|reject)
+    # and how long one send may take before the socket is considered dead.
+    HOST_SEND_QUEUE_SIZE: int = int(os.getenv("HOST_SEND_QUEUE_SIZE", "64"))
+    HOST_SEND_OVERFLOW: str = os.getenv("HOST_SEND_OVERFLOW", "drop_oldest")
+    HOST_SEND_TIMEOUT_SECONDS: float = float(os.getenv("HOST_SEND_TIMEOUT_SECONDS", "5"))
+    # Server->agent {"action": "ping"} interval; agents that answer pings but go
+    # silent (no pong or other frame) for longer than the TTL are evicted and
+    # their listings hidden. The TTL must exceed the interval; <= 0 disables
+    # the pings / eviction.
+    HOST_HEARTBEAT_SECONDS: float = float(os.getenv("HOST_HEARTBEAT_SECONDS", "15"))
+    HOST_PRESENCE_TTL_SECONDS: float = float(os.getenv("HOST_PRESENCE_TTL_SECONDS", "45"))
+    # Per-job stats history: "bucket_seconds:buckets" tiers (1s for 2 min, 10s for
+    # 30 min, 1 min for 12 h by default) and how many numeric stats to keep.
+    STATS_SERIES_TIERS: List[Tuple[int, int]] = _parse_tiers(
+        os.getenv("STATS_SERIES_TIERS", "1:120,10:180,60:720")
+    )
+    STATS_SERIES_MAX_FIELDS: int = int(os.getenv("STATS_SERIES_MAX_FIELDS", "8"))
+    # A job's history is dropped after this long without a sample (<= 0: only
+    # on session_stopped/session_error); at most this many jobs are kept.
+    STATS_SERIES_IDLE_SECONDS: float = float(os.getenv("STATS_SERIES_IDLE_SECONDS", "900"))
+    STATS_SERIES_MAX_SESSIONS: int = int(os.getenv("STATS_SERIES_MAX_SESSIONS", "10000"))
+    # Request tracing: Server-Timing on every response; a sampled fraction of
+    # span trees appended to TRACE_FILE; TRACE_SLOWEST_N > 0 keeps the slowest
+    # requests for GET /healthz/slow-requests.
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
+    TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+    TRACE_FILE: str = os.getenv("TRACE_FILE", "traces.jsonl")
+    TRACE_SLOWEST_N: int = int(os.getenv("TRACE_SLOWEST_N", "0"))
+    # Logging (see app/logging_config.py): root level, per-logger overrides
+    # ("app.routers.ws=WARNING,httpx=WARNING") and the per-call-site cap on
+    # INFO/DEBUG lines per second (0 = unlimited; warnings are never dropped).
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_LEVELS: Dict[str, str] = _parse_levels(os.getenv("LOG_LEVELS", "httpx=WARNING"))
+    LOG_RATE_LIMIT_PER_SECOND: float = float(os.getenv("LOG_RATE_LIMIT_PER_SECOND", "5"))
+    # Upper bound for ?wait= on POST /jobs/{id}/start and /stop.
+    COMMAND_MAX_WAIT_SECONDS: float = float(os.getenv("COMMAND_MAX_WAIT_SECONDS", "30"))
+    # Event-tailing indexer backing a local SQLite read model.
+    INDEXER_ENABLED: bool = os.getenv("INDEXER_ENABLED", "false").lower() in ("1", "true", "yes")
+    INDEXER_DB_PATH: str = os.getenv("INDEXER_DB_PATH", "indexer.sqlite3")
+    # Comma-separated `module::Struct/field` event handles on the marketplace account.
+    INDEXER_EVENT_HANDLES: str = os.getenv(
+        "INDEXER_EVENT_HANDLES",
+        "escrow::EscrowEvents/job_events,"
+        "marketplace::MarketplaceEvents/listing_events,"
+        "reputation::ReputationEvents/reputation_events",
+    )
+    INDEXER_PAGE_SIZE: int = int(os.getenv("INDEXER_PAGE_SIZE", "100"))
+    INDEXER_POLL_SECONDS: float = float(os.getenv("INDEXER_POLL_SECONDS", "2"))
+    # Routers answer from the read model only if it caught up within this window.
+    INDEXER_MAX_STALENESS_SECONDS: float = float(os.getenv("INDEXER_MAX_STALENESS_SECONDS", "10"))
 
 
 @lru_cache
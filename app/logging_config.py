@@ -1,11 +1,184 @@
-from loguru import logger
+"""
+Process-wide logging: one stdlib pipeline, kept off the event loop.
+
+Modules log through `logging.getLogger(__name__)` with %-style arguments
+(`logger.info("job %s", job_id)`), never f-strings, so a record that is
+filtered out is never formatted. `setup_logging()` (called once from
+app/main.py) replaces whatever handlers the root logger had with a
+`QueueHandler`; a `QueueListener` thread does the formatting and the writes
+to stdout, so a slow log sink cannot stall request handling.
+
+On the calling side a record costs a level check, the rate limit below and a
+queue put:
+
+- Levels: `LOG_LEVEL` for the root, `LOG_LEVELS` per logger
+  ("app.routers.ws=WARNING,httpx=WARNING").
+- Rate limit: high-frequency INFO/DEBUG lines (session polls, agent
+  stats_update) are limited to `LOG_RATE_LIMIT_PER_SECOND` records per second
+  per call site (logger + message template); the next record let through
+  reports how many were suppressed. WARNING and above are never dropped.
+- Redaction: session tokens, bearer credentials and `token=` pairs are
+  masked when the line is formatted, as a backstop for call sites that log a
+  whole message or session record.
+
+uvicorn's own loggers (`uvicorn`, `uvicorn.error`, `uvicorn.access`) come
+with synchronous stream handlers and `propagate=False`; `setup_logging()`
+strips those so server and access lines go through the same queue (a logger
+uvicorn left without handlers, e.g. the access log under `--no-access-log`,
+is left alone). The
+access log is exempt from the rate limit (one line per request is the point
+of it); run uvicorn with `--no-access-log` to turn it off.
+
+Arguments are formatted on the listener thread; pass values, not objects the
+caller mutates right after logging.
+"""
+from __future__ import annotations
+import atexit
+import logging
+import logging.handlers
+import queue
+import re
 import sys
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from app.config import get_settings
+
+SET = get_settings()
+
+FORMAT = "%(asctime)s | %(levelname)s | %(name)s | %(message)s"
+
+# Configured by uvicorn before the app is imported; re-routed to the root.
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
 
-logger.remove()
-logger.add(
-    sys.stdout,
-    level="INFO",
-    colorize=True,
-    enqueue=True,
-    format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
+_REDACT_PATTERNS = (
+    # "token": "abc" / 'token': 'abc' (JSON bodies, dict reprs)
+    (re.compile(r"""(["']token["']\s*:\s*["'])[^"']+(["'])"""), r"\1***\2"),
+    # token=abc, token: abc
+    (re.compile(r"(\btoken\s*[=:]\s*)[^\s,;)}'\"]+", re.IGNORECASE), r"\1***"),
+    (re.compile(r"(\bBearer\s+)[A-Za-z0-9._~+/=-]+"), r"\1***"),
 )
+
+
+def redact(text: str) -> str:
+    for pattern, replacement in _REDACT_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class RedactingFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return redact(super().format(record))
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most `per_second` INFO/DEBUG records per second for each
+    (logger, message template); WARNING and above always pass. The first record
+    let through after a suppressed stretch carries the suppressed count.
+    """
+
+    # Loggers whose every record is wanted, whatever the rate.
+    exempt = frozenset({"uvicorn.access"})
+
+    def __init__(self, per_second: float):
+        super().__init__()
+        self.per_second = per_second
+        # (logger name, template) -> [window start, records in window, suppressed]
+        self._windows: Dict[Tuple[str, object], list] = {}
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.per_second <= 0 or record.levelno >= logging.WARNING or record.name in self.exempt:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = [now, 0, 0]
+        elif now - window[0] >= 1.0:
+            window[0], window[1] = now, 0
+        if window[1] >= self.per_second:
+            window[2] += 1
+            self.suppressed += 1
+            return False
+        window[1] += 1
+        if window[2]:
+            record.msg = f"{record.msg} (+{window[2]} similar suppressed)"
+            window[2] = 0
+        return True
+
+
+_exc_formatter = logging.Formatter()
+
+
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The queue never leaves the process, so skip the stdlib's eager
+        # formatting (done for pickling); only pin the traceback text, whose
+        # frames may be gone by the time the listener gets to it.
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _exc_formatter.formatException(record.exc_info)
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+
+
+def setup_logging(
+    level: Optional[str] = None,
+    levels: Optional[Dict[str, str]] = None,
+    rate_limit_per_second: Optional[float] = None,
+    stream=None,
+) -> RateLimitFilter:
+    """(Re)configure the root logger; returns the installed rate limit filter."""
+    global _listener
+    with _lock:
+        stop_logging()
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(RedactingFormatter(FORMAT))
+        rate_limit = RateLimitFilter(
+            SET.LOG_RATE_LIMIT_PER_SECOND if rate_limit_per_second is None else rate_limit_per_second
+        )
+        handler = _InProcessQueueHandler(queue.SimpleQueue())
+        handler.addFilter(rate_limit)
+
+        # FORMAT uses none of these; skipping them is the stdlib's documented
+        # way to make record creation cheaper (no stack walk for the caller).
+        logging._srcfile = None
+        logging.logThreads = False
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
+        logging.logAsyncioTasks = False
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level or SET.LOG_LEVEL)
+        for name in UVICORN_LOGGERS:
+            uvicorn_logger = logging.getLogger(name)
+            # No handlers: propagating already, or switched off (--no-access-log).
+            if uvicorn_logger.handlers:
+                for existing in list(uvicorn_logger.handlers):
+                    uvicorn_logger.removeHandler(existing)
+                uvicorn_logger.propagate = True
+        for name, module_level in (SET.LOG_LEVELS if levels is None else levels).items():
+            logging.getLogger(name).setLevel(module_level)
+
+        _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+        _listener.start()
+        return rate_limit
+
+
+def stop_logging():
+    """Drain the queue and stop the writer thread (idempotent)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
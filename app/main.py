@@ -1,13 +1,32 @@
-from fastapi import FastAPI
+import logging
+
+from fastapi import FastAPI, Request
 from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import health, listings, hosts, jobs, renters, reputation, ws
-from app.logging_config import logger
+from app.logging_config import setup_logging
+from app.cache.redis_cache import RedisCache
+from app.cache.view_cache import view_cache
+from app.clients.aptos import aptos_client
+from app.clients.resilience import CircuitOpenError
+from app.utils.ledger import LEDGER_VERSION_HEADER, LedgerVersionMiddleware, LedgerVersionUnavailable
+from app.utils.metrics import MetricsMiddleware
+from app.utils.tracing import TracedORJSONResponse, TracingMiddleware, trace_recorder
+from app.services.indexer import indexer
+from app.services.session_events import session_events
+from app.services.shared_state import shared_state
+from app.websockets import connection_manager
+from app.config import get_settings
+
+SET = get_settings()
+
+setup_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Aptos Unified Compute — API",
     version="0.1.0",
-    default_response_class=ORJSONResponse,
+    default_response_class=TracedORJSONResponse,
 )
 
 origins = [
@@ -20,7 +39,15 @@ app.add_middleware(
     allow_credentials=True,  # Allow cookies to be sent
     allow_methods=["*"],  # Allow all HTTP methods (GET, POST, etc.)
     allow_headers=["*"],  # Allow all HTTP headers
+    expose_headers=[LEDGER_VERSION_HEADER, "X-Next-Cursor"],  # Let the frontend pin follow-up reads and page NDJSON
 )
+# Reports the ledger version each response reflects (X-Aptos-Ledger-Version).
+app.add_middleware(LedgerVersionMiddleware)
+if SET.TRACING_ENABLED:
+    # Span tree per request -> Server-Timing header, sampled JSONL, slowest-N.
+    app.add_middleware(TracingMiddleware)
+# Outermost, so route latency includes every other middleware.
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(health.router)
 app.include_router(listings.router)
@@ -30,11 +57,48 @@ app.include_router(ws.router)
 app.include_router(renters.router)
 app.include_router(reputation.router)
 
+@app.exception_handler(CircuitOpenError)
+async def on_circuit_open(request: Request, exc: CircuitOpenError):
+    # The fullnode is failing; answer fast instead of queueing more calls on it.
+    return ORJSONResponse(
+        status_code=503,
+        content={"detail": "Upstream Aptos node is unavailable, retry shortly."},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
+
+
+@app.exception_handler(LedgerVersionUnavailable)
+async def on_ledger_version_unavailable(request: Request, exc: LedgerVersionUnavailable):
+    # 410: pruned by the node; 404: the node hasn't reached it yet.
+    return ORJSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
+
+
 @app.on_event("startup")
 async def on_startup():
+    if SET.REDIS_URL:
+        view_cache.l2 = RedisCache.from_url(SET.REDIS_URL, timeout=SET.VIEW_CACHE_L2_TIMEOUT_MS / 1000)
+        logger.info("Shared Redis view cache enabled.")
+    if SET.INDEXER_ENABLED:
+        indexer.start()
+        logger.info("Event indexer enabled.")
+    # Memory backend: restore sessions from the last snapshot before agents reconnect.
+    await shared_state.start()
+    await connection_manager.start()
+    await session_events.start()
+    listings.listings_snapshot.start()
     logger.info("FastAPI started.")
 
 
 @app.on_event("shutdown")
 async def on_shutdown():
     logger.info("FastAPI shutting down.")
+    await listings.listings_snapshot.stop()
+    await indexer.stop()
+    await session_events.stop()
+    await connection_manager.stop()
+    await shared_state.close()
+    await aptos_client.close()
+    trace_recorder.close()
+    if view_cache.l2 is not None:
+        await view_cache.l2.close()
+        view_cache.l2 = None
@@ -61,7 +61,7 @@
 #     total: int
 #     next_cursor: Optional[int] = None
 from pydantic import BaseModel
-from typing import List, Optional, Literal
+from typing import Dict, List, Optional, Literal
 
 
 # These models should mirror the structs in your Move contract
@@ -91,7 +91,12 @@ class Listing(BaseModel):
 class ListingsPage(BaseModel):
     items: List[Listing]
     total: int
-    next_cursor: Optional[int] = None  # Assuming paginate provides this
+    next_cursor: Optional[str] = None  # Opaque keyset cursor for the next page
+
+
+class ListingSearchPage(BaseModel):
+    items: List[Listing]
+    next_cursor: Optional[str] = None
 
 
 class HostProfile(BaseModel):
@@ -108,3 +113,46 @@ class Job(BaseModel):
     total_escrow_amount: int
     claimed_amount: int
     is_active: bool
+
+
+class JobsPage(BaseModel):
+    items: List[Job]
+    next_cursor: Optional[str] = None  # Opaque keyset cursor (job_id) for the next page
+
+
+class BatchGetRequest(BaseModel):
+    ids: List[str]
+    ledger_version: Optional[int] = None  # read every id at this ledger version
+
+
+class JobsBatchGetRequest(BaseModel):
+    ids: List[int]
+    ledger_version: Optional[int] = None
+
+
+class BatchItemError(BaseModel):
+    status: int
+    detail: str
+
+
+class JobsBatch(BaseModel):
+    items: Dict[str, Job]
+    not_found: List[str]
+    errors: Dict[str, BatchItemError]
+
+
+class ListingsBatch(BaseModel):
+    items: Dict[str, Listing]
+    not_found: List[str]
+    errors: Dict[str, BatchItemError]
+
+
+class ReputationScore(BaseModel):
+    completed_jobs: int
+    total_uptime_seconds: int
+
+
+class ReputationBatch(BaseModel):
+    items: Dict[str, ReputationScore]
+    not_found: List[str]  # no reputation yet (the single-host endpoint returns null)
+    errors: Dict[str, BatchItemError]
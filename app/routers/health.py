@@ -1,4 +1,13 @@
 from fastapi import APIRouter
+from fastapi.responses import Response
+from app.cache.view_cache import view_cache
+from app.clients.aptos import aptos_client
+from app.services.indexer import indexer
+from app.services.shared_state import shared_state
+from app.services.stats_series import stats_store
+from app.utils import http_cache, metrics
+from app.utils.tracing import trace_recorder
+from app.websockets import connection_manager
 
 router = APIRouter()
 
@@ -6,3 +15,79 @@ router = APIRouter()
 @router.get("/healthz")
 async def healthz():
     return {"status": "ok"}
+
+
+@router.get("/healthz/indexer")
+async def indexer_status():
+    return indexer.status()
+
+
+@router.get("/healthz/http-cache")
+async def http_cache_status():
+    # 200 vs 304 counts per endpoint
+    return http_cache.hit_ratios()
+
+
+@router.get("/healthz/hosts")
+async def host_command_status():
+    # Acknowledged-command counters / agent reply latency, and outbound queue
+    # depth / drops for the hosts connected to this worker
+    return {"commands": connection_manager.command_stats(), "queues": connection_manager.queue_stats()}
+
+
+@router.get("/healthz/presence")
+async def presence_status():
+    # Online hosts with last-seen age, plus connect/disconnect/eviction counts
+    return connection_manager.presence()
+
+
+@router.get("/healthz/stats-series")
+async def stats_series_status():
+    # Sessions with a stats history and the memory their ring buffers hold
+    return stats_store.stats()
+
+
+@router.get("/healthz/sessions")
+async def session_store_status():
+    # Memory backend only: expiries, LRU evictions and snapshot progress
+    sessions = getattr(shared_state, "sessions", None)
+    if sessions is None:
+        return {"backend": type(shared_state).__name__, "sessions": await shared_state.session_count()}
+    return {"backend": type(shared_state).__name__, **sessions.status()}
+
+
+@router.get("/healthz/aptos")
+async def aptos_status():
+    # Fullnode client: requests, attempts, retries, errors and circuit breaker state
+    return aptos_client.status()
+
+
+
+@router.get("/healthz/slow-requests")
+async def slow_requests():
+    # Slowest requests since start with their span trees (needs TRACE_SLOWEST_N > 0)
+    return {"enabled": trace_recorder.slowest_n > 0, **trace_recorder.stats, "requests": trace_recorder.slowest()}
+
+
+async def _collect():
+    # Point-in-time values owned by other components, copied into the registry.
+    vc = view_cache.stats
+    for tier in ("l1", "l2"):
+        hits, misses = vc[f"{tier}_hits"], vc[f"{tier}_misses"]
+        metrics.view_cache_requests.set(hits, tier, "hit")
+        metrics.view_cache_requests.set(misses, tier, "miss")
+        metrics.view_cache_hit_ratio.set(hits / (hits + misses) if hits + misses else 0.0, tier)
+    metrics.view_cache_requests.set(vc["coalesced"], "l1", "coalesced")
+    for endpoint, counts in http_cache.stats.items():
+        for status, n in counts.items():
+            metrics.http_cache_responses.set(n, endpoint, status)
+    metrics.sessions.set(await shared_state.session_count())
+    metrics.connected_hosts.set(len(connection_manager.active_connections))
+    metrics.online_hosts.set(len(connection_manager.online_hosts))
+
+
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    # Prometheus text format; this worker's numbers only.
+    await _collect()
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
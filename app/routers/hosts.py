@@ -1,53 +1,69 @@
 import logging
-from fastapi import APIRouter, HTTPException
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Request
 
 # Import the necessary components
-from app.models.schemas import Listing  # The Pydantic model for the response
-from app.clients.aptos import aptos_client
+from app.clients.resilience import CircuitOpenError
+from app.models.schemas import BatchGetRequest, Listing, ListingsBatch  # The Pydantic models for the responses
 from app.config import get_settings
+from app.utils.batch import batch_get, unique_ids
+from app.utils.http_cache import etag_json_response
+from app.utils.tracing import span
+from app.utils.ledger import LedgerVersionUnavailable, ledger_version_query, pinned_ledger
 
 # --- THE FIX: Import the NEW, CORRECT parser from the updated listings.py ---
 # Note: Ensure that the parser in your listings.py is named `_parse_listing_view`
 # and is available for import (i.e., not nested inside another function).
-from .listings import _parse_listing_view
+from .listings import _parse_listing_view, _get_listing_view_raw
 
 router = APIRouter(prefix="/api/v1", tags=["hosts"])
 SET = get_settings()
-logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(message)s')
+logger = logging.getLogger(__name__)
+
+
+async def _fetch_host_listing(host_address: str) -> Optional[Listing]:
+    listing_view_data = await _get_listing_view_raw(host_address)
+    if not listing_view_data:
+        return None
+    with span("parse"):
+        return _parse_listing_view(listing_view_data, host_address)
+
+
+@router.post("/hosts:batchGet", response_model=ListingsBatch)
+async def batch_get_host_listings(body: BatchGetRequest):
+    """
+    Look up the listings of several hosts at once. Unregistered hosts are
+    reported under `not_found`, per-host failures under `errors`.
+    """
+    host_addresses = unique_ids(body.ids)
+    logger.info("Batch fetching listings for %s hosts", len(host_addresses))
+    with pinned_ledger(body.ledger_version):
+        return await batch_get(host_addresses, _fetch_host_listing)
 
 
 # --- REFACTORED: The endpoint now gets a single listing, not a list ---
 @router.get("/hosts/{host_address}", response_model=Listing)
-async def get_host_listing(host_address: str):
+async def get_host_listing(
+    host_address: str, request: Request, ledger_version: Optional[int] = ledger_version_query()
+):
     """
     Gets the single, unified listing for a specific host by calling
     the on-chain 'get_listing_view' function. This is used by the Host Dashboard.
     """
-    logging.info(f"Fetching listing details for host: {host_address}")
+    logger.info("Fetching listing details for host: %s", host_address)
     try:
-        # Create the payload to call the new view function from your contract
-        payload = {
-            "function": f"{SET.APTOS_MARKETPLACE_ADDRESS}::marketplace::get_listing_view",
-            "type_arguments": [],
-            "arguments": [host_address],
-        }
-        
-        # Call the view function
-        response = await aptos_client.view(payload)
-
-        # The view function returns a list with one item (the ListingView struct)
-        # or an empty list if the host is not registered.
-        if not response or not response[0]:
-            raise HTTPException(status_code=44, detail="Host is not registered or has no listing.")
-
-        listing_view_data = response[0]
-        
-        # Use the correct, existing parser from listings.py to transform the data
-        return _parse_listing_view(listing_view_data, host_address)
+        # Read model when fresh, otherwise the on-chain `get_listing_view` call.
+        # None means the host is not registered.
+        # Parsed with the existing parser from listings.py.
+        with pinned_ledger(ledger_version):
+            listing = await _fetch_host_listing(host_address)
+        if listing is None:
+            raise HTTPException(status_code=404, detail="Host is not registered or has no listing.")
+        return etag_json_response(request, "host", listing)
 
     except Exception as e:
         # Handle errors gracefully
-        if isinstance(e, HTTPException):
+        if isinstance(e, (HTTPException, LedgerVersionUnavailable, CircuitOpenError)):
             raise e
-        logging.error(f"Failed to fetch listing for host {host_address}", exc_info=True)
+        logger.error("Failed to fetch listing for host %s", host_address, exc_info=True)
         raise HTTPException(status_code=500, detail="An error occurred while fetching host listing data.")
\ No newline at end of file
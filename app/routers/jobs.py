@@ -1,25 +1,42 @@
+import asyncio
 import logging
 import time
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from typing import Optional, Tuple
+
+import orjson
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 
 # Shared components
 from app.clients.aptos import aptos_client
+from app.clients.resilience import CircuitOpenError
+from app.clients.ratelimit import INTERACTIVE, call_priority
 from app.config import get_settings
-from app.models.schemas import Job
-from app.websockets import connection_manager
+from app.models.schemas import Job, JobsBatch, JobsBatchGetRequest
+from app.websockets import HostQueueFull, connection_manager
+from app.services.indexer import indexer
+from app.services.session_events import session_events
+from app.services.shared_state import shared_state
+from app.services.stats_series import stats_store
+from app.utils.batch import batch_get, unique_ids
+from app.utils.http_cache import etag_json_response
+from app.utils.ledger import LedgerVersionUnavailable, ledger_version_query, pinned_ledger
+from app.utils.tracing import span
 
 # --- Setup ---
-logging.basicConfig(
-    level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s"
-)
 router = APIRouter(prefix="/api/v1", tags=["jobs"])
 SET = get_settings()
+logger = logging.getLogger(__name__)
 
-# In-memory cache populated by the WebSocket layer when the host agent reports
+# Session records are populated by the WebSocket layer when the host agent reports
 # {"status": "session_ready", "job_id": ..., "public_url": ..., "token": ...}
-# The WS layer should import this SESSION_CACHE and mutate it directly.
-SESSION_CACHE = {}  # { job_id(int): { public_url, token, stats?, _billing_meta? } }
+# They live in the shared state backend so every worker sees them:
+#   { job_id(int): { public_url, token, stats?, _billing_meta? } }
+# Change single fields with _update_cached; writing back a whole record read
+# earlier would drop fields another worker set in the meantime.
+
+# Every stats_update (from any worker) is appended to the job's stats history.
+session_events.add_listener(stats_store.on_session_event)
 
 
 def _parse_raw_job(raw_job: dict) -> Job:
@@ -42,7 +59,15 @@ def _parse_raw_job(raw_job: dict) -> Job:
 async def _fetch_job(job_id: int) -> Job:
     """
     Thin helper around the Aptos view to get a job and parse it.
+    Answered from the indexer's read model when it is fresh enough.
     """
+    read_model = indexer.read_model_if_fresh()
+    if read_model is not None:
+        with span("read_model"):
+            raw_job = read_model.get_job(job_id)
+        if raw_job:
+            return _parse_raw_job(raw_job)
+
     payload = {
         "function": f"{SET.APTOS_MARKETPLACE_ADDRESS}::escrow::get_job",
         "type_arguments": [],
@@ -51,70 +76,144 @@ async def _fetch_job(job_id: int) -> Job:
     raw_job_payload = await aptos_client.view(payload)
     if not raw_job_payload:
         raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found.")
-    return _parse_raw_job(raw_job_payload[0])
+    with span("parse"):
+        return _parse_raw_job(raw_job_payload[0])
+
 
+async def _get_cached(job_id: int) -> Optional[dict]:
+    """
+    Get session details from the shared state backend.
+    """
+    with span("session.get"):
+        return await shared_state.get_session(int(job_id))
 
-def _cache_key(job_id: int):
+
+async def _set_cached(job_id: int, details: dict):
     """
-    Normalize how we access the cache. Prefer int keys; also check str fallback.
+    Set session details using the normalized int key.
     """
-    return job_id
+    await shared_state.set_session(int(job_id), details)
 
 
-def _get_cached(job_id: int):
+async def _update_cached(job_id: int, fields: dict) -> bool:
     """
-    Get details from SESSION_CACHE robustly (int or str key).
+    Set some fields of an existing session; False if there is none.
     """
-    return SESSION_CACHE.get(job_id) or SESSION_CACHE.get(str(job_id))
+    return await shared_state.update_session(int(job_id), fields)
 
 
-def _set_cached(job_id: int, details: dict):
+async def _pop_cached(job_id: int) -> Optional[dict]:
     """
-    Set details using normalized int key (WS layer should ideally do this too).
+    Remove and return session details, if any.
     """
-    SESSION_CACHE[_cache_key(job_id)] = details
+    return await shared_state.delete_session(int(job_id))
 
 
 @router.get("/jobs/{job_id}", response_model=Job)
-async def get_job_details(job_id: int):
+async def get_job_details(
+    job_id: int, request: Request, ledger_version: Optional[int] = ledger_version_query()
+):
     """
     Get the current state of an active or completed job by its ID.
     """
-    logging.info(f"Fetching details for Job ID: {job_id}")
+    logger.info("Fetching details for Job ID: %s", job_id)
     try:
-        return await _fetch_job(job_id)
-    except HTTPException:
+        with pinned_ledger(ledger_version):
+            job = await _fetch_job(job_id)
+        return etag_json_response(request, "job", job)
+    except (HTTPException, LedgerVersionUnavailable, CircuitOpenError):
         raise
     except Exception:
-        logging.error(f"Failed to get job {job_id}", exc_info=True)
+        logger.error("Failed to get job %s", job_id, exc_info=True)
         raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found.")
 
 
+@router.post("/jobs:batchGet", response_model=JobsBatch)
+async def batch_get_jobs(body: JobsBatchGetRequest):
+    """
+    Look up several jobs at once. Duplicate ids are collapsed; each id is
+    reported under `items`, `not_found` or `errors` (with its own status).
+    """
+    ids = unique_ids(body.ids)
+    logger.info("Batch fetching %s jobs", len(ids))
+    with pinned_ledger(body.ledger_version):
+        return await batch_get(ids, _fetch_job)
+
+
+def _wait_param():
+    return Query(
+        None,
+        ge=0,
+        le=SET.COMMAND_MAX_WAIT_SECONDS,
+        description="Seconds to wait for the host agent's reply instead of returning 202 immediately.",
+    )
+
+
+async def _ready_response(job_id: int) -> Optional[JSONResponse]:
+    """
+    200 with the ready payload (or 502 with the agent's error) from the cached session.
+    """
+    details = await _get_cached(job_id)
+    if not details:
+        return None
+    if details.get("error"):
+        return JSONResponse(
+            status_code=502,
+            content={"status": "error", "message": details["error"]},
+            headers={"Cache-Control": "no-store"},
+        )
+    meta = await _ensure_billing_meta(job_id, details)
+    if not meta:
+        return None
+    return JSONResponse(
+        status_code=200,
+        content=_ready_payload(details, meta),
+        headers={"Cache-Control": "no-store"},
+    )
+
+
 @router.post("/jobs/{job_id}/start", status_code=202)
-async def start_gpu_session(job_id: int):
+async def start_gpu_session(job_id: int, wait: Optional[float] = _wait_param()):
     """
     Tell the connected host agent (via WebSocket) to start a session for this job.
     Returns 202 immediately; the client should poll /jobs/{job_id}/session for readiness.
 
+    With ?wait=<seconds>, waits for the agent's reply instead: 200 with the ready
+    session, 502 with the agent's session_error, or 202 if it didn't answer in time.
+
     Idempotency: if the session is already ready in cache, respond accordingly.
     """
-    logging.info(f"Received request to START job {job_id}.")
+    logger.info("Received request to START job %s.", job_id)
     try:
         # If we already have a ready session, don't spam the agent again.
-        existing = _get_cached(job_id)
+        existing = await _get_cached(job_id)
         if existing:
-            logging.info(f"[start] Session already ready for job {job_id}.")
+            logger.info("[start] Session already ready for job %s.", job_id)
             return JSONResponse(
                 status_code=200,
                 content={"status": "already_running", **existing},
                 headers={"Cache-Control": "no-store"},
             )
 
-        job_details = await _fetch_job(job_id)
+        # The renter is waiting on this: jump ahead of background fullnode calls.
+        with call_priority(INTERACTIVE):
+            job_details = await _fetch_job(job_id)
         host_address = job_details.host_address
 
         command = {"action": "start_session", "job_id": job_id}
-        await connection_manager.send_to_host(command, host_address)
+        if wait:
+            try:
+                await connection_manager.request(
+                    command, host_address, expects=("session_ready", "session_error"), timeout=wait
+                )
+            except asyncio.TimeoutError:
+                pass
+            else:
+                response = await _ready_response(job_id)
+                if response is not None:
+                    return response
+        else:
+            await connection_manager.send_to_host(command, host_address)
 
         return JSONResponse(
             status_code=202,
@@ -126,38 +225,62 @@ async def start_gpu_session(job_id: int):
         )
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
-    except HTTPException:
-        # bubble up 404s from get_job_details/_fetch_job
+    except HostQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except (HTTPException, CircuitOpenError):
+        # bubble up 404s from _fetch_job; an open breaker is answered 503 in main.py
         raise
     except Exception:
-        logging.error(f"Failed to issue start command for job {job_id}", exc_info=True)
+        logger.error("Failed to issue start command for job %s", job_id, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to issue start command.")
 
 
 @router.post("/jobs/{job_id}/stop", status_code=202)
-async def stop_gpu_session(job_id: int):
+async def stop_gpu_session(job_id: int, wait: Optional[float] = _wait_param()):
     """
     Tell the connected host agent (via WebSocket) to stop a session for this job.
     Also clears any cached session details.
+
+    With ?wait=<seconds>, responds 200 once the agent confirms session_stopped
+    (502 on session_error, 202 if it didn't answer in time).
     """
-    logging.info(f"Received request to STOP job {job_id}.")
+    logger.info("Received request to STOP job %s.", job_id)
     try:
-        job_details = await _fetch_job(job_id)
+        # The renter is waiting on this: jump ahead of background fullnode calls.
+        with call_priority(INTERACTIVE):
+            job_details = await _fetch_job(job_id)
         host_address = job_details.host_address
 
         command = {"action": "stop_session", "job_id": job_id}
-        await connection_manager.send_to_host(command, host_address)
-
-        if _get_cached(job_id):
-            details = SESSION_CACHE.pop(_cache_key(job_id), None)
-            token = details.get("token") if isinstance(details, dict) else None
-            if token:
-                logging.info(
-                    f"[stop] Removed session cache for job {job_id} (token: {token})"
+        reply = None
+        if wait:
+            try:
+                reply = await connection_manager.request(
+                    command, host_address, expects=("session_stopped", "session_error"), timeout=wait
                 )
-            else:
-                logging.info(f"[stop] Removed session cache for job {job_id}")
+            except asyncio.TimeoutError:
+                pass
+        else:
+            await connection_manager.send_to_host(command, host_address)
 
+        if reply is not None and reply.get("status") == "session_error":
+            return JSONResponse(
+                status_code=502,
+                content={"status": "error", "message": reply.get("message") or "host reported session_error"},
+                headers={"Cache-Control": "no-store"},
+            )
+
+        details = await _pop_cached(job_id)
+        if details is not None:
+            logger.info("[stop] Removed session cache for job %s", job_id)
+        await session_events.broadcast(job_id, {"status": "session_stopped", "job_id": job_id})
+
+        if reply is not None:
+            return JSONResponse(
+                status_code=200,
+                content={"status": "stopped", "message": f"Host stopped the session for job {job_id}."},
+                headers={"Cache-Control": "no-store"},
+            )
         return JSONResponse(
             status_code=202,
             content={
@@ -170,13 +293,80 @@ async def stop_gpu_session(job_id: int):
         raise HTTPException(
             status_code=404, detail=f"Host for job {job_id} is not connected. {e}"
         )
-    except HTTPException:
+    except HostQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except (HTTPException, CircuitOpenError):
         raise
     except Exception:
-        logging.error(f"Failed to issue stop command for job {job_id}", exc_info=True)
+        logger.error("Failed to issue stop command for job %s", job_id, exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to issue stop command.")
 
 
+def _billing_meta(job: Job) -> dict:
+    """
+    The billing block cached in a session record; its max_end_time also sets
+    when the record expires.
+    """
+    duration = max(0, job.max_end_time - job.start_time)
+    price_per_second = (job.total_escrow_amount // duration) if duration > 0 else 0
+    return {
+        "start_time": job.start_time,
+        "max_end_time": job.max_end_time,
+        "total_escrow_amount": job.total_escrow_amount,
+        "price_per_second": price_per_second,
+    }
+
+
+async def _ensure_billing_meta(job_id: int, details: dict) -> Optional[dict]:
+    """
+    Ensure we have a billing meta block cached; if not, fetch once and cache it.
+    _billing_meta = { start_time, max_end_time, total_escrow_amount, price_per_second }
+    Returns None if the job can't be found on-chain.
+    """
+    meta = details.get("_billing_meta")
+    if meta:
+        return meta
+    try:
+        job = await _fetch_job(job_id)
+    except HTTPException:
+        return None
+
+    meta = _billing_meta(job)
+    details["_billing_meta"] = meta
+    await _update_cached(job_id, {"_billing_meta": meta})
+    return meta
+
+
+def _live_billing(meta: dict) -> dict:
+    """
+    Compute live numbers from cached billing meta without extra chain calls.
+    """
+    now = int(time.time())
+    start_time = int(meta["start_time"])
+    max_end_time = int(meta["max_end_time"])
+    total_escrow_amount = int(meta["total_escrow_amount"])
+    price_per_second = int(meta["price_per_second"])
+
+    claim_timestamp = min(max(now, start_time), max_end_time)
+    uptime_seconds = max(0, claim_timestamp - start_time)
+    current_cost_octas = min(total_escrow_amount, uptime_seconds * price_per_second)
+    return {
+        "price_per_second": price_per_second,
+        "uptime_seconds": uptime_seconds,
+        "current_cost_octas": current_cost_octas,
+    }
+
+
+def _ready_payload(details: dict, meta: dict) -> dict:
+    return {
+        "status": "ready",
+        "public_url": details.get("public_url"),
+        "token": details.get("token"),
+        "stats": details.get("stats") or None,  # may be updated by WS 'stats_update'
+        **_live_billing(meta),
+    }
+
+
 @router.get("/jobs/{job_id}/session")
 async def get_session_details(job_id: int):
     """
@@ -188,8 +378,10 @@ async def get_session_details(job_id: int):
       - uptime_seconds
       - current_cost_octas
     We compute these once per job and cache metadata to avoid repeated chain calls.
+
+    Prefer GET /jobs/{job_id}/session/stream, which pushes the same payload.
     """
-    details = _get_cached(job_id)
+    details = await _get_cached(job_id)
     if not details:
         return JSONResponse(
             status_code=202,
@@ -197,59 +389,110 @@ async def get_session_details(job_id: int):
             headers={"Retry-After": "3", "Cache-Control": "no-store"},
         )
 
-    # Ensure we have a billing meta block cached; if not, fetch once and cache it.
-    # _billing_meta = { start_time, max_end_time, total_escrow_amount, price_per_second }
-    meta = details.get("_billing_meta")
+    meta = await _ensure_billing_meta(job_id, details)
     if not meta:
-        try:
-            job = await _fetch_job(job_id)
-        except HTTPException:
-            # If job is gone on-chain but we still have a session cached,
-            # treat as pending to let the client re-try/refresh gracefully.
-            return JSONResponse(
-                status_code=202,
-                content={"status": "pending", "message": "Session verifying..."},
-                headers={"Retry-After": "3", "Cache-Control": "no-store"},
-            )
+        # If job is gone on-chain but we still have a session cached,
+        # treat as pending to let the client re-try/refresh gracefully.
+        return JSONResponse(
+            status_code=202,
+            content={"status": "pending", "message": "Session verifying..."},
+            headers={"Retry-After": "3", "Cache-Control": "no-store"},
+        )
 
-        duration = max(0, job.max_end_time - job.start_time)
-        price_per_second = (job.total_escrow_amount // duration) if duration > 0 else 0
+    # Polled every few seconds per open dashboard: rate-limited by the logging setup.
+    logger.info("[session] Job %s is ready", job_id)
 
-        meta = {
-            "start_time": job.start_time,
-            "max_end_time": job.max_end_time,
-            "total_escrow_amount": job.total_escrow_amount,
-            "price_per_second": price_per_second,
-        }
-        details["_billing_meta"] = meta
-        _set_cached(job_id, details)
+    return JSONResponse(
+        status_code=200,
+        content=_ready_payload(details, meta),
+        headers={"Cache-Control": "no-store"},
+    )
 
-    # Compute live numbers without extra chain calls
-    now = int(time.time())
-    start_time = int(meta["start_time"])
-    max_end_time = int(meta["max_end_time"])
-    total_escrow_amount = int(meta["total_escrow_amount"])
-    price_per_second = int(meta["price_per_second"])
 
-    claim_timestamp = min(max(now, start_time), max_end_time)
-    uptime_seconds = max(0, claim_timestamp - start_time)
-    current_cost_octas = min(total_escrow_amount, uptime_seconds * price_per_second)
+def _sse(event: str, data: dict) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
 
-    # Optional: log the token for debugging visibility
-    token = details.get("token")
-    if token:
-        logging.info(f"[session] Job {job_id} is ready (token: {token})")
 
-    payload = {
-        "status": "ready",
-        "public_url": details.get("public_url"),
-        "token": token,
-        "stats": details.get("stats") or None,  # may be updated by WS 'stats_update'
-        "price_per_second": price_per_second,
-        "uptime_seconds": uptime_seconds,
-        "current_cost_octas": current_cost_octas,
-    }
+async def _session_snapshot_event(job_id: int) -> Tuple[str, dict]:
+    """
+    Current session state as an SSE (event, data) pair.
+    """
+    details = await _get_cached(job_id)
+    if not details:
+        return "session_pending", {"status": "pending", "message": "Session is initializing."}
+    if details.get("error"):
+        return "session_error", {"status": "error", "message": details["error"]}
+    meta = await _ensure_billing_meta(job_id, details)
+    if not meta:
+        return "session_pending", {"status": "pending", "message": "Session verifying..."}
+    return "session_ready", _ready_payload(details, meta)
+
+
+@router.get("/jobs/{job_id}/session/stream")
+async def stream_session(job_id: int, request: Request):
+    """
+    Server-Sent Events stream for one job's session, replacing polling of
+    GET /jobs/{job_id}/session. Events (data is JSON):
+      - session_pending / session_ready / session_error: current state, sent on
+        connect and whenever the host agent reports a change
+      - stats_update: the ready payload with the agent's latest stats
+      - billing: {price_per_second, uptime_seconds, current_cost_octas} every
+        SESSION_STREAM_TICK_SECONDS while ready
+      - session_stopped: the session ended; the stream closes
+    """
+    queue = session_events.subscribe(job_id)
+
+    async def events():
+        try:
+            event, data = await _session_snapshot_event(job_id)
+            yield _sse(event, data)
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=SET.SESSION_STREAM_TICK_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    details = await _get_cached(job_id)
+                    meta = details.get("_billing_meta") if details else None
+                    if meta:
+                        yield _sse("billing", _live_billing(meta))
+                    else:
+                        yield b": keepalive\n\n"
+                    continue
+
+                status = message.get("status")
+                if status == "session_stopped":
+                    yield _sse("session_stopped", {"status": "stopped"})
+                    return
+                event, data = await _session_snapshot_event(job_id)
+                if status == "stats_update" and event == "session_ready":
+                    event = "stats_update"
+                yield _sse(event, data)
+        finally:
+            session_events.unsubscribe(job_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"},
+    )
 
+
+@router.get("/jobs/{job_id}/stats")
+async def get_session_stats(
+    job_id: int,
+    since: Optional[float] = Query(None, description="Unix seconds; only points at or after this."),
+    resolution: Optional[int] = Query(None, ge=1, description="Bucket size in seconds."),
+):
+    """
+    History of the host agent's stats for an active session, downsampled:
+    recent samples at 1s, older ones in coarser buckets (see STATS_SERIES_TIERS).
+    Columnar: {"resolution", "fields", "t": [unix seconds], "series": {field: [mean or null]}}.
+    """
+    series = stats_store.get(job_id)
+    if series is None:
+        raise HTTPException(status_code=404, detail=f"No stats recorded for job {job_id}.")
     return JSONResponse(
-        status_code=200, content=payload, headers={"Cache-Control": "no-store"}
+        content=series.query(since=since, resolution=resolution),
+        headers={"Cache-Control": "no-store"},
     )
@@ -1,21 +1,27 @@
+import hashlib
 import logging
-import asyncio
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Optional
+
+import orjson
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import List, Literal, Optional
 
 # --- IMPORT THE CONNECTION MANAGER ---
 from app.websockets import connection_manager
 from app.clients.aptos import aptos_client
+from app.clients.resilience import CircuitOpenError
 from app.config import get_settings
 # --- Ensure your Pydantic models match the new contract ---
-from app.models.schemas import Listing, ListingsPage, PhysicalSpecs 
-from app.utils.pagination import paginate
-
-# Basic Logging Configuration
-logging.basicConfig(level=logging.INFO, format='%(asctime)s | %(levelname)s | %(message)s')
+from app.models.schemas import Listing, ListingSearchPage, ListingsPage, PhysicalSpecs
+from app.utils.pagination import decode_cursor, encode_cursor, keyset_paginate, paginate
+from app.services.listings_snapshot import ListingsSnapshot
+from app.utils.fanout import upstream_fanout
+from app.services.indexer import indexer
+from app.utils.http_cache import check_not_modified, etag_json_response, version_etag
+from app.utils.tracing import span
 
 router = APIRouter(prefix="/api/v1", tags=["listings"])
 SET = get_settings()
+logger = logging.getLogger(__name__)
 
 
 # --- NEW PARSER for the 'ListingView' struct ---
@@ -58,95 +64,222 @@ def _parse_listing_view(listing_view_data: dict, host_address: str) -> Listing:
     )
 
 
-# --- REPLACED: _fetch_all_listings is now _fetch_online_listings ---
-async def _fetch_online_listings() -> List[Listing]:
+async def _get_listing_view_raw(host_address: str) -> Optional[dict]:
     """
-    Fetches listings ONLY from hosts who are currently online.
-    It gets the list of online hosts from the WebSocket manager and then
-    fetches their on-chain data in parallel.
+    Raw on-chain ListingView for a host, or None if the host is not registered.
+    Answered from the indexer's read model when it is fresh enough.
     """
-    # 1. Get the list of agents that are currently connected via WebSocket. This is our liveness check.
-    online_host_addresses = list(connection_manager.active_connections.keys())
-    
-    if not online_host_addresses:
-        logging.info("No host agents are currently connected to the backend.")
-        return []
-
-    logging.info(f"Found {len(online_host_addresses)} online hosts. Fetching their on-chain listing views...")
-
-    # 2. Create a list of promises to call the `get_listing_view` function for each online host.
-    view_promises = [
-        aptos_client.view({
-            "function": f"{SET.APTOS_MARKETPLACE_ADDRESS}::marketplace::get_listing_view",
-            "type_arguments": [],
-            "arguments": [host_addr],
-        }) for host_addr in online_host_addresses
-    ]
-
-    # 3. Execute all these requests in parallel.
-    results = await asyncio.gather(*view_promises, return_exceptions=True)
-
-    # 4. Parse the results and build the final list of listings.
-    items: List[Listing] = []
-    for i, res in enumerate(results):
-        host_address = online_host_addresses[i]
-        
-        if isinstance(res, Exception) or not res or not res[0]:
-            logging.warning(f"Could not fetch listing view for online host {host_address}. They may not be registered yet.")
-            continue
-
-        listing_view_data = res[0]
-        
-        # We only show listings that are both online (WebSocket connected) AND
-        # have explicitly marked themselves as available on-chain.
-        if listing_view_data.get("is_available"):
-            try:
-                parsed_listing = _parse_listing_view(listing_view_data, host_address)
-                items.append(parsed_listing)
-            except Exception as e:
-                logging.error(f"Failed to parse listing view for host {host_address}: {e}")
-    
-    return items
+    read_model = indexer.read_model_if_fresh()
+    if read_model is not None:
+        indexed = read_model.get_listing_view(host_address)
+        if indexed:
+            return indexed
+
+    res = await aptos_client.view({
+        "function": f"{SET.APTOS_MARKETPLACE_ADDRESS}::marketplace::get_listing_view",
+        "type_arguments": [],
+        "arguments": [host_address],
+    })
+    if not res or not res[0]:
+        return None
+    return res[0]
+
+
+async def _fetch_available_listing(host_address: str) -> Optional[Listing]:
+    """
+    Fetches one host's on-chain listing view. Returns None when the host is not
+    registered or has not marked itself as available.
+    """
+    listing_view_data = await _get_listing_view_raw(host_address)
+    if not listing_view_data:
+        return None
+
+    # We only show listings that are both online (WebSocket connected) AND
+    # have explicitly marked themselves as available on-chain.
+    if not listing_view_data.get("is_available"):
+        return None
+    try:
+        with span("parse"):
+            return _parse_listing_view(listing_view_data, host_address)
+    except Exception as e:
+        logger.error("Failed to parse listing view for host %s: %s", host_address, e)
+        return None
+
+
+# Materialized view of online + available listings. The WebSocket manager is our
+# liveness check: connects/disconnects update the snapshot incrementally, and a
+# background task started in main.py re-validates everything on-chain.
+listings_snapshot = ListingsSnapshot(
+    fetch_listing=_fetch_available_listing,
+    # Live hosts on any worker; heartbeat-evicted agents drop out of it.
+    online_hosts=lambda: connection_manager.online_hosts,
+    refresh_interval=SET.LISTINGS_REFRESH_SECONDS,
+    fanout=upstream_fanout,
+)
+connection_manager.add_listener(
+    on_connect=listings_snapshot.on_connect,
+    on_disconnect=listings_snapshot.on_disconnect,
+)
 
 
-# --- UPDATED: The main /listings endpoint now calls the new fetching logic ---
 @router.get("/listings", response_model=ListingsPage)
 async def list_listings(
-    limit: int = Query(20, ge=1, le=100), cursor: Optional[int] = Query(None)
+    request: Request,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
 ):
     """
     Lists all available and VERIFIABLY ONLINE compute listings with pagination.
+    Served from the in-memory listings snapshot, ordered by host address.
+
+    `cursor` is the opaque `next_cursor` of the previous page. It pins the
+    snapshot version the walk started on (while it is retained) and resumes
+    after the last host served, so pages never shift or repeat. Plain integer
+    offsets are still accepted for older clients.
+
+    The ETag is derived from the snapshot version and the page requested, so
+    an unchanged page is answered 304 without being rebuilt.
+    """
+    await listings_snapshot.ensure_fresh()
+
+    legacy_offset = cursor is not None and cursor.isdigit()
+    view = listings_snapshot.current()
+    after = None
+    if cursor is not None and not legacy_offset:
+        try:
+            version, after = decode_cursor(cursor)
+            if not isinstance(after, str):
+                raise ValueError("cursor key must be a host address")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+        # Fall back to the live version if the pinned one was evicted; the
+        # sort key still guarantees no repeats.
+        view = listings_snapshot.at_version(version) or view
+
+    snapshot_headers = {
+        "X-Snapshot-Version": str(view.version),
+        "X-Snapshot-Age": f"{listings_snapshot.age():.3f}",
+    }
+    etag = version_etag("listings", view.version, limit, cursor)
+    not_modified = check_not_modified(request, "listings", etag)
+    if not_modified is not None:
+        not_modified.headers.update(snapshot_headers)
+        return not_modified
+
+    if legacy_offset:
+        page, next_offset = paginate(view.items, limit=limit, cursor=int(cursor))
+        next_cursor = str(next_offset) if next_offset is not None else None
+    else:
+        page, next_key = keyset_paginate(view.items, view.keys, limit=limit, after=after)
+        next_cursor = encode_cursor(view.version, next_key) if next_key is not None else None
+
+    body = ListingsPage(items=page, next_cursor=next_cursor, total=len(view.items))
+    return etag_json_response(request, "listings", body, etag=etag, headers=snapshot_headers)
+
+
+SORT_ORDERS = {
+    "price_asc": ("price_per_second", False),
+    "price_desc": ("price_per_second", True),
+    "cpu_cores_asc": ("cpu_cores", False),
+    "cpu_cores_desc": ("cpu_cores", True),
+    "ram_gb_asc": ("ram_gb", False),
+    "ram_gb_desc": ("ram_gb", True),
+}
+
+
+def _search_filters_hash(gpu_model: Optional[str], ranges: dict) -> str:
+    """Short digest of the search filters, pinned into the cursor."""
+    raw = orjson.dumps([gpu_model, ranges], option=orjson.OPT_SORT_KEYS)
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+
+@router.get("/listings/search", response_model=ListingSearchPage)
+async def search_listings(
+    gpu_model: Optional[str] = Query(None, description="Exact GPU model, case/whitespace-insensitive"),
+    min_price: Optional[int] = Query(None, ge=0, description="Min price (octas/s)"),
+    max_price: Optional[int] = Query(None, ge=0, description="Max price (octas/s)"),
+    min_cpu_cores: Optional[int] = Query(None, ge=0),
+    max_cpu_cores: Optional[int] = Query(None, ge=0),
+    min_ram_gb: Optional[int] = Query(None, ge=0),
+    max_ram_gb: Optional[int] = Query(None, ge=0),
+    sort: Literal[
+        "price_asc", "price_desc", "cpu_cores_asc", "cpu_cores_desc", "ram_gb_asc", "ram_gb_desc"
+    ] = Query("price_asc"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+):
+    """
+    Filter and sort the online, available listings using the snapshot's
+    in-memory secondary indexes (sorted value arrays + GPU model hash index).
+    """
+    await listings_snapshot.ensure_fresh()
+    sort_field, descending = SORT_ORDERS[sort]
+    ranges = {
+        "price_per_second": (min_price, max_price),
+        "cpu_cores": (min_cpu_cores, max_cpu_cores),
+        "ram_gb": (min_ram_gb, max_ram_gb),
+    }
+    filters = _search_filters_hash(gpu_model, ranges)
+
+    after = None
+    if cursor is not None:
+        try:
+            _, key = decode_cursor(cursor)
+            last = key["after"]
+            if not isinstance(last, list) or len(last) != 2:
+                raise ValueError("cursor key must be [value, host_address]")
+            after = (int(last[0]), str(last[1]))
+            matches = key["sort"] == sort and key["filters"] == filters
+        except (ValueError, TypeError, KeyError, IndexError):
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+        # The key is only meaningful in the order and result set it came from.
+        if not matches:
+            raise HTTPException(status_code=400, detail="Cursor does not match this search.")
+
+    index = listings_snapshot.index
+    page, next_key = index.search(
+        ranges=ranges,
+        gpu_model=gpu_model,
+        sort_field=sort_field,
+        descending=descending,
+        limit=limit,
+        after=after,
+    )
+    next_cursor = None
+    if next_key is not None:
+        next_cursor = encode_cursor(
+            index.version, {"sort": sort, "filters": filters, "after": list(next_key)}
+        )
+    return ListingSearchPage(items=page, next_cursor=next_cursor)
+
+
+@router.get("/listings/snapshot")
+async def get_listings_snapshot_status():
+    """
+    Snapshot age, size and last refresh duration, for monitoring.
     """
-    items = await _fetch_online_listings()
-    page, next_cursor = paginate(items, limit=limit, cursor=cursor)
-    return ListingsPage(items=page, next_cursor=next_cursor, total=len(items))
+    return listings_snapshot.stats()
 
 
 # --- REPLACED: The old get_listing endpoint is updated for the new model ---
 # It no longer needs a `listing_id`.
 @router.get("/listings/{host_address}", response_model=Listing)
-async def get_listing_by_host(host_address: str):
+async def get_listing_by_host(host_address: str, request: Request):
     """
     Gets the single listing view for a given host address.
     """
     try:
-        payload = {
-            "function": f"{SET.APTOS_MARKETPLACE_ADDRESS}::marketplace::get_listing_view",
-            "type_arguments": [],
-            "arguments": [host_address],
-        }
-        raw_listing_view_payload = await aptos_client.view(payload)
-        
-        if not raw_listing_view_payload or not raw_listing_view_payload[0]:
+        listing_view_data = await _get_listing_view_raw(host_address)
+        if not listing_view_data:
             raise HTTPException(status_code=404, detail="Listing not found for this host.")
 
-        listing_view_data = raw_listing_view_payload[0]
-        return _parse_listing_view(listing_view_data, host_address)
+        listing = _parse_listing_view(listing_view_data, host_address)
+        return etag_json_response(request, "listing", listing)
 
     except Exception as e:
-        if isinstance(e, HTTPException):
+        if isinstance(e, (HTTPException, CircuitOpenError)):
             raise e
-        logging.error(f"Failed to get listing for host {host_address}", exc_info=True)
+        logger.error("Failed to get listing for host %s", host_address, exc_info=True)
         raise HTTPException(
             status_code=500, detail="Error fetching listing data."
         )
\ No newline at end of file
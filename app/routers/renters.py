@@ -1,30 +1,158 @@
-# This entire file is now much cleaner and more efficient.
 import logging
-from typing import List
-from fastapi import APIRouter
-from app.models.schemas import Job # Assuming you have a Pydantic model for Job
+from typing import Iterator, List, Literal, Optional, Tuple
+
+import orjson
+from cachetools import TTLCache
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from app.models.schemas import Job, JobsPage
 from app.clients.aptos import aptos_client
+from app.clients.resilience import CircuitOpenError
 from app.config import get_settings
+from app.services.indexer import indexer
+from app.utils.http_cache import etag_json_response
+from app.utils.ledger import note_ledger_version, observe_ledger
+from app.utils.tracing import span
+from app.utils.pagination import decode_cursor, encode_cursor, keyset_paginate
+from .jobs import _parse_raw_job
 
 router = APIRouter(prefix="/api/v1", tags=["renters"])
 SET = get_settings()
+logger = logging.getLogger(__name__)
+
+# Jobs serialized per NDJSON chunk.
+NDJSON_BATCH = 200
+
+# renter_address -> (jobs parsed and sorted by job_id, ledger version they reflect),
+# so paging through a long history doesn't re-validate thousands of Job models per page.
+_parsed_jobs: TTLCache = TTLCache(
+    maxsize=SET.RENTER_JOBS_CACHE_SIZE,
+    ttl=SET.VIEW_CACHE_TTLS.get("get_jobs_by_renter", SET.CACHE_TTL_SECONDS) or 1,
+)
+
+
+def _on_view_invalidated(function: str, argument: str):
+    # The indexer saw a newer write to this renter's jobs.
+    if function == "get_jobs_by_renter":
+        _parsed_jobs.pop(argument, None)
+
+
+indexer.add_invalidation_listener(_on_view_invalidated)
+
+
+async def _renter_jobs(renter_address: str) -> List[Job]:
+    cached = _parsed_jobs.get(renter_address)
+    if cached is not None:
+        jobs, version = cached
+        note_ledger_version(version)
+        return jobs
+
+    with observe_ledger() as seen:
+        # The read model holds the full indexed history, so a fresh miss means "no jobs".
+        read_model = indexer.read_model_if_fresh()
+        if read_model is not None:
+            raw_jobs = read_model.jobs_by_renter(renter_address)
+        else:
+            payload = {
+                "function": f"{SET.APTOS_MARKETPLACE_ADDRESS}::escrow::get_jobs_by_renter",
+                "type_arguments": [],
+                "arguments": [renter_address],
+            }
+            try:
+                # The view function returns a list of Job structs
+                result = await aptos_client.view(payload)
+            except CircuitOpenError:
+                raise
+            except Exception:
+                logger.error("Failed to fetch jobs for renter %s", renter_address, exc_info=True)
+                raise HTTPException(status_code=502, detail="Failed to fetch jobs from the Aptos node.")
+            raw_jobs = result[0] if result else []
+    note_ledger_version(seen.oldest)
+
+    with span("parse", jobs=len(raw_jobs)):
+        jobs = sorted((_parse_raw_job(raw) for raw in raw_jobs), key=lambda j: j.job_id)
+    _parsed_jobs[renter_address] = (jobs, seen.oldest)
+    return jobs
+
 
-@router.get("/renters/{renter_address}/jobs", response_model=List[Job])
-async def get_jobs_for_renter(renter_address: str):
+def _filter(
+    jobs: List[Job],
+    active: Optional[bool],
+    started_after: Optional[int],
+    started_before: Optional[int],
+) -> List[Job]:
+    if active is None and started_after is None and started_before is None:
+        return jobs
+    return [
+        j
+        for j in jobs
+        if (active is None or j.is_active == active)
+        and (started_after is None or j.start_time >= started_after)
+        and (started_before is None or j.start_time < started_before)
+    ]
+
+
+def _ordered(jobs: List[Job], order: str) -> Tuple[List[Job], List[int]]:
+    # Keys are ascending for keyset_paginate; newest-first walks negated ids.
+    if order == "desc":
+        jobs = jobs[::-1]
+        return jobs, [-j.job_id for j in jobs]
+    return jobs, [j.job_id for j in jobs]
+
+
+def _ndjson(jobs: List[Job]) -> Iterator[bytes]:
+    for i in range(0, len(jobs), NDJSON_BATCH):
+        yield b"".join(orjson.dumps(j.model_dump()) + b"\n" for j in jobs[i:i + NDJSON_BATCH])
+
+
+def _next_cursor(order: str, next_key: int) -> str:
+    # Job ids never move, so the cursor needs no snapshot version.
+    return encode_cursor(0, {"order": order, "after": next_key})
+
+
+@router.get("/renters/{renter_address}/jobs", response_model=JobsPage)
+async def get_jobs_for_renter(
+    renter_address: str,
+    request: Request,
+    active: Optional[bool] = Query(None, description="Only active (true) or finished (false) jobs"),
+    started_after: Optional[int] = Query(None, description="Unix seconds; start_time >= this"),
+    started_before: Optional[int] = Query(None, description="Unix seconds; start_time < this"),
+    order: Literal["asc", "desc"] = Query("asc", description="By job_id"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size (default 50); NDJSON streams everything unless set"),
+    cursor: Optional[str] = Query(None),
+    format: Literal["json", "ndjson"] = Query("json"),
+):
     """
-    Fetches all jobs for a specific renter using the efficient on-chain view function.
+    A renter's jobs, filtered and keyset-paginated by job_id.
+
+    `format=ndjson` (or `Accept: application/x-ndjson`) streams one job per
+    line, serialized incrementally, instead of a buffered JSON page. With
+    `limit`, the cursor for the rest of the stream is sent in the
+    `X-Next-Cursor` header.
+
+    A cursor is only valid for the `order` it was issued for.
     """
-    logging.info(f"Fetching jobs for renter: {renter_address}")
-    try:
-        payload = {
-            "function": f"{SET.APTOS_MARKETPLACE_ADDRESS}::escrow::get_jobs_by_renter",
-            "type_arguments": [],
-            "arguments": [renter_address],
-        }
-        # The view function returns a list of Job structs
-        jobs_raw = await aptos_client.view(payload)
-        # Assuming you have a parser or that your Pydantic model matches
-        return jobs_raw[0] 
-    except Exception as e:
-        logging.error(f"Failed to fetch jobs for renter {renter_address}", exc_info=True)
-        return []
\ No newline at end of file
+    logger.info("Fetching jobs for renter: %s", renter_address)
+    after = None
+    if cursor is not None:
+        try:
+            _, key = decode_cursor(cursor)
+            after = int(key["after"])
+            matches = key["order"] == order
+        except (ValueError, TypeError, KeyError):
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+        if not matches:
+            raise HTTPException(status_code=400, detail="Cursor does not match this order.")
+
+    jobs = _filter(await _renter_jobs(renter_address), active, started_after, started_before)
+    jobs, keys = _ordered(jobs, order)
+
+    if format == "ndjson" or "application/x-ndjson" in request.headers.get("accept", ""):
+        page, next_key = keyset_paginate(jobs, keys, limit or len(jobs), after)
+        headers = {"X-Next-Cursor": _next_cursor(order, next_key)} if next_key is not None else None
+        return StreamingResponse(_ndjson(page), media_type="application/x-ndjson", headers=headers)
+
+    page, next_key = keyset_paginate(jobs, keys, limit or 50, after)
+    next_cursor = _next_cursor(order, next_key) if next_key is not None else None
+    return etag_json_response(request, "renter_jobs", JobsPage(items=page, next_cursor=next_cursor))
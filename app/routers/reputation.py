@@ -1,24 +1,25 @@
 import logging
 from typing import Optional
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Request
 from app.clients.aptos import aptos_client
+from app.clients.resilience import CircuitOpenError
 from app.config import get_settings
+from app.services.indexer import indexer
+from app.models.schemas import BatchGetRequest, ReputationBatch, ReputationScore
+from app.utils.batch import batch_get, unique_ids
+from app.utils.http_cache import etag_json_response
+from app.utils.ledger import LedgerVersionUnavailable, ledger_version_query, pinned_ledger
 
 router = APIRouter(prefix="/api/v1", tags=["reputation"])
 SET = get_settings()
+logger = logging.getLogger(__name__)
 
-class ReputationScore(BaseModel):
-    completed_jobs: int
-    total_uptime_seconds: int
-
-@router.get("/reputation/{host_address}", response_model=Optional[ReputationScore])
-async def get_reputation(host_address: str):
-    """
-    Fetches the on-chain reputation score for a specific host.
-    Correctly handles the case where a host has no reputation yet.
-    """
-    try:
+async def _fetch_reputation(host_address: str) -> Optional[ReputationScore]:
+    read_model = indexer.read_model_if_fresh()
+    indexed = read_model.get_reputation_view(host_address) if read_model else None
+    if indexed is not None:
+        response = [indexed]
+    else:
         payload = {
             "function": f"{SET.APTOS_MARKETPLACE_ADDRESS}::reputation::get_host_reputation",
             "type_arguments": [],
@@ -26,17 +27,42 @@ async def get_reputation(host_address: str):
         }
         response = await aptos_client.view(payload)
 
-        # --- THE FIX IS HERE ---
-        # 1. Check if the response and the nested 'vec' exist and are not empty.
-        if response and response[0] and response[0].get('vec') and len(response[0]['vec']) > 0:
-            # 2. Only if it's not empty, access the first element.
-            return response[0]['vec'][0]
-        else:
-            # 3. If the host has no reputation (the 'vec' is empty), return None (or null in JSON).
-            # This is the correct behavior for an Optional response model.
-            return None
-        # --- END FIX ---
+    # --- THE FIX IS HERE ---
+    # 1. Check if the response and the nested 'vec' exist and are not empty.
+    if response and response[0] and response[0].get('vec') and len(response[0]['vec']) > 0:
+        # 2. Only if it's not empty, access the first element.
+        return ReputationScore(**response[0]['vec'][0])
+    # 3. If the host has no reputation (the 'vec' is empty), return None (or null in JSON).
+    # This is the correct behavior for an Optional response model.
+    return None
+    # --- END FIX ---
+
+
+@router.post("/reputation:batchGet", response_model=ReputationBatch)
+async def batch_get_reputation(body: BatchGetRequest):
+    """
+    Reputation scores for several hosts at once; hosts without a score yet
+    are listed under `not_found`, per-host failures under `errors`.
+    """
+    with pinned_ledger(body.ledger_version):
+        return await batch_get(unique_ids(body.ids), _fetch_reputation)
+
+
+@router.get("/reputation/{host_address}", response_model=Optional[ReputationScore])
+async def get_reputation(
+    host_address: str, request: Request, ledger_version: Optional[int] = ledger_version_query()
+):
+    """
+    Fetches the on-chain reputation score for a specific host.
+    Correctly handles the case where a host has no reputation yet.
+    """
+    try:
+        with pinned_ledger(ledger_version):
+            score = await _fetch_reputation(host_address)
+        return etag_json_response(request, "reputation", score)
 
+    except (LedgerVersionUnavailable, CircuitOpenError):
+        raise
     except Exception as e:
-        logging.error(f"Failed to fetch reputation for {host_address}", exc_info=True)
+        logger.error("Failed to fetch reputation for %s", host_address, exc_info=True)
         raise HTTPException(status_code=500, detail="Error fetching reputation data.")
\ No newline at end of file
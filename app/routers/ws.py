@@ -3,10 +3,14 @@ import json
 import time
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
+from app.clients.ratelimit import BULK, call_priority
 from app.websockets import connection_manager
-from .jobs import SESSION_CACHE, get_job_details  # reuse the same shared dict
+from app.services.session_events import session_events
+from app.utils.metrics import record_ws_message
+from .jobs import _billing_meta, _fetch_job, _pop_cached, _set_cached, _update_cached
 
 router = APIRouter(prefix="/ws", tags=["websockets"])
+logger = logging.getLogger(__name__)
 
 
 @router.websocket("/{host_address}")
@@ -17,91 +21,95 @@ async def websocket_endpoint(websocket: WebSocket, host_address: str):
         while True:
             # Receive one message at a time
             raw = await websocket.receive_text()
+            # Any frame, even one we can't parse, shows the agent is alive.
+            connection_manager.touch(host_address)
             try:
                 message = json.loads(raw)
             except json.JSONDecodeError:
-                logging.warning(f"[WS] Non-JSON from {host_address}: {raw!r}")
+                record_ws_message("invalid_json")
+                logger.warning("[WS] Non-JSON from %s: %r", host_address, raw)
                 continue
 
             status = message.get("status")
+            record_ws_message(status)
+            if status == "pong":
+                connection_manager.touch(host_address, pong=True)
+                continue
             job_id_raw = message.get("job_id")
 
             # Normalize job_id (it can be 0; only skip if truly missing/invalid)
             try:
                 job_id = int(job_id_raw)
             except (TypeError, ValueError):
-                logging.warning(f"[WS] Missing/invalid job_id in message: {message}")
+                logger.warning("[WS] Missing/invalid job_id in message: %s", message)
                 continue
 
-            logging.info(f"[WS] {host_address} -> status={status} job_id={job_id}")
+            logger.info("[WS] %s -> status=%s job_id=%s", host_address, status, job_id)
 
             if status == "session_ready":
                 public_url = message.get("public_url")
                 token = message.get("token")
 
-                # DEV LOG (contains token). Remove or redact in production.
-                logging.info(
-                    f"[WS] session_ready: job={job_id} url={public_url} token={token}"
-                )
+                logger.info("[WS] session_ready: job=%s url=%s", job_id, public_url)
 
                 if not public_url or not token:
-                    logging.warning(
-                        f"[WS] session_ready missing url/token for job {job_id}: {message}"
-                    )
+                    logger.warning("[WS] session_ready missing url/token for job %s: %s", job_id, message)
                     continue
 
                 try:
                     # Validate job exists (and warm caches if you have any)
-                    _ = await get_job_details(job_id)
+                    # Background-ish: yields fullnode quota to user calls.
+                    with call_priority(BULK):
+                        job = await _fetch_job(job_id)
 
-                    # Store minimal session info; let HTTP layer compute billing.
-                    SESSION_CACHE[job_id] = {
+                    await _set_cached(job_id, {
                         "public_url": public_url,
                         "token": token,
                         "stats": None,
-                        # Clear any stale billing meta so jobs.py recomputes once.
-                        "_billing_meta": None,
+                        # Billing meta from the job just fetched: it also makes the
+                        # record expire at the job's max_end_time from the first write.
+                        "_billing_meta": _billing_meta(job),
                         "session_start_time": int(time.time()),
                         "error": None,
-                    }
-                    logging.info(f"[WS] Cached session for job {job_id}")
+                    })
+                    logger.info("[WS] Cached session for job %s", job_id)
+                    await session_events.broadcast(job_id, message)
                 except Exception as e:
-                    logging.error(
-                        f"[WS] Failed to cache session for job {job_id}: {e}",
-                        exc_info=True,
-                    )
+                    logger.error("[WS] Failed to cache session for job %s: %s", job_id, e, exc_info=True)
 
             elif status == "stats_update":
-                session = SESSION_CACHE.get(job_id)
-                if not session:
-                    logging.debug(
-                        f"[WS] Stats for unknown job {job_id}; waiting for session_ready."
-                    )
-                    continue
-
                 # Only update stats; billing is computed in GET /jobs/{id}/session
-                session["stats"] = message.get("stats")
+                if not await _update_cached(job_id, {"stats": message.get("stats")}):
+                    logger.debug("[WS] Stats for unknown job %s; waiting for session_ready.", job_id)
+                    continue
+                await session_events.broadcast(job_id, message)
 
             elif status == "session_stopped":
-                if job_id in SESSION_CACHE:
-                    SESSION_CACHE.pop(job_id, None)
-                    logging.info(f"[WS] Removed session cache for job {job_id}")
+                if await _pop_cached(job_id) is not None:
+                    logger.info("[WS] Removed session cache for job %s", job_id)
+                await session_events.broadcast(job_id, message)
 
             elif status == "session_error":
                 err = message.get("message") or "host reported session_error"
-                logging.warning(f"[WS] session_error for job {job_id}: {err}")
-                SESSION_CACHE[job_id] = {
+                logger.warning("[WS] session_error for job %s: %s", job_id, err)
+                await _set_cached(job_id, {
                     "public_url": None,
                     "token": None,
                     "stats": None,
                     "_billing_meta": None,
                     "session_start_time": None,
                     "error": err,
-                }
+                })
+                await session_events.broadcast(job_id, message)
 
             else:
-                logging.debug(f"[WS] Ignoring message for job {job_id}: {message}")
+                logger.debug("[WS] Ignoring message for job %s: %s", job_id, message)
+
+            # Resolve any acknowledged command (POST .../start?wait=) this answers.
+            await connection_manager.handle_reply(host_address, message)
 
     except WebSocketDisconnect:
-        connection_manager.disconnect(host_address)
-        logging.info(f"[WS] Disconnected: {host_address}")
+        logger.info("[WS] Disconnected: %s", host_address)
+    finally:
+        # Also runs when the socket was closed by a stalled send (see HostConnection).
+        await connection_manager.disconnect(host_address, websocket)
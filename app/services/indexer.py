@@ -0,0 +1,282 @@
+"""
+Event-tailing indexer.
+
+Tails the marketplace/escrow/reputation event handles from the fullnode REST
+API by sequence number and keeps the SQLite read model up to date. Events are
+only used as change notifications: for every job/host an event mentions we
+re-read the entity through the same view functions the routers use, so the
+read model never depends on the exact shape of event payloads.
+
+Routers call `indexer.read_model_if_fresh()` and fall back to live view calls
+when the indexer is disabled, has not caught up within
+`INDEXER_MAX_STALENESS_SECONDS`, or the request is pinned to a ledger version.
+
+Each indexed page also drops cached view results for the entities it touched
+that were read before the page's ledger version, so routers stop serving
+pre-write data as soon as the indexer has seen the write.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from app.cache.view_cache import ViewCache, view_cache as default_view_cache
+from app.clients.aptos import AptosClient, aptos_client
+from app.clients.ratelimit import BULK, call_priority
+from app.config import get_settings
+from app.services.read_model import ReadModel
+from app.utils.fanout import FanOutExecutor, upstream_fanout
+from app.utils.ledger import note_ledger_version, observe_ledger, pinned_version
+
+SET = get_settings()
+logger = logging.getLogger(__name__)
+
+HOST_FIELDS = ("host_address", "host", "owner")
+
+# Called with (view function name, argument) for every view cache entry dropped.
+InvalidationListener = Callable[[str, str], None]
+
+
+@dataclass(frozen=True)
+class EventStream:
+    account: str
+    event_handle: str  # fully-qualified struct holding the EventHandle
+    field_name: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.account}/{self.event_handle}/{self.field_name}"
+
+    @property
+    def module(self) -> str:
+        # "0xabc::escrow::JobEvents" -> "escrow"
+        parts = self.event_handle.split("::")
+        return parts[1] if len(parts) >= 3 else ""
+
+
+def parse_streams(raw: str, account: str) -> List[EventStream]:
+    """
+    "escrow::EscrowEvents/job_events,marketplace::Events/listing_events" ->
+    streams on `account`. Handles may also be fully qualified (`0x..::mod::Struct`).
+    """
+    streams = []
+    for part in raw.split(","):
+        handle, sep, field_name = part.strip().partition("/")
+        if not sep or not handle:
+            continue
+        if handle.count("::") == 1:
+            handle = f"{account}::{handle}"
+        streams.append(EventStream(account, handle, field_name))
+    return streams
+
+
+class EventIndexer:
+    def __init__(
+        self,
+        client: AptosClient,
+        db_path: str,
+        streams: List[EventStream],
+        page_size: int,
+        poll_interval: float,
+        fanout: FanOutExecutor,
+        module_address: str | None = None,
+        view_cache: ViewCache | None = None,
+    ):
+        self.client = client
+        self.db_path = db_path
+        self.streams = streams
+        self.page_size = page_size
+        self.poll_interval = poll_interval
+        self.fanout = fanout
+        self.module_address = module_address or SET.APTOS_MARKETPLACE_ADDRESS
+        self.view_cache = view_cache or default_view_cache
+        self._invalidation_listeners: List[InvalidationListener] = []
+
+        self.read_model: Optional[ReadModel] = None
+        # Wall-clock time at which every stream was last observed at its head.
+        self.synced_at: Optional[float] = None
+        # Ledger version the node was at when the last successful poll started:
+        # the read model reflects at least this version.
+        self.synced_version: Optional[int] = None
+        self.stats = {
+            "events": 0, "pages": 0, "errors": 0, "refreshed_jobs": 0, "refreshed_hosts": 0, "invalidated": 0,
+        }
+        self._task: Optional[asyncio.Task] = None
+
+    # --- freshness ---
+    def read_model_if_fresh(self, max_staleness: float | None = None) -> Optional[ReadModel]:
+        """The read model if it is fresh and the request isn't pinned to a ledger version."""
+        if self.read_model is None or self.synced_at is None or pinned_version() is not None:
+            return None
+        limit = SET.INDEXER_MAX_STALENESS_SECONDS if max_staleness is None else max_staleness
+        if time.time() - self.synced_at > limit:
+            return None
+        note_ledger_version(self.synced_version)
+        return self.read_model
+
+    def lag_seconds(self) -> Optional[float]:
+        return None if self.synced_at is None else time.time() - self.synced_at
+
+    # --- view helpers ---
+    def _payload(self, fn: str, arg: str) -> Dict[str, Any]:
+        return {"function": f"{self.module_address}::{fn}", "type_arguments": [], "arguments": [arg]}
+
+    async def _fetch_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        res = await self.client.view(self._payload("escrow::get_job", str(job_id)), cache=False)
+        return res[0] if res else None
+
+    async def _fetch_listing(self, host: str) -> Optional[Dict[str, Any]]:
+        res = await self.client.view(self._payload("marketplace::get_listing_view", host), cache=False)
+        return res[0] if res else None
+
+    async def _fetch_reputation(self, host: str) -> Optional[Dict[str, Any]]:
+        res = await self.client.view(self._payload("reputation::get_host_reputation", host), cache=False)
+        return res[0] if res else None
+
+    # --- cache invalidation ---
+    def add_invalidation_listener(self, listener: InvalidationListener):
+        self._invalidation_listeners.append(listener)
+
+    async def _invalidate(
+        self,
+        version: int,
+        job_ids: Set[int],
+        jobs: List[Dict[str, Any]],
+        listing_hosts: Set[str],
+        reputation_hosts: Set[str],
+    ):
+        targets = [("escrow::get_job", str(job_id)) for job_id in job_ids]
+        targets += [("escrow::get_jobs_by_renter", r) for r in {j["renter_address"] for j in jobs}]
+        targets += [("marketplace::get_listing_view", host) for host in listing_hosts]
+        targets += [("reputation::get_host_reputation", host) for host in reputation_hosts]
+        for fn, arg in targets:
+            if await self.view_cache.invalidate_before(self._payload(fn, arg), version):
+                self.stats["invalidated"] += 1
+            for listener in self._invalidation_listeners:
+                try:
+                    listener(fn.rsplit("::", 1)[-1], arg)
+                except Exception:
+                    logger.error("Invalidation listener failed for %s(%s)", fn, arg, exc_info=True)
+
+    # --- tailing ---
+    async def _process_page(self, stream: EventStream, events: List[Dict[str, Any]]):
+        job_ids: Set[int] = set()
+        listing_hosts: Set[str] = set()
+        reputation_hosts: Set[str] = set()
+        for event in events:
+            data = event.get("data") or {}
+            type_parts = event.get("type", "").split("::")
+            module = type_parts[1] if len(type_parts) >= 3 else stream.module
+            host = next((data[f] for f in HOST_FIELDS if data.get(f)), None)
+            if "job_id" in data:
+                job_ids.add(int(data["job_id"]))
+            if host:
+                if module == "reputation":
+                    reputation_hosts.add(host)
+                else:
+                    listing_hosts.add(host)
+
+        jobs_res = await self.fanout.map(self._fetch_job, job_ids)
+        jobs = [j for j in jobs_res.results.values() if j]
+        # A job starting/ending flips its host's listing availability.
+        listing_hosts.update(j["host_address"] for j in jobs)
+        listings_res = await self.fanout.map(self._fetch_listing, listing_hosts)
+        reputation_res = await self.fanout.map(self._fetch_reputation, reputation_hosts)
+
+        failed = jobs_res.skipped + listings_res.skipped + reputation_res.skipped
+        if failed:
+            # Don't advance the checkpoint; the page is retried on the next poll.
+            raise RuntimeError(f"{failed} entity refreshes failed for {stream.key}")
+
+        last = events[-1]
+        self.read_model.apply(
+            stream.key,
+            int(last["sequence_number"]) + 1,
+            ledger_version=int(last["version"]) if last.get("version") is not None else None,
+            jobs=jobs,
+            listings=listings_res.results,
+            reputation=reputation_res.results,
+        )
+        if last.get("version") is not None:
+            await self._invalidate(int(last["version"]), job_ids, jobs, listing_hosts, reputation_hosts)
+        self.stats["events"] += len(events)
+        self.stats["pages"] += 1
+        self.stats["refreshed_jobs"] += len(jobs)
+        self.stats["refreshed_hosts"] += len(listings_res.results) + len(reputation_res.results)
+
+    async def _drain_stream(self, stream: EventStream):
+        while True:
+            start = self.read_model.checkpoint(stream.key)
+            events = await self.client.get_events(
+                stream.account, stream.event_handle, stream.field_name, start=start, limit=self.page_size
+            )
+            if events:
+                await self._process_page(stream, events)
+            if len(events) < self.page_size:
+                return
+
+    async def poll_once(self):
+        """Drain every stream up to its head. Updates `synced_at` only if all succeed."""
+        if self.read_model is None:
+            self.read_model = ReadModel(self.db_path)
+        started = time.time()
+        ok = True
+        with observe_ledger() as seen:
+            for stream in self.streams:
+                try:
+                    await self._drain_stream(stream)
+                except Exception as e:
+                    ok = False
+                    self.stats["errors"] += 1
+                    logger.warning("Indexer failed on %s: %s", stream.key, e)
+        if ok:
+            self.synced_at = started
+            if seen.oldest is not None:
+                self.synced_version = seen.oldest
+
+    async def _run(self):
+        while True:
+            await self.poll_once()
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if self._task is None:
+            with call_priority(BULK):
+                self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.read_model is not None:
+            self.read_model.close()
+            self.read_model = None
+
+    def status(self) -> dict:
+        return {
+            "enabled": SET.INDEXER_ENABLED,
+            "lag_seconds": self.lag_seconds(),
+            "synced_version": self.synced_version,
+            "streams": {
+                s.key: self.read_model.checkpoint(s.key) if self.read_model else None
+                for s in self.streams
+            },
+            "rows": self.read_model.counts() if self.read_model else None,
+            **self.stats,
+        }
+
+
+indexer = EventIndexer(
+    client=aptos_client,
+    db_path=SET.INDEXER_DB_PATH,
+    streams=parse_streams(SET.INDEXER_EVENT_HANDLES, SET.APTOS_MARKETPLACE_ADDRESS),
+    page_size=SET.INDEXER_PAGE_SIZE,
+    poll_interval=SET.INDEXER_POLL_SECONDS,
+    fanout=upstream_fanout,
+)
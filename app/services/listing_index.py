@@ -0,0 +1,176 @@
+"""
+In-memory secondary indexes over the listings snapshot for `/listings/search`.
+
+Each numeric field (price, CPU cores, RAM) has a sorted array of
+`(value, host_address)` pairs, globally and per GPU model (hash index on the
+normalized model name). A query estimates every candidate range with bisect,
+then either streams the sort field's range in order (stopping after `limit`
+matches) or, when another filter is far more selective, materializes that
+smaller range and sorts it. Updates are incremental (`insort`/`del`).
+"""
+from __future__ import annotations
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List, Optional, Tuple
+
+from app.models.schemas import Listing
+
+FIELDS = ("price_per_second", "cpu_cores", "ram_gb")
+
+Entry = Tuple[int, str]  # (field value, host_address)
+
+
+def normalize_gpu_model(model: str) -> str:
+    return " ".join(model.lower().split())
+
+
+def _field_value(listing: Listing, field: str) -> Optional[int]:
+    if field == "price_per_second":
+        return listing.price_per_second
+    if listing.physical is None:
+        return None
+    return getattr(listing.physical, field)
+
+
+class _SortedFields:
+    """One sorted (value, host) array per numeric field."""
+
+    __slots__ = ("arrays",)
+
+    def __init__(self):
+        self.arrays: Dict[str, List[Entry]] = {f: [] for f in FIELDS}
+
+    def add(self, listing: Listing):
+        for f in FIELDS:
+            v = _field_value(listing, f)
+            if v is not None:
+                insort(self.arrays[f], (v, listing.host_address))
+
+    def remove(self, listing: Listing):
+        for f in FIELDS:
+            v = _field_value(listing, f)
+            if v is None:
+                continue
+            arr = self.arrays[f]
+            i = bisect_left(arr, (v, listing.host_address))
+            if i < len(arr) and arr[i] == (v, listing.host_address):
+                del arr[i]
+
+
+def _bounds(arr: List[Entry], lo: Optional[int], hi: Optional[int]) -> Tuple[int, int]:
+    """Index range of entries with lo <= value <= hi."""
+    start = 0 if lo is None else bisect_left(arr, (lo, ""))
+    # Host addresses are hex strings, so any of them sorts below "\uffff".
+    end = len(arr) if hi is None else bisect_right(arr, (hi, "\uffff"))
+    return start, end
+
+
+class ListingIndex:
+    def __init__(self):
+        self._listings: Dict[str, Listing] = {}
+        self._all = _SortedFields()
+        self._by_gpu: Dict[str, _SortedFields] = {}
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self._listings)
+
+    def upsert(self, listing: Listing):
+        self.remove(listing.host_address)
+        self._listings[listing.host_address] = listing
+        self._all.add(listing)
+        if listing.physical is not None:
+            gpu = normalize_gpu_model(listing.physical.gpu_model)
+            self._by_gpu.setdefault(gpu, _SortedFields()).add(listing)
+        self.version += 1
+
+    def remove(self, host_address: str):
+        listing = self._listings.pop(host_address, None)
+        if listing is None:
+            return
+        self._all.remove(listing)
+        if listing.physical is not None:
+            gpu = normalize_gpu_model(listing.physical.gpu_model)
+            bucket = self._by_gpu.get(gpu)
+            if bucket is not None:
+                bucket.remove(listing)
+                if not bucket.arrays["price_per_second"]:
+                    del self._by_gpu[gpu]
+        self.version += 1
+
+    def gpu_models(self) -> Dict[str, int]:
+        return {gpu: len(b.arrays["price_per_second"]) for gpu, b in self._by_gpu.items()}
+
+    def search(
+        self,
+        ranges: Dict[str, Tuple[Optional[int], Optional[int]]],
+        gpu_model: Optional[str] = None,
+        sort_field: str = "price_per_second",
+        descending: bool = False,
+        limit: int = 20,
+        after: Optional[Entry] = None,
+    ) -> Tuple[List[Listing], Optional[Entry]]:
+        """
+        `ranges` maps field -> (min, max), either bound optional. Results are
+        ordered by (sort_field, host_address); `after` is the last entry of the
+        previous page. Returns the page and the entry to resume after, if any.
+        """
+        source = self._all
+        if gpu_model is not None:
+            source = self._by_gpu.get(normalize_gpu_model(gpu_model))
+            if source is None:
+                return [], None
+
+        active = {f: r for f, r in ranges.items() if r != (None, None)}
+        candidates = {}
+        for f in set(active) | {sort_field}:
+            arr = source.arrays[f]
+            lo, hi = active.get(f, (None, None))
+            candidates[f] = _bounds(arr, lo, hi)
+
+        def matches(listing: Listing) -> bool:
+            for f, (lo, hi) in active.items():
+                v = _field_value(listing, f)
+                if v is None or (lo is not None and v < lo) or (hi is not None and v > hi):
+                    return False
+            return True
+
+        sort_arr = source.arrays[sort_field]
+        start, end = candidates[sort_field]
+        smallest = min(candidates, key=lambda f: candidates[f][1] - candidates[f][0])
+        sort_size = end - start
+        small_size = candidates[smallest][1] - candidates[smallest][0]
+
+        # Streaming the sort order stops early; only materialize another
+        # range when it is much smaller than the sort field's range.
+        if smallest == sort_field or sort_size <= 8 * small_size:
+            if after is not None:
+                if descending:
+                    end = min(end, bisect_left(sort_arr, after))
+                else:
+                    start = max(start, bisect_right(sort_arr, after))
+            positions = range(end - 1, start - 1, -1) if descending else range(start, end)
+            entries = (sort_arr[i] for i in positions)
+        else:
+            s, e = candidates[smallest]
+            picked = []
+            for _, host in source.arrays[smallest][s:e]:
+                v = _field_value(self._listings[host], sort_field)
+                if v is not None:
+                    picked.append((v, host))
+            picked.sort(reverse=descending)
+            if after is not None:
+                picked = [p for p in picked if (p < after if descending else p > after)]
+            entries = iter(picked)
+
+        page: List[Listing] = []
+        last: Optional[Entry] = None
+        for entry in entries:
+            listing = self._listings[entry[1]]
+            if not matches(listing):
+                continue
+            if len(page) == limit:
+                # There is at least one more match: resume after the last served.
+                return page, last
+            page.append(listing)
+            last = entry
+        return page, None
@@ -0,0 +1,241 @@
+"""
+Materialized snapshot of the listings that are online and available.
+
+The snapshot is updated incrementally from ConnectionManager connect/disconnect
+events and periodically re-validated on-chain by a background task, so the
+`/listings` endpoint only has to slice an in-memory list.
+
+Every change bumps `version`. Readers get an immutable `SnapshotView` sorted by
+host address; the last few views are retained so a client paging with a
+cursor keeps seeing the version it started on.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Collection, Dict, List, NamedTuple, Optional, Set
+
+from app.clients.ratelimit import BULK, call_priority
+from app.models.schemas import Listing
+from app.services.listing_index import ListingIndex
+from app.utils.fanout import FanOutExecutor
+from app.utils.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Returns the host's listing if it is registered and available, else None.
+ListingFetcher = Callable[[str], Awaitable[Optional[Listing]]]
+
+
+class SnapshotView(NamedTuple):
+    version: int
+    keys: List[str]  # sorted host addresses, parallel to `items`
+    items: List[Listing]
+
+
+class ListingsSnapshot:
+    def __init__(
+        self,
+        fetch_listing: ListingFetcher,
+        online_hosts: Callable[[], Collection[str]],
+        refresh_interval: float,
+        fanout: FanOutExecutor,
+        retained_versions: int = 8,
+    ):
+        self.fetch_listing = fetch_listing
+        self.fanout = fanout
+        self.online_hosts = online_hosts
+        self.refresh_interval = refresh_interval
+        self.retained_versions = retained_versions
+
+        self._items: Dict[str, Listing] = {}
+        # Secondary indexes for /listings/search, kept in step with `_items`.
+        self.index = ListingIndex()
+        self._views: "OrderedDict[int, SnapshotView]" = OrderedDict()
+        self.version = 0
+        self.refreshed_at: Optional[float] = None
+        self.last_refresh_duration: Optional[float] = None
+        self.refresh_count = 0
+        self.fetch_errors = 0
+        self.last_skipped = 0
+
+        self._task: Optional[asyncio.Task] = None
+        # The full refresh currently running, shared by every caller that needs one.
+        self._refreshing: Optional[asyncio.Task] = None
+        # Hosts that connected since the last batch, and the task draining them.
+        self._connected: Set[str] = set()
+        self._connecting: Optional[asyncio.Task] = None
+
+    # --- reads ---
+    def current(self) -> SnapshotView:
+        """Current sorted view; only rebuilt when the snapshot changed."""
+        view = self._views.get(self.version)
+        if view is None:
+            keys = sorted(self._items)
+            view = SnapshotView(self.version, keys, [self._items[k] for k in keys])
+            self._views[self.version] = view
+            while len(self._views) > self.retained_versions:
+                self._views.popitem(last=False)
+        return view
+
+    def at_version(self, version: int) -> Optional[SnapshotView]:
+        """A previously served view, if it is still retained."""
+        if version == self.version:
+            return self.current()
+        return self._views.get(version)
+
+    def listings(self) -> List[Listing]:
+        return self.current().items
+
+    def age(self) -> Optional[float]:
+        return None if self.refreshed_at is None else time.time() - self.refreshed_at
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "retained_versions": list(self._views),
+            "size": len(self._items),
+            "age_seconds": self.age(),
+            "last_refresh_duration_seconds": self.last_refresh_duration,
+            "refresh_count": self.refresh_count,
+            "fetch_errors": self.fetch_errors,
+            "last_skipped_hosts": self.last_skipped,
+            "fanout": self.fanout.stats(),
+        }
+
+    # --- writes ---
+    def _apply(self, host_address: str, listing: Optional[Listing]):
+        if listing is None:
+            if self._items.pop(host_address, None) is not None:
+                self.index.remove(host_address)
+                self.version += 1
+        elif self._items.get(host_address) != listing:
+            self._items[host_address] = listing
+            self.index.upsert(listing)
+            self.version += 1
+
+    async def refresh_connected(self):
+        """Fetch listings for newly connected hosts through the shared fan-out.
+
+        Connects that arrive while a batch is in flight are picked up by the
+        next one, so a reconnect storm is bounded by the same limiter as the
+        periodic refresh.
+        """
+        while self._connected:
+            hosts = sorted(self._connected)
+            self._connected.clear()
+            with span("snapshot.connect", hosts=len(hosts)):
+                res = await self.fanout.map(self.fetch_listing, hosts)
+            # A host may have gone away while we were waiting on the node.
+            online = self.online_hosts()
+            for host_address, listing in res.results.items():
+                if host_address in online:
+                    self._apply(host_address, listing)
+            self.fetch_errors += len(res.errors)
+            for host_address, e in res.errors.items():
+                logger.warning("Could not fetch listing view for host %s: %s", host_address, e)
+            # Not started before the deadline: retry with the next batch.
+            self._connected.update(h for h in res.not_started if h in online)
+
+    async def refresh_all(self):
+        started = time.perf_counter()
+        hosts = list(self.online_hosts())
+        with span("snapshot.refresh", hosts=len(hosts)):
+            res = await self.fanout.map(self.fetch_listing, hosts)
+
+        online = self.online_hosts()
+        for host_address in list(self._items):
+            if host_address not in online:
+                self._apply(host_address, None)
+        for host_address, listing in res.results.items():
+            if host_address in online:
+                self._apply(host_address, listing)
+
+        # Failed or never-attempted hosts keep their last known listing rather
+        # than disappearing on a transient upstream error.
+        self.fetch_errors += len(res.errors)
+        self.last_skipped = res.skipped
+        if res.skipped:
+            logger.warning(
+                "Listings refresh skipped %d of %d hosts (%d errors, %d not started)",
+                res.skipped, len(hosts), len(res.errors), len(res.not_started),
+            )
+
+        self.refreshed_at = time.time()
+        self.last_refresh_duration = time.perf_counter() - started
+        self.refresh_count += 1
+
+    async def refresh(self):
+        """Run a full refresh, or join the one already in flight."""
+        if self._refreshing is None:
+            self._refreshing = asyncio.create_task(self.refresh_all())
+            self._refreshing.add_done_callback(self._refresh_done)
+        # Shielded: a caller that goes away must not cancel the shared refresh.
+        await asyncio.shield(self._refreshing)
+
+    def _refresh_done(self, task: asyncio.Task):
+        if self._refreshing is task:
+            self._refreshing = None
+
+    async def ensure_fresh(self):
+        """Build the first snapshot inline if the background task has not yet.
+
+        Concurrent cold-start requests all wait on the same refresh instead of
+        each fanning out to every host.
+        """
+        if self.refreshed_at is None:
+            await self.refresh()
+
+    # --- ConnectionManager listeners ---
+    def on_connect(self, host_address: str):
+        self._connected.add(host_address)
+        if self._connecting is None:
+            with call_priority(BULK):
+                self._connecting = asyncio.create_task(self.refresh_connected())
+            self._connecting.add_done_callback(self._connecting_done)
+
+    def _connecting_done(self, task: asyncio.Task):
+        if self._connecting is task:
+            self._connecting = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Listing refresh for connected hosts failed", exc_info=task.exception())
+
+    def on_disconnect(self, host_address: str):
+        self._apply(host_address, None)
+
+    # --- background refresher ---
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                logger.error("Listings snapshot refresh failed", exc_info=True)
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        if self._task is None:
+            # Background refreshes yield fullnode quota to user-facing calls.
+            with call_priority(BULK):
+                self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._connecting is not None:
+            self._connecting.cancel()
+            try:
+                await self._connecting
+            except asyncio.CancelledError:
+                pass
+        if self._refreshing is not None:
+            self._refreshing.cancel()
+            try:
+                await self._refreshing
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,170 @@
+"""
+SQLite read model maintained by the event indexer.
+
+Jobs are stored in typed columns (indexed by renter and host) so history
+queries never touch the fullnode; listing and reputation views are stored as
+the raw view JSON so the routers can reuse their existing parsers. Each event
+stream's next sequence number is checkpointed in the same transaction as the
+rows it produced.
+"""
+from __future__ import annotations
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional
+import orjson
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id INTEGER PRIMARY KEY,
+    renter_address TEXT NOT NULL,
+    host_address TEXT NOT NULL,
+    start_time INTEGER NOT NULL,
+    max_end_time INTEGER NOT NULL,
+    total_escrow_amount INTEGER NOT NULL,
+    claimed_amount INTEGER NOT NULL,
+    is_active INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_renter ON jobs (renter_address, job_id);
+CREATE INDEX IF NOT EXISTS jobs_by_host ON jobs (host_address, job_id);
+
+CREATE TABLE IF NOT EXISTS listings (
+    host_address TEXT PRIMARY KEY,
+    is_available INTEGER NOT NULL,
+    view_json BLOB NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS listings_available ON listings (is_available);
+
+CREATE TABLE IF NOT EXISTS reputation (
+    host_address TEXT PRIMARY KEY,
+    view_json BLOB NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS checkpoints (
+    stream TEXT PRIMARY KEY,
+    next_sequence_number INTEGER NOT NULL,
+    ledger_version INTEGER,
+    updated_at REAL NOT NULL
+);
+"""
+
+JOB_COLUMNS = (
+    "job_id",
+    "renter_address",
+    "host_address",
+    "start_time",
+    "max_end_time",
+    "total_escrow_amount",
+    "claimed_amount",
+    "is_active",
+)
+
+
+class ReadModel:
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    # --- writes ---
+    def apply(
+        self,
+        stream: str,
+        next_sequence_number: int,
+        ledger_version: Optional[int] = None,
+        jobs: Iterable[Dict[str, Any]] = (),
+        listings: Dict[str, Any] | None = None,
+        reputation: Dict[str, Any] | None = None,
+    ):
+        """Upsert one page worth of refreshed entities and advance the checkpoint atomically."""
+        now = time.time()
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO jobs ({', '.join(JOB_COLUMNS)}, updated_at) "
+                f"VALUES ({', '.join('?' * len(JOB_COLUMNS))}, ?)",
+                [
+                    (
+                        int(j["job_id"]),
+                        j["renter_address"],
+                        j["host_address"],
+                        int(j["start_time"]),
+                        int(j["max_end_time"]),
+                        int(j["total_escrow_amount"]),
+                        int(j["claimed_amount"]),
+                        int(bool(j["is_active"])),
+                        now,
+                    )
+                    for j in jobs
+                ],
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO listings (host_address, is_available, view_json, updated_at) VALUES (?, ?, ?, ?)",
+                [
+                    (host, int(bool(view and view.get("is_available"))), orjson.dumps(view), now)
+                    for host, view in (listings or {}).items()
+                ],
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO reputation (host_address, view_json, updated_at) VALUES (?, ?, ?)",
+                [(host, orjson.dumps(view), now) for host, view in (reputation or {}).items()],
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (stream, next_sequence_number, ledger_version, updated_at) VALUES (?, ?, ?, ?)",
+                (stream, next_sequence_number, ledger_version, now),
+            )
+
+    # --- reads ---
+    def checkpoint(self, stream: str) -> int:
+        row = self.conn.execute(
+            "SELECT next_sequence_number FROM checkpoints WHERE stream = ?", (stream,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = {c: row[c] for c in JOB_COLUMNS}
+        job["is_active"] = bool(job["is_active"])
+        return job
+
+    def get_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def jobs_by_renter(self, renter_address: str) -> List[Dict[str, Any]]:
+        rows = self.conn.execute(
+            "SELECT * FROM jobs WHERE renter_address = ? ORDER BY job_id", (renter_address,)
+        ).fetchall()
+        return [self._job(r) for r in rows]
+
+    def jobs_by_host(self, host_address: str) -> List[Dict[str, Any]]:
+        rows = self.conn.execute(
+            "SELECT * FROM jobs WHERE host_address = ? ORDER BY job_id", (host_address,)
+        ).fetchall()
+        return [self._job(r) for r in rows]
+
+    def get_listing_view(self, host_address: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT view_json FROM listings WHERE host_address = ?", (host_address,)
+        ).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    def get_reputation_view(self, host_address: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT view_json FROM reputation WHERE host_address = ?", (host_address,)
+        ).fetchone()
+        return orjson.loads(row[0]) if row else None
+
+    def counts(self) -> Dict[str, int]:
+        return {
+            table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("jobs", "listings", "reputation")
+        }
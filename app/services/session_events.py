@@ -0,0 +1,101 @@
+"""
+Fan-out of host-agent session messages to renter-facing streams.
+
+The WebSocket handler broadcasts every session message it receives for a job.
+The message is delivered to this worker's open `/jobs/{job_id}/session/stream`
+subscribers and relayed over the shared state bus so streams held by other
+workers see it too. Each subscriber holds a small bounded queue; a slow
+consumer never blocks the publisher: when its queue is full the oldest
+message is dropped (the stream re-reads current state on every event anyway).
+"""
+from __future__ import annotations
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Set
+
+from app.services.shared_state import WORKER_ID, SharedStateBackend, shared_state
+
+logger = logging.getLogger(__name__)
+
+SESSION_EVENTS_CHANNEL = "session-events"
+
+SessionListener = Callable[[int, dict], None]
+
+
+class SessionEventBus:
+    def __init__(
+        self,
+        state: Optional[SharedStateBackend] = None,
+        worker_id: str = WORKER_ID,
+        queue_size: int = 16,
+    ):
+        self.state = state or shared_state
+        self.worker_id = worker_id
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._relay: Optional[asyncio.Task] = None
+        # Sync callbacks fired with (job_id, message) for every message, local or relayed
+        self._listeners: List[SessionListener] = []
+        self.stats = {"published": 0, "delivered": 0, "dropped": 0}
+
+    def subscribe(self, job_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, job_id: int, queue: asyncio.Queue):
+        queues = self._subscribers.get(job_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[job_id]
+
+    def add_listener(self, listener: SessionListener):
+        self._listeners.append(listener)
+
+    def publish(self, job_id: int, message: dict):
+        """Deliver to this worker's subscribers only."""
+        self.stats["published"] += 1
+        for listener in self._listeners:
+            try:
+                listener(job_id, message)
+            except Exception:
+                logger.error("Session listener failed for job %s", job_id, exc_info=True)
+        for queue in self._subscribers.get(job_id, ()):
+            if queue.full():
+                queue.get_nowait()
+                self.stats["dropped"] += 1
+            queue.put_nowait(message)
+            self.stats["delivered"] += 1
+
+    async def broadcast(self, job_id: int, message: dict):
+        """Deliver locally and relay to every other worker."""
+        self.publish(job_id, message)
+        await self.state.publish(
+            SESSION_EVENTS_CHANNEL, {"job_id": job_id, "message": message, "worker": self.worker_id}
+        )
+
+    def subscriber_count(self) -> int:
+        return sum(len(q) for q in self._subscribers.values())
+
+    async def _on_event(self, event: dict):
+        if event.get("worker") != self.worker_id:
+            self.publish(int(event["job_id"]), event["message"])
+
+    async def start(self):
+        if self._relay is None:
+            self._relay = asyncio.create_task(self.state.consume(SESSION_EVENTS_CHANNEL, self._on_event))
+            await asyncio.sleep(0)
+
+    async def stop(self):
+        if self._relay is not None:
+            self._relay.cancel()
+            try:
+                await self._relay
+            except asyncio.CancelledError:
+                pass
+            self._relay = None
+
+
+session_events = SessionEventBus()
@@ -0,0 +1,265 @@
+"""
+Session records for the in-memory shared state backend.
+
+Host agents report sessions over the WebSocket and nothing guarantees they
+are ever removed: an agent can vanish without `session_stopped`, a job can
+run past its `max_end_time`, an errored session is never cleaned up. The
+store bounds that:
+
+- Expiry: each record gets a deadline - the job's `max_end_time` (from the
+  cached `_billing_meta`) plus `grace`, `error_ttl` for errored sessions,
+  otherwise `ttl` after the last write. Deadlines sit in a min-heap, so
+  `expire()` (run periodically by the backend) only touches records that are
+  actually due; reads never return a record past its deadline.
+- LRU cap: past `max_sessions`, the least recently used record is evicted.
+- Warm restart: `snapshot()` writes the records changed since the last one
+  (and deletes removed ones) to a SQLite file; `load()` reads the live rows
+  back at startup, so renters keep seeing "ready" across a deploy instead of
+  "pending" until every agent reconnects.
+
+Records are only tracked as changed through `set`/`pop`; code that edits a
+record must write it back (the backend's `update_session` does).
+"""
+from __future__ import annotations
+import asyncio
+import heapq
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import orjson
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    job_id INTEGER PRIMARY KEY,
+    record BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def session_deadline(record: Dict[str, Any], now: float, ttl: float, error_ttl: float, grace: float) -> float:
+    """Unix time at which a session record expires (shared with the Redis backend)."""
+    if record.get("error"):
+        return now + error_ttl
+    meta = record.get("_billing_meta") or {}
+    if meta.get("max_end_time"):
+        return float(meta["max_end_time"]) + grace
+    return now + ttl
+
+
+class SessionStore:
+    def __init__(
+        self,
+        max_sessions: int = 100_000,
+        ttl: float = 86_400,
+        error_ttl: float = 600,
+        grace: float = 60,
+        snapshot_path: Optional[str] = None,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.grace = grace
+        self.snapshot_path = snapshot_path or None
+        # job_id -> record, least recently used first
+        self._records: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._deadlines: Dict[int, float] = {}
+        # (deadline, job_id); at most one live entry per job, see _schedule()
+        self._heap: List[Tuple[float, int]] = []
+        self._scheduled: Dict[int, float] = {}
+        self._dirty: Set[int] = set()
+        self._deleted: Set[int] = set()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._snapshot_lock = asyncio.Lock()
+        self.stats = {"expired": 0, "evicted": 0, "snapshots": 0, "snapshot_rows": 0, "loaded": 0}
+
+    # --- mapping interface ---
+    def get(self, job_id: int, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        record = self._records.get(job_id)
+        if record is None:
+            return None
+        if self._deadlines[job_id] <= (time.time() if now is None else now):
+            self._remove(job_id)
+            self.stats["expired"] += 1
+            return None
+        self._records.move_to_end(job_id)
+        return record
+
+    def set(self, job_id: int, record: Dict[str, Any], now: Optional[float] = None):
+        now = time.time() if now is None else now
+        self._records[job_id] = record
+        self._records.move_to_end(job_id)
+        self._deadlines[job_id] = self._deadline(record, now)
+        self._schedule(job_id, self._deadlines[job_id])
+        # Changes are only tracked for snapshot() to write out.
+        if self.snapshot_path:
+            self._dirty.add(job_id)
+            self._deleted.discard(job_id)
+        while len(self._records) > self.max_sessions:
+            oldest = next(iter(self._records))
+            self._remove(oldest)
+            self.stats["evicted"] += 1
+
+    def pop(self, job_id: int, default: Any = None) -> Any:
+        if job_id not in self._records:
+            return default
+        return self._remove(job_id)
+
+    def __getitem__(self, job_id: int) -> Dict[str, Any]:
+        record = self.get(job_id)
+        if record is None:
+            raise KeyError(job_id)
+        return record
+
+    def __setitem__(self, job_id: int, record: Dict[str, Any]):
+        self.set(job_id, record)
+
+    def __contains__(self, job_id: object) -> bool:
+        return job_id in self._records
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(list(self._records))
+
+    # --- expiry ---
+    def _deadline(self, record: Dict[str, Any], now: float) -> float:
+        return session_deadline(record, now, self.ttl, self.error_ttl, self.grace)
+
+    def _schedule(self, job_id: int, deadline: float):
+        # A later deadline needs no new heap entry: when the earlier one comes
+        # due, expire() finds the record still alive and re-schedules it. So a
+        # session written every second (stats_update) costs no heap traffic.
+        scheduled = self._scheduled.get(job_id)
+        if scheduled is None or deadline < scheduled:
+            self._scheduled[job_id] = deadline
+            heapq.heappush(self._heap, (deadline, job_id))
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Drop every record whose deadline has passed; returns how many."""
+        now = time.time() if now is None else now
+        expired = 0
+        # self._heap, not a local: _remove() may rebuild it mid-loop.
+        while self._heap and self._heap[0][0] <= now:
+            deadline, job_id = heapq.heappop(self._heap)
+            if self._scheduled.get(job_id) != deadline:
+                continue  # removed, or superseded by an earlier entry for the job
+            del self._scheduled[job_id]
+            current = self._deadlines.get(job_id)
+            if current is None:
+                continue  # already removed
+            if current <= now:
+                self._remove(job_id)
+                expired += 1
+            else:
+                self._schedule(job_id, current)
+        self.stats["expired"] += expired
+        return expired
+
+    def _remove(self, job_id: int) -> Optional[Dict[str, Any]]:
+        record = self._records.pop(job_id, None)
+        self._deadlines.pop(job_id, None)
+        # The heap entry goes stale (expire() skips it); rebuild the heap once
+        # stale entries outnumber live ones, so start/stop churn can't grow it.
+        self._scheduled.pop(job_id, None)
+        if len(self._heap) > 2 * len(self._scheduled) + 64:
+            self._heap = [(deadline, j) for j, deadline in self._scheduled.items()]
+            heapq.heapify(self._heap)
+        if self.snapshot_path:
+            self._dirty.discard(job_id)
+            self._deleted.add(job_id)
+        return record
+
+    # --- persistence ---
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            # Written from a worker thread (snapshot) and read at startup (load).
+            self._conn = sqlite3.connect(self.snapshot_path, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def load(self, now: Optional[float] = None) -> int:
+        """Replace the contents with the live rows of the last snapshot; returns how many were loaded."""
+        if not self.snapshot_path:
+            return 0
+        now = time.time() if now is None else now
+        conn = self._connect()
+        conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+        rows = conn.execute(
+            "SELECT job_id, record, expires_at FROM sessions ORDER BY updated_at DESC LIMIT ?",
+            (self.max_sessions,),
+        ).fetchall()
+        self._records.clear()
+        self._deadlines.clear()
+        self._heap.clear()
+        self._scheduled.clear()
+        for job_id, raw, expires_at in reversed(rows):  # oldest first: LRU order
+            self._records[job_id] = orjson.loads(raw)
+            self._deadlines[job_id] = expires_at
+            self._scheduled[job_id] = expires_at
+            self._heap.append((expires_at, job_id))
+        heapq.heapify(self._heap)
+        self._dirty.clear()
+        self._deleted.clear()
+        self.stats["loaded"] = len(rows)
+        return len(rows)
+
+    def _write(self, upserts: List[Tuple[int, bytes, float, float]], deletes: List[Tuple[int]]):
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN")
+            if deletes:
+                conn.executemany("DELETE FROM sessions WHERE job_id = ?", deletes)
+            if upserts:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO sessions (job_id, record, expires_at, updated_at) VALUES (?, ?, ?, ?)",
+                    upserts,
+                )
+
+    async def snapshot(self) -> int:
+        """Persist the changes since the last snapshot; returns the number of rows written."""
+        if not self.snapshot_path:
+            return 0
+        async with self._snapshot_lock:
+            if not self._dirty and not self._deleted:
+                return 0
+            now = time.time()
+            # Serialize on the loop (records may change while the thread writes).
+            upserts = [
+                (job_id, orjson.dumps(self._records[job_id]), self._deadlines[job_id], now)
+                for job_id in self._dirty
+            ]
+            deletes = [(job_id,) for job_id in self._deleted]
+            self._dirty = set()
+            self._deleted = set()
+            try:
+                await asyncio.to_thread(self._write, upserts, deletes)
+            except sqlite3.Error:
+                # Retry these rows next time unless they changed again meanwhile.
+                self._dirty.update(j for j, *_ in upserts if j in self._records and j not in self._deleted)
+                self._deleted.update(j for (j,) in deletes if j not in self._records)
+                raise
+            self.stats["snapshots"] += 1
+            self.stats["snapshot_rows"] += len(upserts) + len(deletes)
+            return len(upserts) + len(deletes)
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "sessions": len(self._records),
+            "max_sessions": self.max_sessions,
+            "scheduled": len(self._heap),
+            "pending_writes": len(self._dirty) + len(self._deleted),
+            "snapshot_path": self.snapshot_path,
+        }
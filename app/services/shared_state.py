@@ -0,0 +1,386 @@
+"""
+State shared between uvicorn workers/replicas.
+
+Three things must be visible to every worker for the API to scale past one
+process: session records reported by host agents, the host presence registry
+(which worker owns each agent's WebSocket), and a pub/sub bus used to route
+commands to the owning worker and to relay presence and session events.
+
+`InMemoryStateBackend` is the single-process default (and the in-process fake
+for tests: several ConnectionManagers can share one instance to simulate
+workers); its session records live in an expiring `SessionStore` that can be
+snapshotted to disk for warm restarts. `RedisStateBackend` is selected with
+`SHARED_STATE_BACKEND=redis`; its records get the same deadlines
+(`session_deadline`) as Redis key expiries and a cap of their own. The
+periodic maintenance task (expiry sweep, snapshots) only exists for the memory
+backend.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+import orjson
+
+from app.config import get_settings
+from app.services.session_store import SessionStore, session_deadline
+
+SET = get_settings()
+logger = logging.getLogger(__name__)
+
+# Identifies this process in the presence registry and on the bus.
+WORKER_ID = uuid.uuid4().hex
+
+
+class SharedStateBackend:
+    # --- session records ---
+    async def get_session(self, job_id: int) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def set_session(self, job_id: int, record: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def update_session(self, job_id: int, fields: Dict[str, Any]) -> bool:
+        """
+        Set `fields` on an existing record, leaving its other fields alone, so
+        concurrent writers of different fields (WS stats, HTTP billing meta)
+        don't overwrite each other. Returns False, writing nothing, if there is
+        no record.
+        """
+        raise NotImplementedError
+
+    async def delete_session(self, job_id: int) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def session_count(self) -> int:
+        raise NotImplementedError
+
+    # --- host presence ---
+    async def register_host(self, host_address: str, worker_id: str):
+        raise NotImplementedError
+
+    async def unregister_host(self, host_address: str, worker_id: str):
+        """Remove the entry only if `worker_id` still owns it (the agent may have reconnected elsewhere)."""
+        raise NotImplementedError
+
+    async def host_owner(self, host_address: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def online_hosts(self) -> Dict[str, str]:
+        """host_address -> owning worker id."""
+        raise NotImplementedError
+
+    # --- pub/sub ---
+    async def publish(self, channel: str, message: Dict[str, Any]) -> int:
+        """Returns how many subscribers the message reached (0: nobody is listening)."""
+        raise NotImplementedError
+
+    def subscribe(self, channel: str) -> AsyncIterator[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def consume(
+        self,
+        channel: str,
+        handler: Callable[[Dict[str, Any]], Awaitable[None]],
+        initial_backoff: float = 0.1,
+        max_backoff: float = 5.0,
+    ):
+        """
+        Feed every message on `channel` to `handler` until cancelled. A dropped
+        subscription (e.g. a Redis connection reset) is logged and re-opened
+        with exponential backoff; a failing handler only loses its message.
+        """
+        backoff = initial_backoff
+        while True:
+            try:
+                async for message in self.subscribe(channel):
+                    backoff = initial_backoff
+                    try:
+                        await handler(message)
+                    except Exception:
+                        logger.error("Failed to handle message on %s: %s", channel, message, exc_info=True)
+                logger.warning("Subscription to %s ended; resubscribing in %.1fs", channel, backoff)
+            except Exception:
+                logger.error("Subscription to %s failed; resubscribing in %.1fs", channel, backoff, exc_info=True)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, max_backoff)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class InMemoryStateBackend(SharedStateBackend):
+    def __init__(self, sessions: Optional[SessionStore] = None, maintenance_interval: float = 5.0):
+        # { job_id(int): { public_url, token, stats?, _billing_meta? } }
+        self.sessions = sessions if sessions is not None else SessionStore()
+        self.maintenance_interval = maintenance_interval
+        self.hosts: Dict[str, str] = {}
+        self._channels: Dict[str, Set[asyncio.Queue]] = {}
+        self._maintenance: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Reload the last session snapshot, then expire and snapshot periodically."""
+        if self._maintenance is not None:
+            return
+        started = time.perf_counter()
+        loaded = self.sessions.load()
+        if loaded:
+            logger.info("Restored %s sessions in %.1f ms", loaded, (time.perf_counter() - started) * 1000)
+        self._maintenance = asyncio.create_task(self._maintain())
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(self.maintenance_interval)
+            try:
+                self.sessions.expire()
+                await self.sessions.snapshot()
+            except Exception:
+                logger.error("Session store maintenance failed", exc_info=True)
+
+    async def close(self):
+        if self._maintenance is not None:
+            self._maintenance.cancel()
+            self._maintenance = None
+        await self.sessions.snapshot()
+        self.sessions.close()
+
+    async def get_session(self, job_id: int) -> Optional[Dict[str, Any]]:
+        return self.sessions.get(job_id)
+
+    async def set_session(self, job_id: int, record: Dict[str, Any]):
+        self.sessions.set(job_id, record)
+
+    async def update_session(self, job_id: int, fields: Dict[str, Any]) -> bool:
+        record = self.sessions.get(job_id)
+        if record is None:
+            return False
+        self.sessions.set(job_id, {**record, **fields})
+        return True
+
+    async def delete_session(self, job_id: int) -> Optional[Dict[str, Any]]:
+        return self.sessions.pop(job_id)
+
+    async def session_count(self) -> int:
+        return len(self.sessions)
+
+    async def register_host(self, host_address: str, worker_id: str):
+        self.hosts[host_address] = worker_id
+
+    async def unregister_host(self, host_address: str, worker_id: str):
+        if self.hosts.get(host_address) == worker_id:
+            del self.hosts[host_address]
+
+    async def host_owner(self, host_address: str) -> Optional[str]:
+        return self.hosts.get(host_address)
+
+    async def online_hosts(self) -> Dict[str, str]:
+        return dict(self.hosts)
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> int:
+        queues = self._channels.get(channel, ())
+        for queue in queues:
+            queue.put_nowait(message)
+        return len(queues)
+
+    async def subscribe(self, channel: str) -> AsyncIterator[Dict[str, Any]]:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._channels.setdefault(channel, set()).add(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._channels[channel].discard(queue)
+
+
+# Field-level write that never resurrects a record deleted in the meantime.
+# ARGV: new deadline in ms ('' = keep), job id, then field/value pairs.
+_UPDATE_SESSION_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+redis.call('HSET', KEYS[1], unpack(ARGV, 3))
+if ARGV[1] ~= '' then
+    redis.call('PEXPIREAT', KEYS[1], ARGV[1])
+    redis.call('ZADD', KEYS[2], tonumber(ARGV[1]) / 1000, ARGV[2])
+end
+return 1
+"""
+
+# Fields whose change moves a record's deadline (see session_deadline).
+_DEADLINE_FIELDS = ("error", "_billing_meta")
+
+# Compare-and-delete so a stale worker can't unregister a host that reconnected elsewhere.
+_UNREGISTER_LUA = """
+if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+    return redis.call('HDEL', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+
+def _text(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _encode_fields(fields: Dict[str, Any]) -> Dict[str, bytes]:
+    return {name: orjson.dumps(value) for name, value in fields.items()}
+
+
+def _decode_fields(raw: Dict[Any, bytes]) -> Dict[str, Any]:
+    return {_text(name): orjson.loads(value) for name, value in raw.items()}
+
+
+class RedisStateBackend(SharedStateBackend):
+    """
+    Each session record is a hash of JSON-encoded fields under
+    `{prefix}session:{job_id}`, so a field update is a single HSET. The key
+    expires (PEXPIREAT) at the record's deadline, recomputed when a write
+    changes `error` or `_billing_meta`. The `{prefix}session_deadlines` sorted
+    set (job id -> deadline) counts the live records and enforces
+    `max_sessions`: past it, the records closest to expiry are dropped.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        prefix: str = "axess:",
+        max_sessions: int = 100_000,
+        ttl: float = 86_400,
+        error_ttl: float = 600,
+        grace: float = 60,
+    ):
+        self.client = client
+        self.prefix = prefix
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.grace = grace
+        self._deadlines_key = prefix + "session_deadlines"
+        self._hosts_key = prefix + "hosts"
+
+    def _session_key(self, job_id: int) -> str:
+        return f"{self.prefix}session:{job_id}"
+
+    def _deadline(self, record: Dict[str, Any], now: float) -> float:
+        return session_deadline(record, now, self.ttl, self.error_ttl, self.grace)
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs: Any) -> "RedisStateBackend":
+        try:
+            from redis import asyncio as aioredis
+        except ImportError as e:  # pragma: no cover - depends on the environment
+            raise RuntimeError(
+                "SHARED_STATE_BACKEND=redis requires the 'redis' package "
+                "(pip install 'redis>=5.0')."
+            ) from e
+        return cls(aioredis.from_url(url), **kwargs)
+
+    async def get_session(self, job_id: int) -> Optional[Dict[str, Any]]:
+        raw = await self.client.hgetall(self._session_key(job_id))
+        return _decode_fields(raw) if raw else None
+
+    async def set_session(self, job_id: int, record: Dict[str, Any]):
+        key = self._session_key(job_id)
+        now = time.time()
+        deadline = self._deadline(record, now)
+        async with self.client.pipeline(transaction=True) as pipe:
+            # Replace, not merge: fields of the previous record must not survive.
+            pipe.delete(key)
+            pipe.hset(key, mapping=_encode_fields(record))
+            pipe.pexpireat(key, int(deadline * 1000))
+            pipe.zadd(self._deadlines_key, {str(job_id): deadline})
+            # Index entries of keys Redis has already expired.
+            pipe.zremrangebyscore(self._deadlines_key, "-inf", now)
+            pipe.zcard(self._deadlines_key)
+            *_, count = await pipe.execute()
+        if count > self.max_sessions:
+            evicted = await self.client.zpopmin(self._deadlines_key, count - self.max_sessions)
+            if evicted:
+                await self.client.delete(*(self._session_key(_text(job)) for job, _ in evicted))
+
+    async def update_session(self, job_id: int, fields: Dict[str, Any]) -> bool:
+        if not fields:
+            return await self.client.exists(self._session_key(job_id)) == 1
+        deadline = ""
+        if any(name in fields for name in _DEADLINE_FIELDS):
+            deadline = int(self._deadline(fields, time.time()) * 1000)
+        args = [item for pair in _encode_fields(fields).items() for item in pair]
+        return await self.client.eval(
+            _UPDATE_SESSION_LUA, 2, self._session_key(job_id), self._deadlines_key, deadline, str(job_id), *args
+        ) == 1
+
+    async def delete_session(self, job_id: int) -> Optional[Dict[str, Any]]:
+        key = self._session_key(job_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            raw, _, _ = await pipe.hgetall(key).delete(key).zrem(
+                self._deadlines_key, str(job_id)
+            ).execute()
+        return _decode_fields(raw) if raw else None
+
+    async def session_count(self) -> int:
+        async with self.client.pipeline(transaction=True) as pipe:
+            _, count = await pipe.zremrangebyscore(self._deadlines_key, "-inf", time.time()).zcard(
+                self._deadlines_key
+            ).execute()
+        return count
+
+    async def register_host(self, host_address: str, worker_id: str):
+        await self.client.hset(self._hosts_key, host_address, worker_id)
+
+    async def unregister_host(self, host_address: str, worker_id: str):
+        await self.client.eval(_UNREGISTER_LUA, 1, self._hosts_key, host_address, worker_id)
+
+    async def host_owner(self, host_address: str) -> Optional[str]:
+        return _text(await self.client.hget(self._hosts_key, host_address))
+
+    async def online_hosts(self) -> Dict[str, str]:
+        raw = await self.client.hgetall(self._hosts_key)
+        return {_text(k): _text(v) for k, v in raw.items()}
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> int:
+        return int(await self.client.publish(self.prefix + channel, orjson.dumps(message)))
+
+    async def subscribe(self, channel: str) -> AsyncIterator[Dict[str, Any]]:
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.prefix + channel)
+        try:
+            async for item in pubsub.listen():
+                if item.get("type") == "message":
+                    yield orjson.loads(item["data"])
+        finally:
+            await pubsub.unsubscribe(self.prefix + channel)
+            await pubsub.aclose()
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def make_backend() -> SharedStateBackend:
+    if SET.SHARED_STATE_BACKEND == "redis":
+        if not SET.REDIS_URL:
+            raise RuntimeError("SHARED_STATE_BACKEND=redis requires REDIS_URL.")
+        return RedisStateBackend.from_url(
+            SET.REDIS_URL,
+            max_sessions=SET.SESSION_MAX_RECORDS,
+            ttl=SET.SESSION_TTL_SECONDS,
+            error_ttl=SET.SESSION_ERROR_TTL_SECONDS,
+            grace=SET.SESSION_EXPIRY_GRACE_SECONDS,
+        )
+    return InMemoryStateBackend(
+        SessionStore(
+            max_sessions=SET.SESSION_MAX_RECORDS,
+            ttl=SET.SESSION_TTL_SECONDS,
+            error_ttl=SET.SESSION_ERROR_TTL_SECONDS,
+            grace=SET.SESSION_EXPIRY_GRACE_SECONDS,
+            snapshot_path=SET.SESSION_SNAPSHOT_PATH,
+        ),
+        maintenance_interval=SET.SESSION_SNAPSHOT_SECONDS,
+    )
+
+
+shared_state = make_backend()
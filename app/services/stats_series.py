@@ -0,0 +1,273 @@
+"""
+Per-job time series of the host agent's `stats_update` samples.
+
+Each series keeps a few fixed-capacity ring buffers ("tiers"), e.g. 1s x 120,
+10s x 180, 60s x 720: every sample is averaged into the current bucket of each
+tier, so long sessions are automatically downsampled and memory per job is
+bounded by the tier capacities. Timestamps are stored as uint32 seconds and
+each numeric stat as a float32 column (`array`), not as dicts; a series tracks
+at most `max_fields` numeric fields (nested dicts are flattened one level with
+dotted names, non-numeric values are ignored).
+
+`StatsStore` holds one series per job and is fed from the session event bus,
+so every worker can answer `GET /jobs/{job_id}/stats` whichever worker owns
+the agent's socket. A series is dropped when its session stops or errors, when
+no sample arrived for `idle_ttl` (the agent vanished, or the session expired),
+or - least recently written first - when more than `max_sessions` are held.
+"""
+from __future__ import annotations
+import math
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.config import get_settings
+
+SET = get_settings()
+
+_NAN = float("nan")
+
+
+def _numeric_fields(stats: Dict[str, Any]) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            for sub, v in value.items():
+                if isinstance(v, (int, float)) and not isinstance(v, bool):
+                    out[f"{key}.{sub}"] = float(v)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[key] = float(value)
+    return out
+
+
+class _Tier:
+    """Ring buffer of bucket means at a fixed step, plus the open bucket's running sums."""
+
+    __slots__ = ("step", "capacity", "t", "cols", "start", "size", "bucket", "sums", "counts")
+
+    def __init__(self, step: int, capacity: int):
+        self.step = step
+        self.capacity = capacity
+        self.t = array("I", bytes(4 * capacity))
+        self.cols: List[array] = []
+        self.start = 0
+        self.size = 0
+        self.bucket: Optional[int] = None
+        self.sums: List[float] = []
+        self.counts: List[int] = []
+
+    def add_field(self):
+        self.cols.append(array("f", [_NAN]) * self.capacity)
+        self.sums.append(0.0)
+        self.counts.append(0)
+
+    def _flush(self):
+        if self.size < self.capacity:
+            i = (self.start + self.size) % self.capacity
+            self.size += 1
+        else:
+            i = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.t[i] = self.bucket
+        for f, col in enumerate(self.cols):
+            n = self.counts[f]
+            col[i] = self.sums[f] / n if n else _NAN
+            self.sums[f] = 0.0
+            self.counts[f] = 0
+
+    def add(self, ts: int, values: Sequence[Tuple[int, float]]):
+        bucket = ts - ts % self.step
+        if self.bucket is not None and bucket != self.bucket:
+            if bucket < self.bucket:
+                return  # late sample for a closed bucket
+            self._flush()
+        self.bucket = bucket
+        for f, v in values:
+            self.sums[f] += v
+            self.counts[f] += 1
+
+    def oldest(self) -> Optional[int]:
+        if self.size:
+            return self.t[self.start]
+        return self.bucket
+
+    def points(self, since: Optional[float]):
+        """(ts, [value per field]) in time order, including the open bucket."""
+        for k in range(self.size):
+            i = (self.start + k) % self.capacity
+            if since is None or self.t[i] >= since:
+                yield self.t[i], [col[i] for col in self.cols]
+        if self.bucket is not None and (since is None or self.bucket >= since):
+            yield self.bucket, [s / n if n else _NAN for s, n in zip(self.sums, self.counts)]
+
+    def nbytes(self) -> int:
+        return self.t.itemsize * len(self.t) + sum(c.itemsize * len(c) for c in self.cols)
+
+
+class StatsSeries:
+    def __init__(self, tiers: Sequence[Tuple[int, int]], max_fields: int = 8):
+        self.fields: List[str] = []
+        self.max_fields = max_fields
+        self.tiers = [_Tier(step, capacity) for step, capacity in sorted(tiers)]
+        self.samples = 0
+        self.ignored_fields = 0
+
+    def _field_index(self, name: str) -> Optional[int]:
+        try:
+            return self.fields.index(name)
+        except ValueError:
+            pass
+        if len(self.fields) >= self.max_fields:
+            self.ignored_fields += 1
+            return None
+        self.fields.append(name)
+        for tier in self.tiers:
+            tier.add_field()
+        return len(self.fields) - 1
+
+    def add(self, stats: Dict[str, Any], ts: Optional[float] = None):
+        ts = int(time.time() if ts is None else ts)
+        values = []
+        for name, v in _numeric_fields(stats).items():
+            f = self._field_index(name)
+            if f is not None:
+                values.append((f, v))
+        for tier in self.tiers:
+            tier.add(ts, values)
+        self.samples += 1
+
+    def _pick_tier(self, since: Optional[float], resolution: Optional[int]) -> _Tier:
+        if resolution is not None:
+            # Coarsest tier that is still at least as fine as asked for
+            candidates = [t for t in self.tiers if t.step <= resolution] or self.tiers[:1]
+            return candidates[-1]
+        if since is not None:
+            # Finest tier whose history still reaches back to `since`
+            for tier in self.tiers:
+                oldest = tier.oldest()
+                if oldest is None or oldest <= since:
+                    return tier
+        return self.tiers[-1]
+
+    def query(self, since: Optional[float] = None, resolution: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Columnar points: {"resolution", "fields", "t": [...], "series": {field: [...]}}.
+        Without `since` the coarsest tier (longest history) is used; a
+        `resolution` coarser than the chosen tier's step is re-aggregated.
+        """
+        tier = self._pick_tier(since, resolution)
+        step = tier.step
+        points = tier.points(since)
+        if resolution is not None and resolution > step:
+            points = _regroup(points, resolution, len(self.fields))
+            step = resolution
+
+        t: List[int] = []
+        series: Dict[str, List[Optional[float]]] = {name: [] for name in self.fields}
+        for ts, values in points:
+            t.append(ts)
+            for name, v in zip(self.fields, values):
+                series[name].append(None if math.isnan(v) else round(v, 3))
+        return {"resolution": step, "fields": list(self.fields), "t": t, "series": series}
+
+    def nbytes(self) -> int:
+        return sum(tier.nbytes() for tier in self.tiers)
+
+
+def _regroup(points, resolution: int, nfields: int):
+    bucket = None
+    sums, counts = [0.0] * nfields, [0] * nfields
+    for ts, values in points:
+        b = ts - ts % resolution
+        if bucket is not None and b != bucket:
+            yield bucket, [s / n if n else _NAN for s, n in zip(sums, counts)]
+            sums, counts = [0.0] * nfields, [0] * nfields
+        bucket = b
+        for f, v in enumerate(values):
+            if not math.isnan(v):
+                sums[f] += v
+                counts[f] += 1
+    if bucket is not None:
+        yield bucket, [s / n if n else _NAN for s, n in zip(sums, counts)]
+
+
+class StatsStore:
+    def __init__(
+        self,
+        tiers: Sequence[Tuple[int, int]],
+        max_fields: int = 8,
+        max_sessions: int = 10_000,
+        idle_ttl: float = 900,
+    ):
+        self.tiers = list(tiers)
+        self.max_fields = max_fields
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        # job_id -> series, least recently written first
+        self._series: "OrderedDict[int, StatsSeries]" = OrderedDict()
+        self._last_write: Dict[int, float] = {}
+        self.expired = 0
+        self.evicted = 0
+
+    def record(self, job_id: int, stats: Dict[str, Any], ts: Optional[float] = None):
+        now = time.time() if ts is None else ts
+        series = self._series.get(job_id)
+        if series is None:
+            series = self._series[job_id] = StatsSeries(self.tiers, self.max_fields)
+        else:
+            self._series.move_to_end(job_id)
+        self._last_write[job_id] = now
+        series.add(stats, ts)
+        self.prune(now)
+
+    def prune(self, now: Optional[float] = None):
+        """Drop idle series and enforce `max_sessions`; stops at the first series still in use."""
+        now = time.time() if now is None else now
+        while self._series:
+            job_id = next(iter(self._series))
+            if len(self._series) > self.max_sessions:
+                self.evicted += 1
+            elif self.idle_ttl > 0 and now - self._last_write[job_id] > self.idle_ttl:
+                self.expired += 1
+            else:
+                break
+            self.drop(job_id)
+
+    def get(self, job_id: int) -> Optional[StatsSeries]:
+        return self._series.get(job_id)
+
+    def drop(self, job_id: int):
+        self._series.pop(job_id, None)
+        self._last_write.pop(job_id, None)
+
+    def on_session_event(self, job_id: int, message: dict):
+        """SessionEventBus listener."""
+        status = message.get("status")
+        if status == "stats_update" and isinstance(message.get("stats"), dict):
+            self.record(job_id, message["stats"])
+        elif status in ("session_stopped", "session_error"):
+            self.drop(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        self.prune()
+        total = sum(s.nbytes() for s in self._series.values())
+        n = len(self._series)
+        return {
+            "sessions": n,
+            "bytes": total,
+            "bytes_per_session": total // n if n else 0,
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "tiers": [{"step": step, "capacity": capacity} for step, capacity in self.tiers],
+        }
+
+
+stats_store = StatsStore(
+    SET.STATS_SERIES_TIERS,
+    SET.STATS_SERIES_MAX_FIELDS,
+    max_sessions=SET.STATS_SERIES_MAX_SESSIONS,
+    idle_ttl=SET.STATS_SERIES_IDLE_SECONDS,
+)
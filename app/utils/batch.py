@@ -0,0 +1,90 @@
+"""
+Shared plumbing for the `:batchGet` endpoints.
+
+Ids are de-duplicated (first occurrence wins, order kept) and resolved
+concurrently through `upstream_fanout`, so a batch shares the same adaptive
+concurrency budget as every other multi-address fullnode call; it runs at the
+request's (normal) priority, ahead of queued background refreshes. One bad id
+never fails the whole batch: each id ends up in exactly one of
+
+    items      {id: value}
+    not_found  [id, ...]                       fetch returned None or raised a 404
+    errors     {id: {"status", "detail"}}      upstream failure, or not attempted
+                                               before the fan-out deadline (503)
+"""
+from __future__ import annotations
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+from fastapi import HTTPException
+
+from app.clients.resilience import CircuitOpenError
+from app.config import get_settings
+from app.utils.fanout import FanOutExecutor, is_overload_error, upstream_fanout
+from app.utils.ledger import LedgerVersionUnavailable
+
+logger = logging.getLogger(__name__)
+
+SET = get_settings()
+
+
+def unique_ids(ids: Iterable[Hashable], max_ids: Optional[int] = None) -> List[Hashable]:
+    """De-duplicated ids in request order; 422 if empty or over `max_ids` distinct ids."""
+    max_ids = SET.BATCH_GET_MAX_IDS if max_ids is None else max_ids
+    unique = list(dict.fromkeys(ids))
+    if not unique:
+        raise HTTPException(status_code=422, detail="ids must not be empty.")
+    if len(unique) > max_ids:
+        raise HTTPException(status_code=422, detail=f"At most {max_ids} distinct ids per batch.")
+    return unique
+
+
+def _error_status(exc: BaseException) -> int:
+    if isinstance(exc, HTTPException):
+        return exc.status_code
+    if isinstance(exc, CircuitOpenError):
+        return 503
+    if is_overload_error(exc):
+        return 502
+    return 500
+
+
+async def batch_get(
+    ids: Iterable[Hashable],
+    fetch: Callable[[Any], Awaitable[Any]],
+    fanout: Optional[FanOutExecutor] = None,
+) -> Dict[str, Any]:
+    ids = list(ids)
+    result = await (fanout or upstream_fanout).map(fetch, ids)
+    for exc in result.errors.values():
+        if isinstance(exc, LedgerVersionUnavailable):
+            raise exc  # the pinned version is unusable for the whole batch
+
+    items: Dict[str, Any] = {}
+    not_found: List[str] = []
+    errors: Dict[str, Dict[str, Any]] = {}
+    for item in ids:
+        key = str(item)
+        if item in result.results:
+            value = result.results[item]
+            if value is None:
+                not_found.append(key)
+            else:
+                items[key] = value
+        elif item in result.errors:
+            exc = result.errors[item]
+            status = _error_status(exc)
+            if status == 404:
+                not_found.append(key)
+            else:
+                if isinstance(exc, HTTPException):
+                    detail = exc.detail
+                elif status == 500:
+                    logger.error("Batch item %s failed", key, exc_info=exc)
+                    detail = "Failed to fetch this item."
+                else:
+                    detail = str(exc) or type(exc).__name__
+                errors[key] = {"status": status, "detail": detail}
+        else:
+            errors[key] = {"status": 503, "detail": "Not attempted before the fan-out deadline."}
+    return {"items": items, "not_found": not_found, "errors": errors}
@@ -0,0 +1,220 @@
+"""
+Bounded, adaptive fan-out for multi-address upstream calls.
+
+`FanOutExecutor.map` runs one coroutine per item with at most `limit` in
+flight. The limit follows AIMD: it grows by ~1 per window of fast, successful
+calls and is halved when calls are slow or the node pushes back (429/5xx,
+timeouts, connection errors). Items that fail or could not be started before
+the deadline are reported instead of being silently dropped.
+
+Callers waiting for a slot queue per priority class (`call_priority`, as for
+the fullnode rate limit): freed slots go to interactive, then normal, then
+bulk waiters, so a user's batchGet doesn't wait behind a background listings
+refresh or indexer backfill that shares the limiter.
+"""
+from __future__ import annotations
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Iterable, List, Optional
+
+import httpx
+
+from app.clients.ratelimit import PRIORITIES, current_priority
+from app.clients.resilience import CircuitOpenError
+from app.config import get_settings
+from app.utils.tracing import span
+
+SET = get_settings()
+
+
+def is_overload_error(exc: BaseException) -> bool:
+    """True for errors that mean "back off", as opposed to e.g. a 404."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(
+        exc, (httpx.TimeoutException, httpx.TransportError, asyncio.TimeoutError, CircuitOpenError)
+    )
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int,
+        max_limit: int,
+        target_latency: float,
+        backoff: float = 0.5,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.in_flight = 0
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {p: deque() for p in PRIORITIES}
+        # Only one decrease per "round trip" so a burst of failures from the same
+        # window doesn't collapse the limit to the floor.
+        self._last_decrease = 0.0
+        self.stats = {"calls": 0, "overloads": 0, "slow": 0, "decreases": 0}
+
+    def _queued_at_or_above(self, priority: str) -> bool:
+        for p in PRIORITIES:
+            if self._waiters[p]:
+                return True
+            if p == priority:
+                return False
+        return False
+
+    async def acquire(self, priority: Optional[str] = None):
+        priority = priority or current_priority()
+        # A free slot is only taken directly if nobody of the same or a higher
+        # class is already waiting for one.
+        if self.in_flight < int(self.limit) and not self._queued_at_or_above(priority):
+            self.in_flight += 1
+            return
+        waiters = self._waiters[priority]
+        while True:
+            waiter = asyncio.get_running_loop().create_future()
+            waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # We were handed a slot but won't use it; pass it on.
+                    self._wake()
+                else:
+                    self._discard(waiters, waiter)
+                raise
+            if self.in_flight < int(self.limit):
+                break
+        self.in_flight += 1
+
+    @staticmethod
+    def _discard(waiters: Deque[asyncio.Future], waiter: asyncio.Future):
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        for p in PRIORITIES:
+            waiters = self._waiters[p]
+            while free > 0 and waiters:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    free -= 1
+
+    def waiting(self) -> Dict[str, int]:
+        return {p: len(waiters) for p, waiters in self._waiters.items()}
+
+    def release(self, latency: float, overloaded: bool):
+        self.stats["calls"] += 1
+        slow = latency > self.target_latency
+        if overloaded:
+            self.stats["overloads"] += 1
+        elif slow:
+            self.stats["slow"] += 1
+
+        now = time.monotonic()
+        if overloaded or slow:
+            if now - self._last_decrease >= self.target_latency:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self._last_decrease = now
+                self.stats["decreases"] += 1
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+        self.in_flight -= 1
+        self._wake()
+
+
+@dataclass
+class FanOutResult:
+    results: Dict[Hashable, Any] = field(default_factory=dict)
+    errors: Dict[Hashable, BaseException] = field(default_factory=dict)
+    not_started: List[Hashable] = field(default_factory=list)
+
+    @property
+    def skipped(self) -> int:
+        """Items we have no fresh result for (failed or never attempted)."""
+        return len(self.errors) + len(self.not_started)
+
+
+class FanOutExecutor:
+    def __init__(self, limiter: AdaptiveLimiter, deadline: Optional[float] = None):
+        self.limiter = limiter
+        self.deadline = deadline
+        self.last_skipped = 0
+
+    async def map(
+        self,
+        fn: Callable[[Any], Awaitable[Any]],
+        items: Iterable[Hashable],
+        deadline: Optional[float] = None,
+    ) -> FanOutResult:
+        result = FanOutResult()
+        budget = self.deadline if deadline is None else deadline
+        stop_at = time.monotonic() + budget if budget else None
+        tasks: List[asyncio.Task] = []
+
+        async def run_one(item):
+            started = time.perf_counter()
+            overloaded = False
+            try:
+                with span("fanout.item", item=str(item)):
+                    result.results[item] = await fn(item)
+            except Exception as e:
+                overloaded = is_overload_error(e)
+                result.errors[item] = e
+            finally:
+                self.limiter.release(time.perf_counter() - started, overloaded)
+
+        pending = list(items)
+        with span("fanout", items=len(pending)):
+            for i, item in enumerate(pending):
+                if stop_at is not None:
+                    remaining = stop_at - time.monotonic()
+                    try:
+                        await asyncio.wait_for(self.limiter.acquire(), max(remaining, 0))
+                    except asyncio.TimeoutError:
+                        result.not_started.extend(pending[i:])
+                        break
+                else:
+                    await self.limiter.acquire()
+                tasks.append(asyncio.create_task(run_one(item)))
+
+            if tasks:
+                await asyncio.gather(*tasks)
+        self.last_skipped = result.skipped
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "limit": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight,
+            "last_skipped": self.last_skipped,
+            "waiting": self.limiter.waiting(),
+            **self.limiter.stats,
+        }
+
+
+def make_upstream_fanout() -> FanOutExecutor:
+    return FanOutExecutor(
+        AdaptiveLimiter(
+            initial=SET.FANOUT_INITIAL_CONCURRENCY,
+            min_limit=SET.FANOUT_MIN_CONCURRENCY,
+            max_limit=SET.FANOUT_MAX_CONCURRENCY,
+            target_latency=SET.FANOUT_TARGET_LATENCY_MS / 1000,
+        ),
+        deadline=SET.FANOUT_DEADLINE_SECONDS,
+    )
+
+
+# Shared by every multi-address fan-out against the fullnode so they respect
+# one concurrency budget.
+upstream_fanout = make_upstream_fanout()
@@ -0,0 +1,98 @@
+"""
+Strong ETags and conditional GET helpers for read endpoints.
+
+ETags are either derived from a data version the caller already has (cheap,
+lets us answer 304 before building the body) or from a hash of the
+serialized bytes. `If-None-Match` matches answer 304 with the same validators
+and `Cache-Control`, so browsers and a CDN can absorb repeated polls.
+"""
+from __future__ import annotations
+import hashlib
+from collections import defaultdict
+from typing import Any, Dict, Optional
+
+import orjson
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from app.config import get_settings
+from app.utils.tracing import span
+
+SET = get_settings()
+
+# { endpoint name: {"200": n, "304": n} }
+stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"200": 0, "304": 0})
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def version_etag(*parts: Any) -> str:
+    """ETag from a data version plus whatever else selects the representation."""
+    return make_etag(repr(parts).encode())
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match uses weak comparison (RFC 9110 13.1.2).
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def _cache_headers(etag: str, max_age: int) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+
+
+def check_not_modified(
+    request: Request, endpoint: str, etag: str, max_age: Optional[int] = None
+) -> Optional[Response]:
+    """A 304 response if the client already holds `etag`, else None."""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        stats[endpoint]["304"] += 1
+        age = SET.HTTP_CACHE_MAX_AGE if max_age is None else max_age
+        return Response(status_code=304, headers=_cache_headers(etag, age))
+    return None
+
+
+def etag_json_response(
+    request: Request,
+    endpoint: str,
+    content: Any,
+    etag: Optional[str] = None,
+    max_age: Optional[int] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Serialize `content` (a pydantic model, or JSON-able data) once and answer
+    304 or 200 with validators. Without an explicit `etag` the body is hashed.
+    """
+    with span("render"):
+        if isinstance(content, BaseModel):
+            content = content.model_dump(mode="json")
+        body = orjson.dumps(content)
+    etag = etag or make_etag(body)
+    age = SET.HTTP_CACHE_MAX_AGE if max_age is None else max_age
+
+    not_modified = check_not_modified(request, endpoint, etag, age)
+    if not_modified is not None:
+        if headers:
+            not_modified.headers.update(headers)
+        return not_modified
+
+    stats[endpoint]["200"] += 1
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={**_cache_headers(etag, age), **(headers or {})},
+    )
+
+
+def hit_ratios() -> Dict[str, Dict[str, Any]]:
+    out = {}
+    for endpoint, counts in stats.items():
+        total = counts["200"] + counts["304"]
+        out[endpoint] = {**counts, "not_modified_ratio": counts["304"] / total if total else 0.0}
+    return out
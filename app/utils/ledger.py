@@ -0,0 +1,131 @@
+"""
+Ledger-version bookkeeping for fullnode reads.
+
+Every fullnode response carries `X-Aptos-Ledger-Version` (and a timestamp);
+the AptosClient records it and view results are cached together with the
+version they were read at. Two context variables thread versions through a
+request without changing any call signatures:
+
+- `pinned_ledger(version)`: view calls underneath are made at that exact
+  ledger version (`?ledger_version=`), so several related reads (job +
+  listing + reputation for one dashboard) come from one consistent snapshot.
+  Pinned reads bypass the indexer's read model, which is not versioned.
+- `observe_ledger()`: collects the versions of everything read underneath.
+  `LedgerVersionMiddleware` opens one per HTTP request and reports the oldest
+  version the response reflects as `X-Aptos-Ledger-Version`; a client can pass
+  it back as `?ledger_version=` to read the rest of a page at that version.
+"""
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Mapping, Optional, Tuple
+
+from fastapi import Query
+
+LEDGER_VERSION_HEADER = "X-Aptos-Ledger-Version"
+LEDGER_TIMESTAMP_HEADER = "X-Aptos-Ledger-TimestampUsec"
+
+
+class LedgerVersionUnavailable(RuntimeError):
+    """A pinned read asked for a version the node has pruned or not reached yet."""
+
+    def __init__(self, version: int, status_code: int):
+        super().__init__(f"Ledger version {version} is not available on the fullnode ({status_code}).")
+        self.version = version
+        self.status_code = status_code
+
+
+class LedgerObservation:
+    __slots__ = ("oldest", "newest")
+
+    def __init__(self):
+        self.oldest: Optional[int] = None
+        self.newest: Optional[int] = None
+
+    def note(self, version: Optional[int]):
+        if version is None:
+            return
+        if self.oldest is None or version < self.oldest:
+            self.oldest = version
+        if self.newest is None or version > self.newest:
+            self.newest = version
+
+
+_pinned: ContextVar[Optional[int]] = ContextVar("aptos_pinned_ledger_version", default=None)
+_observed: ContextVar[Optional[LedgerObservation]] = ContextVar("aptos_ledger_observation", default=None)
+
+
+def parse_ledger_headers(headers: Mapping[str, str]) -> Tuple[Optional[int], Optional[int]]:
+    """(ledger version, ledger timestamp in microseconds) from a fullnode response."""
+    version, timestamp = headers.get(LEDGER_VERSION_HEADER), headers.get(LEDGER_TIMESTAMP_HEADER)
+    try:
+        return (
+            int(version) if version is not None else None,
+            int(timestamp) if timestamp is not None else None,
+        )
+    except ValueError:
+        return None, None
+
+
+def pinned_version() -> Optional[int]:
+    return _pinned.get()
+
+
+@contextmanager
+def pinned_ledger(version: Optional[int]) -> Iterator[None]:
+    """Pin view calls to `version`; None leaves the current pin (if any) alone."""
+    if version is None:
+        yield
+        return
+    token = _pinned.set(version)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+@contextmanager
+def observe_ledger() -> Iterator[LedgerObservation]:
+    observation = LedgerObservation()
+    token = _observed.set(observation)
+    try:
+        yield observation
+    finally:
+        _observed.reset(token)
+
+
+def note_ledger_version(version: Optional[int]):
+    """Record that data read at `version` went into the current request."""
+    observation = _observed.get()
+    if observation is not None:
+        observation.note(version)
+
+
+def ledger_version_query():
+    return Query(
+        None,
+        ge=0,
+        description="Read at this ledger version, e.g. the X-Aptos-Ledger-Version of a related response.",
+    )
+
+
+class LedgerVersionMiddleware:
+    """Pure ASGI middleware adding `X-Aptos-Ledger-Version` to HTTP responses that read chain data."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with observe_ledger() as observation:
+            async def send_with_version(message):
+                if message["type"] == "http.response.start" and observation.oldest is not None:
+                    headers = list(message.get("headers") or [])
+                    headers.append((LEDGER_VERSION_HEADER.lower().encode(), str(observation.oldest).encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_version)
@@ -0,0 +1,211 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+A deliberately small registry (counters, gauges, fixed-bucket histograms) so
+recording stays a dict lookup plus an integer increment on the hot path; no
+client library is needed. Values are per worker process: scrape each worker
+(or sum in PromQL) when running several.
+
+`MetricsMiddleware` is a pure ASGI middleware (no BaseHTTPMiddleware task and
+body buffering) that times every HTTP request and labels it with the matched
+route template, so `/jobs/1` and `/jobs/2` share a series and unmatched paths
+collapse into one `route="unmatched"` series.
+"""
+from __future__ import annotations
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers cached answers (sub-ms) up to fullnode timeouts.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def set(self, value: float, *labels: str):
+        """Copy a value kept elsewhere (e.g. a stats dict) at scrape time."""
+        self.values[labels] = value
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_label_str(self.labelnames, k)} {_fmt(v)}" for k, v in self.values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (non-cumulative, last slot is +Inf), sum]
+        self.series: Dict[Labels, List] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        bounds = [*(_fmt(b) for b in self.buckets), "+Inf"]
+        for labels, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, n in zip(bounds, counts):
+                cumulative += n
+                le = 'le="' + bound + '"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, labels)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+
+    def _add(self, metric: _Metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by route template and status code.", ("method", "route", "status")
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route")
+)
+aptos_view_duration = registry.histogram(
+    "aptos_view_duration_seconds",
+    "Uncached fullnode view call latency (retries and hedges included) by view function and outcome.",
+    ("function", "outcome"),
+)
+ws_messages = registry.counter("ws_messages_total", "Messages received from host agents by status.", ("status",))
+
+# Refreshed from their owners' stats when /metrics is scraped.
+view_cache_requests = registry.counter(
+    "view_cache_requests_total", "View cache lookups by tier and result.", ("tier", "result")
+)
+view_cache_hit_ratio = registry.gauge("view_cache_hit_ratio", "View cache hits / lookups per tier (l1: in-process, l2: Redis).", ("tier",))
+http_cache_responses = registry.counter(
+    "http_cache_responses_total", "ETag'd responses by endpoint: 200 (full body) vs 304.", ("endpoint", "status")
+)
+sessions = registry.gauge("sessions", "Session records in the shared state backend.")
+connected_hosts = registry.gauge("ws_connected_hosts", "Host agent sockets held by this worker.")
+online_hosts = registry.gauge("hosts_online", "Hosts seen alive on any worker (presence).")
+
+# Agent statuses we label by name; anything else is counted as "other".
+WS_STATUSES = frozenset(
+    ("session_ready", "session_error", "session_stopped", "stats_update", "pong", "invalid_json")
+)
+
+
+def record_ws_message(status: Optional[str]):
+    ws_messages.inc(status if status in WS_STATUSES else "other")
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500  # if the app raises before sending a response
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_request_duration.observe(time.perf_counter() - started, method, template)
+            http_requests.inc(method, template, str(status))
@@ -1,4 +1,8 @@
-from typing import List, Tuple, Optional
+import base64
+from bisect import bisect_right
+from typing import Any, List, Tuple, Optional
+
+import orjson
 
 
 def paginate(
@@ -9,3 +13,34 @@ def paginate(
     page = items[start:end]
     next_cursor = end if end < len(items) else None
     return page, next_cursor
+
+
+def encode_cursor(version: int, key: Any) -> str:
+    """Opaque cursor: the snapshot version plus the sort key of the last item served."""
+    raw = orjson.dumps({"v": version, "k": key})
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[int, Any]:
+    """Inverse of `encode_cursor`. Raises ValueError on anything malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = orjson.loads(raw)
+        return int(data["v"]), data["k"]
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def keyset_paginate(
+    items: List, keys: List, limit: int = 20, after: Any = None
+) -> Tuple[List, Any]:
+    """
+    Page through `items` sorted by `keys` (parallel, ascending, unique), starting
+    strictly after the key `after`. Costs O(log n + limit) regardless of depth.
+    Returns the page and the key to resume after, or None on the last page.
+    """
+    start = 0 if after is None else bisect_right(keys, after)
+    end = start + limit
+    page = items[start:end]
+    next_key = keys[end - 1] if end < len(items) else None
+    return page, next_key
@@ -0,0 +1,261 @@
+"""
+Lightweight in-process request tracing.
+
+`TracingMiddleware` opens a root span per HTTP request; code underneath marks
+interesting sections with
+
+    with span("view.get_job"):
+        ...
+
+and the spans form a tree through a context variable (tasks spawned inside a
+span - e.g. fan-out items - become its children). Outside a traced request
+`span()` is a no-op, so background work pays nothing.
+
+Per request the tree is
+- summarized into a `Server-Timing` header: one entry per span name with the
+  summed duration, plus the count and slowest instance when it occurs more
+  than once (a straggling fan-out item shows up as a high `max`);
+- appended as one JSON line to `TRACE_FILE` for a `TRACE_SAMPLE_RATE`
+  fraction of requests (serialized and written by a writer thread, off the
+  event loop);
+- kept in a `TRACE_SLOWEST_N` heap of the slowest requests (debug; served by
+  GET /healthz/slow-requests). Streamed responses (SSE, NDJSON) are left out:
+  their duration is how long the client stayed subscribed, not server time.
+"""
+from __future__ import annotations
+import heapq
+import itertools
+import logging
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+from app.config import get_settings
+
+SET = get_settings()
+logger = logging.getLogger(__name__)
+
+# Spans beyond this per request are not recorded (counted in `dropped_spans`).
+MAX_SPANS = 256
+
+
+class Span:
+    __slots__ = ("name", "start", "end", "attrs", "children", "trace")
+
+    def __init__(self, name: str, trace: "Trace", attrs: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace = trace
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attrs = attrs
+        self.children: List[Span] = []
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "dur_ms": round(self.duration * 1000, 3),
+        }
+        if self.attrs:
+            out["attrs"] = self.attrs
+        if self.children:
+            out["children"] = [c.to_dict(origin) for c in self.children]
+        return out
+
+
+class Trace:
+    __slots__ = ("root", "spans", "dropped_spans", "ts")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.ts = time.time()  # wall clock at the start; to_dict() may run much later
+        self.spans = 1
+        self.dropped_spans = 0
+        self.root = Span(name, self, attrs)
+
+    def summary(self) -> Dict[str, Tuple[float, int, float]]:
+        """span name -> (total seconds, count, slowest seconds), root excluded."""
+        totals: Dict[str, Tuple[float, int, float]] = {}
+        stack = list(self.root.children)
+        while stack:
+            s = stack.pop()
+            d = s.duration
+            total, n, slowest = totals.get(s.name, (0.0, 0, 0.0))
+            totals[s.name] = (total + d, n + 1, max(slowest, d))
+            stack.extend(s.children)
+        return totals
+
+    def server_timing(self) -> str:
+        parts = [f"total;dur={self.root.duration * 1000:.1f}"]
+        for name, (total, n, slowest) in sorted(self.summary().items(), key=lambda kv: -kv[1][0]):
+            entry = f"{name};dur={total * 1000:.1f}"
+            if n > 1:
+                entry += f';desc="n={n} max={slowest * 1000:.1f}ms"'
+            parts.append(entry)
+        return ", ".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        out = self.root.to_dict(self.root.start)
+        out["ts"] = self.ts
+        if self.dropped_spans:
+            out["dropped_spans"] = self.dropped_spans
+        return out
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    trace = parent.trace
+    if trace.spans >= MAX_SPANS:
+        trace.dropped_spans += 1
+        yield None
+        return
+    trace.spans += 1
+    child = Span(name, trace, attrs or None)
+    parent.children.append(child)
+    token = _current.set(child)
+    try:
+        yield child
+    finally:
+        child.end = time.perf_counter()
+        _current.reset(token)
+
+
+def tag(**attrs: Any):
+    """Attach attributes to the innermost open span, if any."""
+    current = _current.get()
+    if current is not None:
+        if current.attrs is None:
+            current.attrs = {}
+        current.attrs.update(attrs)
+
+
+class TraceRecorder:
+    """Samples finished traces to a JSONL file and keeps the slowest N."""
+
+    def __init__(self, sample_rate: float = 0.0, path: Optional[str] = None, slowest_n: int = 0):
+        self.sample_rate = sample_rate
+        self.path = path
+        self.slowest_n = slowest_n
+        self._slowest: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._seq = itertools.count()
+        self._file = None
+        # Sampled traces waiting for the writer thread; None stops it.
+        self._queue: "queue.SimpleQueue[Optional[Trace]]" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        self.stats = {"traced": 0, "sampled": 0, "write_errors": 0}
+
+    def record(self, trace: Trace):
+        self.stats["traced"] += 1
+        duration = trace.root.duration
+        if self.slowest_n > 0 and not trace.root.attrs.get("streaming") and (
+            len(self._slowest) < self.slowest_n or duration > self._slowest[0][0]
+        ):
+            entry = (duration, next(self._seq), trace.to_dict())
+            if len(self._slowest) < self.slowest_n:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heapreplace(self._slowest, entry)
+        if self.path and self.sample_rate > 0 and random.random() < self.sample_rate:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._drain, name="trace-writer", daemon=True)
+                self._writer.start()
+            self._queue.put(trace)
+
+    def _drain(self):
+        while True:
+            trace = self._queue.get()
+            if trace is None:
+                return
+            self._write(trace)
+
+    def _write(self, trace: Trace):
+        try:
+            if self._file is None:
+                self._file = open(self.path, "ab", buffering=0)
+            self._file.write(orjson.dumps(trace.to_dict()) + b"\n")
+            self.stats["sampled"] += 1
+        except OSError as e:
+            self.stats["write_errors"] += 1
+            logger.warning("Could not write trace to %s: %s", self.path, e)
+
+    def slowest(self) -> List[Dict[str, Any]]:
+        return [t for _, _, t in sorted(self._slowest, key=lambda e: -e[0])]
+
+    def close(self):
+        """Write out the queued traces, stop the writer and close the file."""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+trace_recorder = TraceRecorder(SET.TRACE_SAMPLE_RATE, SET.TRACE_FILE, SET.TRACE_SLOWEST_N)
+
+
+class TracedORJSONResponse(ORJSONResponse):
+    """Default response class; times serialization as a `render` span."""
+
+    def render(self, content: Any) -> bytes:
+        with span("render"):
+            return super().render(content)
+
+
+# Response types whose request lasts as long as the client keeps reading.
+STREAMING_CONTENT_TYPES = (b"text/event-stream", b"application/x-ndjson")
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware: root span per HTTP request, `Server-Timing` on the response."""
+
+    def __init__(self, app, recorder: TraceRecorder = trace_recorder):
+        self.app = app
+        self.recorder = recorder
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace("request", {"method": scope["method"], "path": scope["path"]})
+        token = _current.set(trace.root)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers") or [])
+                headers.append((b"server-timing", trace.server_timing().encode()))
+                message = {**message, "headers": headers}
+                trace.root.attrs["status"] = message["status"]
+                content_type = dict(headers).get(b"content-type", b"")
+                if content_type.startswith(STREAMING_CONTENT_TYPES):
+                    trace.root.attrs["streaming"] = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            trace.root.end = time.perf_counter()
+            _current.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                trace.root.attrs["route"] = getattr(route, "path", None)
+            self.recorder.record(trace)
@@ -1,30 +1,570 @@
+import asyncio
 import logging
-from typing import Dict, List
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Callable, Collection, Dict, Iterable, List, Optional, Set
+
+import orjson
 from fastapi import WebSocket
 
+from app.config import get_settings
+from app.services.shared_state import WORKER_ID, SharedStateBackend, shared_state
+
+SET = get_settings()
+logger = logging.getLogger(__name__)
+
+HostListener = Callable[[str], None]
+
+PRESENCE_CHANNEL = "presence"
+
+# Close code sent on an agent's old socket when it reconnects.
+SUPERSEDED_CLOSE_CODE = 4000
+
+
+def command_channel(worker_id: str) -> str:
+    return f"commands:{worker_id}"
+
+
+@dataclass
+class PendingCommand:
+    """
+    A command awaiting the agent's reply. The requesting worker holds `future`;
+    the worker owning the socket (if different) holds an entry with `reply_to`
+    so it can forward the reply back over the bus.
+    """
+    command_id: str
+    host_address: str
+    job_id: Any
+    expects: Collection[str]
+    deadline: float
+    sent_at: float = field(default_factory=time.monotonic)
+    future: Optional[asyncio.Future] = None
+    reply_to: Optional[str] = None
+
+
+class HostQueueFull(RuntimeError):
+    """The host's outbound queue is full and the overflow policy is "reject"."""
+
+
+class HostConnection:
+    """
+    One agent socket with a bounded outbound queue drained by its own writer
+    task, so a slow or half-dead agent never blocks the caller. Messages are
+    queued pre-serialized (broadcasts encode once for every host).
+
+    overflow="drop_oldest" evicts the oldest queued message when full;
+    overflow="reject" raises HostQueueFull. A send that takes longer than
+    `send_timeout` closes the socket; the WebSocket handler then disconnects it.
+    """
+
+    def __init__(
+        self,
+        host_address: str,
+        websocket: WebSocket,
+        maxsize: int = 64,
+        overflow: str = "drop_oldest",
+        send_timeout: float = 5.0,
+    ):
+        if overflow not in ("drop_oldest", "reject"):
+            raise ValueError(f"Unknown overflow policy: {overflow!r}")
+        self.host_address = host_address
+        self.websocket = websocket
+        self.overflow = overflow
+        self.send_timeout = send_timeout
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.closed = False
+        # monotonic time of the last frame from the agent (any frame, incl. pong)
+        self.last_seen = time.monotonic()
+        # Set by the first pong. Agents that predate pings never answer them, so
+        # they are left to the transport's own keepalive instead of being evicted.
+        self.answers_pings = False
+        self.stats = {"queued": 0, "sent": 0, "dropped": 0, "rejected": 0, "send_timeouts": 0, "send_errors": 0}
+        self._writer = asyncio.create_task(self._drain())
+
+    def enqueue(self, payload: str):
+        if self.closed:
+            raise ValueError("Host is not connected")
+        if self.queue.full():
+            if self.overflow == "reject":
+                self.stats["rejected"] += 1
+                raise HostQueueFull(f"Outbound queue for {self.host_address} is full")
+            self.queue.get_nowait()
+            self.stats["dropped"] += 1
+        self.queue.put_nowait(payload)
+        self.stats["queued"] += 1
+
+    async def _drain(self):
+        while True:
+            payload = await self.queue.get()
+            try:
+                await asyncio.wait_for(self.websocket.send_text(payload), self.send_timeout)
+            except asyncio.TimeoutError:
+                self.stats["send_timeouts"] += 1
+                logger.warning("Send to %s timed out after %ss; closing socket", self.host_address, self.send_timeout)
+                await self._abort()
+                return
+            except Exception:
+                self.stats["send_errors"] += 1
+                logger.warning("Send to %s failed; closing socket", self.host_address, exc_info=True)
+                await self._abort()
+                return
+            self.stats["sent"] += 1
+
+    async def _abort(self, code: int = 1011):
+        self.closed = True
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), self.send_timeout)
+        except Exception:
+            pass
+
+    async def close(self):
+        self.closed = True
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+
+    def queue_stats(self) -> Dict[str, Any]:
+        return {"depth": self.queue.qsize(), "closed": self.closed, **self.stats}
+
+
+def _new_presence_stats() -> Dict[str, int]:
+    return {"connects": 0, "disconnects": 0, "evictions": 0, "remote_expired": 0}
+
+
+def _new_host_stats() -> Dict[str, Any]:
+    return {"sent": 0, "acked": 0, "timeouts": 0, "in_flight": 0, "latency_ms_total": 0.0, "latency_ms_max": 0.0}
+
+
 class ConnectionManager:
-    def __init__(self):
-        # Maps host_address -> WebSocket
-        self.active_connections: Dict[str, WebSocket] = {}
+    def __init__(
+        self,
+        state: SharedStateBackend,
+        worker_id: str | None = None,
+        queue_size: int = SET.HOST_SEND_QUEUE_SIZE,
+        overflow: str = SET.HOST_SEND_OVERFLOW,
+        send_timeout: float = SET.HOST_SEND_TIMEOUT_SECONDS,
+        heartbeat_interval: float = SET.HOST_HEARTBEAT_SECONDS,
+        presence_ttl: float = SET.HOST_PRESENCE_TTL_SECONDS,
+    ):
+        # <= 0 disables the heartbeat loop / eviction respectively.
+        if 0 < presence_ttl <= heartbeat_interval:
+            raise ValueError(
+                f"presence_ttl ({presence_ttl}s) must be longer than heartbeat_interval "
+                f"({heartbeat_interval}s), or <= 0 to disable eviction"
+            )
+        self.state = state
+        self.heartbeat_interval = heartbeat_interval
+        self.presence_ttl = presence_ttl
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.send_timeout = send_timeout
+        # Identifies this process in the shared presence registry / command bus.
+        self.worker_id = worker_id or WORKER_ID
+        # Maps host_address -> HostConnection, for sockets owned by this worker
+        self.active_connections: Dict[str, HostConnection] = {}
+        # Every live host on any worker, mirrored from the presence channel.
+        # Local hosts leave it when their socket misses heartbeats for presence_ttl;
+        # remote ones when their owner stops re-announcing them (e.g. it crashed).
+        self.online_hosts: Set[str] = set()
+        self._remote_seen: Dict[str, float] = {}
+        self.presence_stats = _new_presence_stats()
+        # Sync callbacks fired with the host address after connect/disconnect
+        # (on any worker)
+        self._connect_listeners: List[HostListener] = []
+        self._disconnect_listeners: List[HostListener] = []
+        self._tasks: List[asyncio.Task] = []
+        # command_id -> PendingCommand, for acknowledged commands (see request())
+        self._pending: Dict[str, PendingCommand] = {}
+        # host_address -> sent/acked/timeouts/in_flight/latency, for commands sent with request()
+        self.host_stats: Dict[str, Dict[str, Any]] = {}
+
+    def add_listener(
+        self,
+        on_connect: HostListener | None = None,
+        on_disconnect: HostListener | None = None,
+    ):
+        if on_connect:
+            self._connect_listeners.append(on_connect)
+        if on_disconnect:
+            self._disconnect_listeners.append(on_disconnect)
+
+    def _notify(self, listeners: List[HostListener], host_address: str):
+        for listener in listeners:
+            try:
+                listener(host_address)
+            except Exception:
+                logger.error("Connection listener failed for %s", host_address, exc_info=True)
+
+    def _set_online(self, host_address: str, online: bool, force: bool = False):
+        """Update the presence mirror; listeners fire on transitions (or when forced, for reconnects)."""
+        if online:
+            if force or host_address not in self.online_hosts:
+                self.online_hosts.add(host_address)
+                self.presence_stats["connects"] += 1
+                self._notify(self._connect_listeners, host_address)
+        elif host_address in self.online_hosts:
+            self.online_hosts.discard(host_address)
+            self._remote_seen.pop(host_address, None)
+            self.presence_stats["disconnects"] += 1
+            self._notify(self._disconnect_listeners, host_address)
+
+    # --- presence queries ---
+    def is_online(self, host_address: str) -> bool:
+        return host_address in self.online_hosts
+
+    def touch(self, host_address: str, pong: bool = False):
+        """Record that the agent just sent us something (`pong`: a reply to our ping)."""
+        connection = self.active_connections.get(host_address)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+            if pong:
+                connection.answers_pings = True
+
+    def presence(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        hosts = {}
+        for host_address in self.online_hosts:
+            connection = self.active_connections.get(host_address)
+            seen = connection.last_seen if connection is not None else self._remote_seen.get(host_address)
+            hosts[host_address] = {
+                "local": connection is not None,
+                "answers_pings": connection.answers_pings if connection is not None else None,
+                "last_seen_seconds": round(now - seen, 3) if seen is not None else None,
+            }
+        return {
+            "online": len(self.online_hosts),
+            "local": len(self.active_connections),
+            "ttl_seconds": self.presence_ttl,
+            "heartbeat_seconds": self.heartbeat_interval,
+            **self.presence_stats,
+            "hosts": hosts,
+        }
 
     async def connect(self, websocket: WebSocket, host_address: str):
         await websocket.accept()
-        self.active_connections[host_address] = websocket
-        logging.info(f"Host agent connected: {host_address}")
+        previous = self.active_connections.get(host_address)
+        self.active_connections[host_address] = HostConnection(
+            host_address, websocket, self.queue_size, self.overflow, self.send_timeout
+        )
+        if previous is not None:
+            await previous.close()
+            # End the old socket's receive loop now rather than when the peer
+            # times out; its handler's disconnect() then leaves the new one alone.
+            await previous._abort(SUPERSEDED_CLOSE_CODE)
+        logger.info("Host agent connected: %s", host_address)
+        await self.state.register_host(host_address, self.worker_id)
+        self._set_online(host_address, True, force=True)
+        await self.state.publish(
+            PRESENCE_CHANNEL, {"host": host_address, "online": True, "worker": self.worker_id}
+        )
 
-    def disconnect(self, host_address: str):
-        if host_address in self.active_connections:
+    async def disconnect(self, host_address: str, websocket: WebSocket | None = None):
+        connection = self.active_connections.get(host_address)
+        # A stale handler must not drop the socket the agent reconnected with.
+        if connection is not None and (websocket is None or connection.websocket is websocket):
             del self.active_connections[host_address]
-            logging.info(f"Host agent disconnected: {host_address}")
+            await connection.close()
+            logger.info("Host agent disconnected: %s", host_address)
+            await self.state.unregister_host(host_address, self.worker_id)
+            self._set_online(host_address, False)
+            await self.state.publish(
+                PRESENCE_CHANNEL, {"host": host_address, "online": False, "worker": self.worker_id}
+            )
 
-    async def send_to_host(self, message: dict, host_address: str):
-        if host_address in self.active_connections:
-            websocket = self.active_connections[host_address]
-            await websocket.send_json(message)
-            logging.info(f"Sent command to {host_address}: {message}")
-        else:
-            logging.warning(f"Attempted to send message to disconnected host: {host_address}")
+    async def send_to_host(self, message: dict, host_address: str, pending: Optional[PendingCommand] = None):
+        connection = self.active_connections.get(host_address)
+        if connection is not None:
+            connection.enqueue(orjson.dumps(message).decode())
+            logger.info("Queued command for %s: %s", host_address, message)
+            return
+
+        # The agent's socket may live on another worker: route it over the bus.
+        owner = await self.state.host_owner(host_address) if self.is_online(host_address) else None
+        if owner and owner != self.worker_id:
+            envelope = {"host": host_address, "message": message}
+            if pending is not None:
+                # Ask the owner to forward the agent's reply back to us.
+                envelope["reply_to"] = self.worker_id
+                envelope["reply_expects"] = sorted(pending.expects)
+                envelope["reply_timeout"] = max(0.0, pending.deadline - time.monotonic())
+            if await self.state.publish(command_channel(owner), envelope):
+                logger.info("Routed command for %s to worker %s: %s", host_address, owner, message)
+                return
+            # The registry still names a worker that is no longer listening.
+            logger.warning("Owner %s of host %s is not subscribed; treating host as offline", owner, host_address)
+            self._set_online(host_address, False)
             raise ValueError("Host is not connected")
 
+        logger.warning("Attempted to send message to disconnected host: %s", host_address)
+        raise ValueError("Host is not connected")
+
+    async def broadcast(self, message: dict, host_addresses: Iterable[str] | None = None) -> Dict[str, int]:
+        """
+        Send one message to many hosts (default: every online host). It is
+        serialized once; remote hosts get one bus message per owning worker.
+        Hosts whose queue rejects the message are counted, not raised.
+        """
+        payload = orjson.dumps(message).decode()
+        targets = set(self.online_hosts if host_addresses is None else host_addresses)
+        result = {"queued": 0, "routed": 0, "rejected": 0, "offline": 0}
+
+        remote: Dict[str, List[str]] = {}
+        owners = await self.state.online_hosts() if targets - self.active_connections.keys() else {}
+        for host_address in targets:
+            connection = self.active_connections.get(host_address)
+            if connection is not None:
+                try:
+                    connection.enqueue(payload)
+                    result["queued"] += 1
+                except (HostQueueFull, ValueError):
+                    result["rejected"] += 1
+            elif owners.get(host_address) not in (None, self.worker_id):
+                remote.setdefault(owners[host_address], []).append(host_address)
+            else:
+                result["offline"] += 1
+
+        for owner, hosts in remote.items():
+            if await self.state.publish(command_channel(owner), {"hosts": hosts, "payload": payload}):
+                result["routed"] += len(hosts)
+            else:
+                result["offline"] += len(hosts)
+        return result
+
+    def queue_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {host: conn.queue_stats() for host, conn in self.active_connections.items()}
+
+    # --- acknowledged commands ---
+    async def request(
+        self,
+        message: dict,
+        host_address: str,
+        expects: Collection[str],
+        timeout: float,
+    ) -> dict:
+        """
+        Send a command tagged with a `command_id` and wait for the agent's reply.
+
+        The reply is the first agent message for this host that echoes the
+        `command_id`, or - for agents that don't echo it - the first message for
+        the same `job_id` whose status is in `expects`. Raises ValueError if the
+        host is not connected and asyncio.TimeoutError if no reply arrives in
+        `timeout` seconds.
+        """
+        command_id = uuid.uuid4().hex
+        message = {**message, "command_id": command_id}
+        future = asyncio.get_running_loop().create_future()
+        pending = PendingCommand(
+            command_id=command_id,
+            host_address=host_address,
+            job_id=message.get("job_id"),
+            expects=frozenset(expects),
+            deadline=time.monotonic() + timeout,
+            future=future,
+        )
+        stats = self.host_stats.setdefault(host_address, _new_host_stats())
+        self._pending[command_id] = pending
+        stats["in_flight"] += 1
+        try:
+            await self.send_to_host(message, host_address, pending=pending)
+            stats["sent"] += 1
+            try:
+                reply = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                stats["timeouts"] += 1
+                logger.warning("Command %s for %s timed out after %ss", message.get("action"), host_address, timeout)
+                raise
+            latency_ms = (time.monotonic() - pending.sent_at) * 1000.0
+            stats["acked"] += 1
+            stats["latency_ms_total"] += latency_ms
+            stats["latency_ms_max"] = max(stats["latency_ms_max"], latency_ms)
+            return reply
+        finally:
+            self._pending.pop(command_id, None)
+            stats["in_flight"] -= 1
+
+    def _match_pending(self, host_address: str, message: dict) -> Optional[PendingCommand]:
+        command_id = message.get("command_id")
+        if command_id:
+            pending = self._pending.get(command_id)
+            return pending if pending and pending.host_address == host_address else None
+        status, job_id = message.get("status"), message.get("job_id")
+        for pending in self._pending.values():
+            if (
+                pending.host_address == host_address
+                and status in pending.expects
+                and str(pending.job_id) == str(job_id)
+            ):
+                return pending
+        return None
+
+    async def handle_reply(self, host_address: str, message: dict) -> bool:
+        """
+        Resolve the command this agent message answers, if any. Called by the
+        WebSocket handler after it has applied the message.
+        """
+        pending = self._match_pending(host_address, message)
+        if pending is None:
+            return False
+        self._pending.pop(pending.command_id, None)
+        if pending.future is not None:
+            if not pending.future.done():
+                pending.future.set_result(message)
+        else:
+            await self.state.publish(
+                command_channel(pending.reply_to),
+                {"reply": message, "command_id": pending.command_id},
+            )
+        return True
+
+    def _expire_relays(self):
+        now = time.monotonic()
+        for command_id in [c for c, p in self._pending.items() if p.future is None and p.deadline < now]:
+            del self._pending[command_id]
+
+    def command_stats(self) -> Dict[str, Dict[str, Any]]:
+        out = {}
+        for host_address, stats in self.host_stats.items():
+            acked = stats["acked"]
+            out[host_address] = {
+                "sent": stats["sent"],
+                "acked": acked,
+                "timeouts": stats["timeouts"],
+                "in_flight": stats["in_flight"],
+                "latency_ms_avg": round(stats["latency_ms_total"] / acked, 2) if acked else None,
+                "latency_ms_max": round(stats["latency_ms_max"], 2),
+            }
+        return out
+
+    # --- cross-worker listeners ---
+    async def _on_command(self, envelope: Dict[str, Any]):
+        if "reply" in envelope:
+            pending = self._pending.pop(envelope["command_id"], None)
+            if pending is not None and pending.future is not None and not pending.future.done():
+                pending.future.set_result(envelope["reply"])
+            return
+
+        if "hosts" in envelope:
+            for host_address in envelope["hosts"]:
+                connection = self.active_connections.get(host_address)
+                if connection is not None:
+                    try:
+                        connection.enqueue(envelope["payload"])
+                    except (HostQueueFull, ValueError):
+                        logger.warning("Dropped routed broadcast for %s", host_address)
+            return
+
+        host_address = envelope["host"]
+        connection = self.active_connections.get(host_address)
+        if connection is None:
+            logger.warning("Routed command for %s but it is no longer connected here", host_address)
+            return
+        message = envelope["message"]
+        if envelope.get("reply_to") and message.get("command_id"):
+            self._expire_relays()
+            self._pending[message["command_id"]] = PendingCommand(
+                command_id=message["command_id"],
+                host_address=host_address,
+                job_id=message.get("job_id"),
+                expects=frozenset(envelope.get("reply_expects") or ()),
+                deadline=time.monotonic() + float(envelope.get("reply_timeout") or 0),
+                reply_to=envelope["reply_to"],
+            )
+        connection.enqueue(orjson.dumps(message).decode())
+        logger.info("Queued routed command for %s: %s", host_address, envelope["message"])
+
+    async def _on_presence(self, event: Dict[str, Any]):
+        if event.get("worker") == self.worker_id:
+            return
+        if "hosts" in event:
+            # Periodic re-announcement of a worker's live hosts
+            now = time.monotonic()
+            for host_address in event["hosts"]:
+                self._remote_seen[host_address] = now
+                self._set_online(host_address, True)
+            return
+        if event["online"]:
+            self._remote_seen[event["host"]] = time.monotonic()
+        self._set_online(event["host"], bool(event["online"]))
+
+    # --- heartbeats ---
+    async def _evict(self, host_address: str, connection: HostConnection):
+        self.presence_stats["evictions"] += 1
+        logger.warning("Evicting host %s: no message for %.1fs", host_address, time.monotonic() - connection.last_seen)
+        await self.disconnect(host_address, connection.websocket)
+        # Closing the socket ends the WebSocket handler's receive loop.
+        await connection._abort()
+
+    async def heartbeat_once(self):
+        """
+        Ping every local agent, evict the ping-answering ones silent for longer
+        than presence_ttl, re-announce the live ones to other workers and expire
+        remote hosts that their owner stopped announcing. presence_ttl <= 0
+        turns eviction and expiry off. Reply relays past their deadline are
+        dropped on every sweep.
+        """
+        now = time.monotonic()
+        self._expire_relays()
+        expiring = self.presence_ttl > 0
+        ping = orjson.dumps({"action": "ping", "ts": time.time()}).decode()
+        for host_address, connection in list(self.active_connections.items()):
+            if expiring and connection.answers_pings and now - connection.last_seen > self.presence_ttl:
+                await self._evict(host_address, connection)
+                continue
+            try:
+                connection.enqueue(ping)
+            except (HostQueueFull, ValueError):
+                pass
+
+        if self.active_connections:
+            await self.state.publish(
+                PRESENCE_CHANNEL, {"hosts": list(self.active_connections), "worker": self.worker_id}
+            )
+
+        for host_address in list(self.online_hosts if expiring else ()):
+            if host_address in self.active_connections:
+                continue
+            seen = self._remote_seen.get(host_address)
+            if seen is None or now - seen > self.presence_ttl:
+                self.presence_stats["remote_expired"] += 1
+                self._set_online(host_address, False)
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.heartbeat_once()
+            except Exception:
+                logger.error("Heartbeat sweep failed", exc_info=True)
+
+    async def start(self):
+        """Subscribe to this worker's command channel and the presence channel; start heartbeats."""
+        now = time.monotonic()
+        for host_address in (await self.state.online_hosts()):
+            # Registry entries from a crashed worker expire after presence_ttl.
+            self._remote_seen.setdefault(host_address, now)
+            self._set_online(host_address, True)
+        self._tasks = [
+            asyncio.create_task(self.state.consume(command_channel(self.worker_id), self._on_command)),
+            asyncio.create_task(self.state.consume(PRESENCE_CHANNEL, self._on_presence)),
+        ]
+        if self.heartbeat_interval > 0:
+            self._tasks.append(asyncio.create_task(self._heartbeat_loop()))
+        # Let the subscriptions register before anyone publishes to them.
+        await asyncio.sleep(0)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
 # Create a single, globally accessible instance of the manager
-connection_manager = ConnectionManager()
\ No newline at end of file
+connection_manager = ConnectionManager(shared_state)
@@ -0,0 +1,85 @@
+"""
+Query latency of ListingIndex.search at 50k listings.
+
+    python -m benchmarks.bench_listing_search [--listings 50000] [--queries 2000]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.models.schemas import Listing, PhysicalSpecs
+from app.services.listing_index import ListingIndex
+
+GPUS = ["RTX 4090", "RTX 3090", "RTX 3080", "A100", "H100", "L40S", "A6000", "T4"]
+
+QUERIES = {
+    "no filters, price asc": dict(ranges={}),
+    "gpu=RTX 4090, price<=N, cores>=16": dict(
+        ranges={"price_per_second": (None, 120), "cpu_cores": (16, None)}, gpu_model="RTX 4090"
+    ),
+    "cores>=64 & ram>=256, price desc": dict(
+        ranges={"cpu_cores": (64, None), "ram_gb": (256, None)}, descending=True
+    ),
+    "narrow price band, sort by ram": dict(
+        ranges={"price_per_second": (100, 102)}, sort_field="ram_gb", descending=True
+    ),
+    "selective cores, sort by price": dict(ranges={"cpu_cores": (128, 128)}),
+}
+
+
+def build(n: int, seed: int = 1) -> ListingIndex:
+    rng = random.Random(seed)
+    index = ListingIndex()
+    for i in range(n):
+        index.upsert(
+            Listing(
+                host_address=f"0x{i:064x}",
+                listing_type="Physical",
+                price_per_second=rng.randint(1, 500),
+                is_available=True,
+                physical=PhysicalSpecs(
+                    gpu_model=rng.choice(GPUS),
+                    cpu_cores=rng.choice([4, 8, 16, 32, 64, 128]),
+                    ram_gb=rng.choice([16, 32, 64, 128, 256, 512]),
+                ),
+            )
+        )
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--listings", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = build(args.listings)
+    print(f"built index of {len(index)} listings in {time.perf_counter() - started:.2f}s")
+
+    for name, kwargs in QUERIES.items():
+        samples = []
+        for _ in range(args.queries):
+            t0 = time.perf_counter()
+            index.search(limit=args.limit, **kwargs)
+            samples.append((time.perf_counter() - t0) * 1e6)
+        samples.sort()
+        p50 = statistics.median(samples)
+        p99 = samples[int(len(samples) * 0.99) - 1]
+        print(f"{name:40s} p50={p50:8.1f}us  p99={p99:8.1f}us")
+
+    # Incremental maintenance cost (connect/disconnect churn).
+    rng = random.Random(2)
+    samples = []
+    for i in range(args.queries):
+        listing = index._listings[f"0x{rng.randrange(args.listings):064x}"]
+        t0 = time.perf_counter()
+        index.upsert(listing.model_copy(update={"price_per_second": rng.randint(1, 500)}))
+        samples.append((time.perf_counter() - t0) * 1e6)
+    print(f"{'upsert (reprice)':40s} p50={statistics.median(samples):8.1f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Event-loop cost of logging on hot paths.
+
+Drives the real app straight through ASGI (no sockets) with the requests that
+log the most - session polls, repeated start calls and agent stats_update
+messages - once with logging disabled and once with the app's logging
+configuration, and reports the difference per request/message. End-to-end
+numbers are noisy on a busy box, so the calling-side cost of one hot log line
+is also timed in isolation: the old setup (`logging.basicConfig` stream
+handler, f-string message) against the queue pipeline with its rate limit.
+stdout and stderr are redirected to a temporary file so log writes hit a real
+file, as they would under a process manager.
+
+    python -m benchmarks.bench_logging [--requests 5000] [--messages 20000]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from app.logging_config import setup_logging, stop_logging
+from app.main import app
+from app.routers.jobs import _set_cached
+
+JOB_ID = 7
+HOST = "0x" + "ab" * 32
+
+
+def http_scope(method: str, path: str) -> dict:
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+        "headers": [], "client": ("127.0.0.1", 1), "server": ("test", 80),
+    }
+
+
+async def drive_http(method: str, path: str, n: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for _ in range(n):
+        await app(http_scope(method, path), receive, send)
+    return time.perf_counter() - started
+
+
+async def drive_ws(n: int) -> float:
+    message = json.dumps({"status": "stats_update", "job_id": JOB_ID, "stats": {"gpu_util": 50.0}})
+    inbox: asyncio.Queue = asyncio.Queue()
+    inbox.put_nowait({"type": "websocket.connect"})
+    received = 0
+
+    async def receive():
+        nonlocal received
+        event = await inbox.get()
+        if event["type"] == "websocket.receive":
+            received += 1
+            if received == n:
+                inbox.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        return event
+
+    async def send(event):
+        pass
+
+    scope = {
+        "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws", "path": f"/ws/{HOST}",
+        "raw_path": f"/ws/{HOST}".encode(), "query_string": b"", "headers": [],
+        "client": ("127.0.0.1", 1), "server": ("test", 80), "subprotocols": [],
+    }
+    for _ in range(n):
+        inbox.put_nowait({"type": "websocket.receive", "text": message})
+    started = time.perf_counter()
+    await app(scope, receive, send)
+    return time.perf_counter() - started
+
+
+async def run(args) -> dict:
+    await _set_cached(JOB_ID, {
+        "public_url": "https://example.invalid/session",
+        "token": "secret-token",
+        "stats": None,
+        "_billing_meta": {"start_time": 0, "max_end_time": 10**10, "total_escrow_amount": 10**10, "price_per_second": 1},
+        "session_start_time": 0,
+        "error": None,
+    })
+    return {
+        "GET /jobs/{id}/session": await drive_http("GET", f"/api/v1/jobs/{JOB_ID}/session", args.requests) / args.requests,
+        "POST /jobs/{id}/start": await drive_http("POST", f"/api/v1/jobs/{JOB_ID}/start", args.requests) / args.requests,
+        "WS stats_update": await drive_ws(args.messages) / args.messages,
+    }
+
+
+def time_log_line(n: int) -> dict:
+    """Per-call cost of the WS stats_update INFO line under both setups."""
+    logger = logging.getLogger("bench.ws")
+    host = HOST
+
+    root = logging.getLogger()
+    saved = list(root.handlers)
+    stop_logging()
+    for h in saved:
+        root.removeHandler(h)
+    # Stdlib defaults, as before setup_logging() turned them off.
+    logging._srcfile = os.path.normcase(logging.addLevelName.__code__.co_filename)
+    logging.logThreads = logging.logProcesses = logging.logMultiprocessing = logging.logAsyncioTasks = True
+    legacy = logging.StreamHandler(sys.stderr)
+    legacy.setFormatter(logging.Formatter("%(asctime)s | %(levelname)s | %(message)s"))
+    root.addHandler(legacy)
+    started = time.perf_counter()
+    for i in range(n):
+        logging.info(f"[WS] {host} -> status=stats_update job_id={i}")
+    legacy_cost = (time.perf_counter() - started) / n
+    root.removeHandler(legacy)
+
+    setup_logging()
+    started = time.perf_counter()
+    for i in range(n):
+        logger.info("[WS] %s -> status=%s job_id=%s", host, "stats_update", i)
+    pipeline_cost = (time.perf_counter() - started) / n
+    return {"basicConfig + f-string": legacy_cost, "queue + rate limit": pipeline_cost}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    console = os.fdopen(os.dup(1), "w")
+    sink = tempfile.TemporaryFile()
+    os.dup2(sink.fileno(), 1)
+    os.dup2(sink.fileno(), 2)
+
+    asyncio.run(run(argparse.Namespace(requests=200, messages=200)))  # warm up
+    # Interleave runs so CPU frequency drift hits both equally; keep the best of each.
+    off, on = {}, {}
+    for _ in range(5):
+        logging.disable(logging.CRITICAL)
+        for k, v in asyncio.run(run(args)).items():
+            off[k] = min(off.get(k, v), v)
+        logging.disable(logging.NOTSET)
+        for k, v in asyncio.run(run(args)).items():
+            on[k] = min(on.get(k, v), v)
+
+    print(f"{'':<24}{'logging off':>14}{'logging on':>14}{'overhead':>12}", file=console)
+    for k in off:
+        print(
+            f"{k:<24}{off[k] * 1e6:>11.1f} us{on[k] * 1e6:>11.1f} us{(on[k] - off[k]) * 1e6:>9.1f} us",
+            file=console,
+        )
+    stop_logging()  # drain the queue before measuring the output
+    print(f"log output: {sink.seek(0, os.SEEK_END) / 1024:.0f} KiB", file=console)
+
+    print("\none INFO line, calling side:", file=console)
+    for k, v in time_log_line(args.messages).items():
+        print(f"  {k:<24}{v * 1e6:>8.2f} us", file=console)
+    console.flush()
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Memory, write cost and warm-restart time of the session store.
+
+Fills the SessionStore with N realistic session records (as written by the
+WebSocket layer after session_ready + billing meta + a stats_update) and
+compares it with the plain dict it replaced: bytes per session, cost of a
+stats_update write, full and incremental snapshot time, and how long a
+restart takes to load every session back.
+
+    python -m benchmarks.bench_session_store [--sessions 50000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from app.services.session_store import SessionStore
+
+
+def make_record(job_id: int, rng: random.Random) -> dict:
+    start = 1_700_000_000 + job_id
+    return {
+        "public_url": f"https://{job_id:08x}.sessions.example.com",
+        "token": f"{rng.getrandbits(128):032x}",
+        "stats": {
+            "gpu_util": rng.uniform(0, 100),
+            "gpu_mem_used_mb": rng.uniform(0, 24000),
+            "gpu_temp_c": rng.uniform(40, 85),
+            "cpu_util": rng.uniform(0, 100),
+            "ram_used_mb": rng.uniform(0, 64000),
+        },
+        "_billing_meta": {
+            "start_time": start,
+            "max_end_time": 4_000_000_000 + job_id,
+            "total_escrow_amount": 360_000,
+            "price_per_second": 100,
+        },
+        "session_start_time": start,
+        "error": None,
+    }
+
+
+def measure_memory(n: int, rng: random.Random) -> tuple:
+    tracemalloc.start()
+    records = [(j, make_record(j, rng)) for j in range(n)]
+    record_bytes = tracemalloc.get_traced_memory()[0]
+    base = record_bytes
+    plain = {j: r for j, r in records}
+    plain_bytes = tracemalloc.get_traced_memory()[0] - base
+    del plain
+    base = tracemalloc.get_traced_memory()[0]
+    store = SessionStore(max_sessions=n)
+    for j, r in records:
+        store.set(j, r)
+    store_bytes = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return record_bytes, plain_bytes, store_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=50_000)
+    parser.add_argument("--updates", type=int, default=200_000)
+    args = parser.parse_args()
+    n = args.sessions
+    rng = random.Random(1)
+    records = [(j, make_record(j, rng)) for j in range(n)]
+
+    record_bytes, plain_bytes, store_bytes = measure_memory(n, random.Random(2))
+    print(f"sessions: {n}")
+    print(f"record:              {record_bytes / n:7.0f} B/session")
+    print(f"dict index:          {plain_bytes / n:7.0f} B/session")
+    print(f"SessionStore index:  {store_bytes / n:7.0f} B/session (LRU order, deadline, heap entry, dirty set)")
+
+    ids = [rng.randrange(n) for _ in range(args.updates)]
+    plain = dict(records)
+    started = time.perf_counter()
+    for j in ids:
+        plain[j] = plain[j]
+    plain_set = (time.perf_counter() - started) / len(ids)
+    store = SessionStore(max_sessions=n)
+    for j, r in records:
+        store.set(j, r)
+    started = time.perf_counter()
+    for j in ids:
+        store.set(j, store.get(j))
+    store_set = (time.perf_counter() - started) / len(ids)
+    print(f"stats_update write:  dict {plain_set * 1e9:.0f} ns, SessionStore {store_set * 1e9:.0f} ns")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.sqlite3")
+        store = SessionStore(max_sessions=n, snapshot_path=path)
+        for j, r in records:
+            store.set(j, r)
+
+        started = time.perf_counter()
+        rows = asyncio.run(store.snapshot())
+        print(f"full snapshot:       {rows} rows in {(time.perf_counter() - started) * 1000:.0f} ms")
+        for j in rng.sample(range(n), n // 10):
+            store.set(j, store.get(j))
+        started = time.perf_counter()
+        rows = asyncio.run(store.snapshot())
+        print(f"10% dirty snapshot:  {rows} rows in {(time.perf_counter() - started) * 1000:.0f} ms")
+        store.close()
+        print(f"snapshot file:       {os.path.getsize(path) / 1e6:.1f} MB")
+
+        restarted = SessionStore(max_sessions=n, snapshot_path=path)
+        started = time.perf_counter()
+        loaded = restarted.load()
+        print(f"warm restart:        {loaded} sessions loaded in {(time.perf_counter() - started) * 1000:.0f} ms")
+        restarted.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Memory and ingest cost of per-job stats histories.
+
+Compares the ring-buffer StatsStore with keeping every sample as a dict,
+for N concurrent sessions receiving one stats_update per second.
+
+    python -m benchmarks.bench_stats_series [--sessions 5000] [--seconds 3600]
+"""
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+from app.config import get_settings
+from app.services.stats_series import StatsStore
+
+FIELDS = ("gpu_util", "gpu_mem_used_mb", "gpu_temp_c", "cpu_util", "ram_used_mb")
+
+
+def sample(rng: random.Random) -> dict:
+    return {f: rng.uniform(0, 100) for f in FIELDS}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--seconds", type=int, default=3600, help="simulated session length")
+    parser.add_argument("--timed-updates", type=int, default=200_000)
+    args = parser.parse_args()
+    rng = random.Random(1)
+    tiers = get_settings().STATS_SERIES_TIERS
+
+    # Steady-state memory: fill one series for the whole session, then size N of them.
+    store = StatsStore(tiers, max_sessions=args.sessions, idle_ttl=0)
+    tracemalloc.start()
+    t0 = 1_700_000_000
+    for job_id in range(args.sessions):
+        # Ring buffers are preallocated, so a full history costs the same as
+        # the first sample; only job 0 gets the full simulated session.
+        seconds = args.seconds if job_id == 0 else 1
+        for s in range(seconds):
+            store.record(job_id, sample(rng), ts=t0 + s)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = store.stats()
+    print(f"tiers={tiers}")
+    print(
+        f"ring buffers: {args.sessions} sessions  arrays={stats['bytes'] / 1e6:.1f} MB "
+        f"({stats['bytes_per_session']} B/session)  traced={current / 1e6:.1f} MB"
+    )
+
+    # Naive alternative: a list of (ts, dict) per job for the same session length.
+    # (keys are interned and shared, so only the tuple, dict and floats count)
+    point = (t0, sample(rng))
+    per_sample = sys.getsizeof(point) + sys.getsizeof(point[1]) + sum(sys.getsizeof(v) for v in point[1].values())
+    naive = per_sample * args.seconds * args.sessions
+    print(f"list of dicts: ~{naive / 1e6:.0f} MB for {args.seconds}s at 1Hz (unbounded)")
+
+    # Ingest cost
+    store = StatsStore(tiers, max_sessions=args.sessions, idle_ttl=0)
+    samples = [sample(rng) for _ in range(1000)]
+    started = time.perf_counter()
+    for i in range(args.timed_updates):
+        store.record(i % args.sessions, samples[i % 1000], ts=t0 + i // args.sessions)
+    elapsed = time.perf_counter() - started
+    print(f"ingest: {args.timed_updates / elapsed:,.0f} updates/s ({elapsed / args.timed_updates * 1e6:.1f} us/update)")
+
+    series = store.get(0)
+    started = time.perf_counter()
+    for _ in range(1000):
+        series.query()
+    print(f"query (coarsest tier): {(time.perf_counter() - started) * 1e3:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Simulated host agents: one WebSocket per host on /ws/{host_address}.
+
+Each agent answers the way the real agent does - pong to pings,
+session_ready / session_stopped to start / stop commands (echoing the
+command_id) - and sends a stats_update per active session every
+`stats_interval` seconds. `stats.sent_at` (wall clock) lets subscribers
+measure ingest-to-delivery latency.
+"""
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List, Optional
+
+import websockets
+
+
+class SimulatedAgent:
+    def __init__(self, ws_url: str, host_address: str, stats_interval: float = 1.0, ready_delay: float = 0.0):
+        self.url = f"{ws_url}/ws/{host_address}"
+        self.host_address = host_address
+        self.stats_interval = stats_interval
+        self.ready_delay = ready_delay
+        self.active_jobs: Dict[int, float] = {}
+        self.sending_stats = False
+        self.sent = {"stats_update": 0, "session_ready": 0, "session_stopped": 0, "pong": 0}
+        self._ws = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def connect(self):
+        # The server pings at the application level; no protocol pings needed.
+        self._ws = await websockets.connect(self.url, ping_interval=None, max_queue=None)
+        self._tasks = [asyncio.create_task(self._receive()), asyncio.create_task(self._stats())]
+
+    async def _send(self, message: dict):
+        await self._ws.send(json.dumps(message))
+        self.sent[message["status"]] += 1
+
+    async def _reply(self, command: dict, status: str, **extra):
+        reply = {"status": status, "job_id": command.get("job_id"), **extra}
+        if command.get("command_id"):
+            reply["command_id"] = command["command_id"]
+        await self._send(reply)
+
+    async def _receive(self):
+        try:
+            async for raw in self._ws:
+                command = json.loads(raw)
+                action = command.get("action")
+                if action == "ping":
+                    await self._send({"status": "pong", "ts": command.get("ts")})
+                elif action == "start_session":
+                    if self.ready_delay:
+                        await asyncio.sleep(self.ready_delay)
+                    job_id = int(command["job_id"])
+                    self.active_jobs[job_id] = time.time()
+                    await self._reply(
+                        command,
+                        "session_ready",
+                        public_url=f"https://{self.host_address[-8:]}.sessions.example/{job_id}",
+                        token=f"tok-{job_id}",
+                    )
+                elif action == "stop_session":
+                    self.active_jobs.pop(int(command["job_id"]), None)
+                    await self._reply(command, "session_stopped")
+        except websockets.ConnectionClosed:
+            pass
+
+    async def _stats(self):
+        # Spread agents over the interval instead of sending in lock-step.
+        await asyncio.sleep(random.uniform(0, self.stats_interval))
+        try:
+            while True:
+                if self.sending_stats:
+                    for job_id in list(self.active_jobs):
+                        await self._send({
+                            "status": "stats_update",
+                            "job_id": job_id,
+                            "stats": {
+                                "gpu_util": random.uniform(0, 100),
+                                "gpu_temp_c": random.uniform(40, 80),
+                                "cpu_util": random.uniform(0, 100),
+                                "sent_at": time.time(),
+                            },
+                        })
+                await asyncio.sleep(self.stats_interval)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._ws is not None:
+            await self._ws.close()
+
+
+async def connect_agents(
+    ws_url: str,
+    hosts: List[str],
+    stats_interval: float,
+    concurrency: int = 100,
+    ready_delay: float = 0.0,
+) -> List[Optional[SimulatedAgent]]:
+    """Connect one agent per host, at most `concurrency` handshakes at a time; None where it failed."""
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(host: str) -> Optional[SimulatedAgent]:
+        agent = SimulatedAgent(ws_url, host, stats_interval, ready_delay)
+        async with gate:
+            try:
+                await agent.connect()
+            except (OSError, websockets.InvalidHandshake, asyncio.TimeoutError):
+                return None
+        return agent
+
+    return await asyncio.gather(*(one(h) for h in hosts))
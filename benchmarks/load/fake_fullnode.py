@@ -0,0 +1,136 @@
+"""
+Fake Aptos fullnode for load runs.
+
+Answers POST /v1/view from recorded responses (fixtures/views.json: a list of
+response bodies per view function, keyed by the short function name) with
+configurable latency and error rate, so the API can be driven far past what a
+public fullnode would allow. Templates may use {host}, {renter}, {job_id},
+{start_time} and {max_end_time}; job N belongs to host N % FAKE_NODE_HOSTS.
+Every response carries the ledger headers, and the ledger advances by one
+version per request.
+
+Environment:
+    FAKE_NODE_LATENCY_MS   base latency per request (default 5)
+    FAKE_NODE_JITTER_MS    uniform extra latency (default 5)
+    FAKE_NODE_ERROR_RATE   fraction of requests answered 503 (default 0)
+    FAKE_NODE_HOSTS        number of hosts jobs are spread over (default 1000)
+    FAKE_NODE_FIXTURES     path to the recorded payloads
+
+    python -m uvicorn benchmarks.load.fake_fullnode:app --port 18080
+"""
+import asyncio
+import itertools
+import json
+import os
+import random
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+FIXTURES = Path(__file__).parent / "fixtures" / "views.json"
+
+LATENCY_MS = float(os.getenv("FAKE_NODE_LATENCY_MS", "5"))
+JITTER_MS = float(os.getenv("FAKE_NODE_JITTER_MS", "5"))
+ERROR_RATE = float(os.getenv("FAKE_NODE_ERROR_RATE", "0"))
+HOSTS = int(os.getenv("FAKE_NODE_HOSTS", "1000"))
+JOB_SECONDS = 3600
+
+
+def host_address(i: int) -> str:
+    return "0x" + format(i + 1, "064x")
+
+
+def renter_address(i: int) -> str:
+    return "0x" + format(0xA << 60 | (i + 1), "064x")
+
+
+def host_for_job(job_id: int) -> str:
+    return host_address(job_id % HOSTS)
+
+
+def _fill(template: Any, values: Dict[str, str]) -> Any:
+    if isinstance(template, str):
+        return template.format(**values) if "{" in template else template
+    if isinstance(template, list):
+        return [_fill(t, values) for t in template]
+    if isinstance(template, dict):
+        return {k: _fill(v, values) for k, v in template.items()}
+    return template
+
+
+class FakeFullnode:
+    def __init__(self, fixtures: Path = Path(os.getenv("FAKE_NODE_FIXTURES", FIXTURES))):
+        self.views: Dict[str, List[Any]] = json.loads(fixtures.read_text())
+        self.started = int(time.time())
+        self._version = itertools.count(1_000_000)
+        self.stats = {"requests": 0, "errors": 0}
+
+    def _values(self, function: str, arguments: List[str]) -> Dict[str, str]:
+        values = {"start_time": str(self.started), "max_end_time": str(self.started + JOB_SECONDS)}
+        arg = arguments[0] if arguments else "0"
+        if function == "get_job":
+            job_id = int(arg)
+            values.update(job_id=str(job_id), host=host_for_job(job_id), renter=renter_address(job_id))
+        elif function == "get_jobs_by_renter":
+            job_id = max((int(arg, 16) & ((1 << 60) - 1)) - 1, 0)
+            values.update(job_id=str(job_id), host=host_for_job(job_id), renter=arg)
+        else:
+            values.update(host=arg, job_id="0", renter=renter_address(0))
+        return values
+
+    def view(self, payload: Dict[str, Any]) -> Any:
+        function = payload.get("function", "").rsplit("::", 1)[-1]
+        recorded = self.views.get(function)
+        if recorded is None:
+            return None
+        return _fill(random.choice(recorded), self._values(function, payload.get("arguments") or []))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await receive()  # lifespan.startup
+            await send({"type": "lifespan.startup.complete"})
+            await receive()  # lifespan.shutdown
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        self.stats["requests"] += 1
+        await asyncio.sleep((LATENCY_MS + random.uniform(0, JITTER_MS)) / 1000)
+
+        status, content = 200, None
+        path = scope["path"]
+        if ERROR_RATE and random.random() < ERROR_RATE:
+            self.stats["errors"] += 1
+            status, content = 503, {"message": "injected failure", "error_code": "service_unavailable"}
+        elif path == "/v1/view" and scope["method"] == "POST":
+            content = self.view(json.loads(body or b"{}"))
+            if content is None:
+                status, content = 400, {"message": "unknown view function", "error_code": "invalid_input"}
+        elif "/events/" in path:
+            content = []
+        elif path == "/stats":
+            content = self.stats
+        else:
+            status, content = 404, {"message": "not found", "error_code": "resource_not_found"}
+
+        raw = json.dumps(content).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(raw)).encode()),
+                (b"x-aptos-ledger-version", str(next(self._version)).encode()),
+                (b"x-aptos-ledger-timestampusec", str(int(time.time() * 1_000_000)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": raw})
+
+
+app = FakeFullnode()
@@ -0,0 +1,383 @@
+"""
+End-to-end load run against a real API process and a fake fullnode.
+
+Starts the fake fullnode (benchmarks/load/fake_fullnode.py) and the API
+(`uvicorn app.main:app`) as subprocesses on free ports, connects N simulated
+host agents to /ws/{host} (benchmarks/load/agents.py), then runs each
+scenario in turn and reports throughput and latency percentiles:
+
+    start       POST /jobs/{id}/start?wait=  one per agent (agent replies session_ready)
+    ws_ingest   every agent streams stats_update; SSE subscribers on
+                /jobs/{id}/session/stream measure agent -> browser latency,
+                /metrics gives the server-side ingest rate
+    session     GET /jobs/{id}/session, closed loop
+    listings    GET /listings, closed loop
+    stop        POST /jobs/{id}/stop?wait=  one per agent
+
+Each run is appended to benchmarks/results/history.jsonl with the git commit
+and the run configuration; --compare prints the change against the previous
+run with the same configuration. The load generator shares the machine with
+the API, so compare runs from the same box rather than reading absolute numbers.
+
+    python -m benchmarks.load.run [--agents 1000] [--duration 10] [--concurrency 50]
+        [--latency-ms 5] [--jitter-ms 5] [--error-rate 0] [--compare]
+        [--api-env NAME=VALUE ...]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.load.agents import SimulatedAgent, connect_agents
+from benchmarks.load.fake_fullnode import host_address
+
+ROOT = Path(__file__).resolve().parents[2]
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+class Scenario:
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.statuses: Dict[int, int] = {}
+        self.elapsed = 0.0
+        self.extra: Dict[str, float] = {}
+
+    def record(self, seconds: float, ok: bool, status: Optional[int] = None):
+        self.latencies.append(seconds)
+        if not ok:
+            self.errors += 1
+        if status is not None:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def summary(self) -> Dict[str, float]:
+        lat = sorted(self.latencies)
+        out = {
+            "requests": len(lat),
+            "errors": self.errors,
+            "rps": round(len(lat) / self.elapsed, 1) if self.elapsed else 0.0,
+            "p50_ms": round(percentile(lat, 50) * 1000, 2),
+            "p99_ms": round(percentile(lat, 99) * 1000, 2),
+            "max_ms": round(lat[-1] * 1000, 2) if lat else 0.0,
+            "mean_ms": round(statistics.fmean(lat) * 1000, 2) if lat else 0.0,
+        }
+        if self.statuses:
+            out["statuses"] = {str(k): v for k, v in sorted(self.statuses.items())}
+        out.update(self.extra)
+        return out
+
+
+async def timed(scenario: Scenario, request: Awaitable[httpx.Response], ok_statuses=(200,)):
+    started = time.perf_counter()
+    try:
+        response = await request
+    except httpx.HTTPError:
+        scenario.record(time.perf_counter() - started, False)
+        return
+    scenario.record(time.perf_counter() - started, response.status_code in ok_statuses, response.status_code)
+
+
+async def closed_loop(scenario: Scenario, concurrency: int, duration: float, make_call):
+    """`concurrency` clients each issuing the next request as soon as the last one returns."""
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        while time.perf_counter() < deadline:
+            await timed(scenario, make_call())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    scenario.elapsed = time.perf_counter() - started
+
+
+async def each_once(scenario: Scenario, concurrency: int, items, make_call):
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(item):
+        async with gate:
+            await timed(scenario, make_call(item))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in items))
+    scenario.elapsed = time.perf_counter() - started
+
+
+async def metric_value(http: httpx.AsyncClient, name: str, labels: str) -> float:
+    text = (await http.get("/metrics")).text
+    match = re.search(rf"^{re.escape(name)}\{{{re.escape(labels)}\}} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+async def ws_ingest(
+    http: httpx.AsyncClient,
+    agents: List[SimulatedAgent],
+    job_ids: List[int],
+    subscribers: int,
+    duration: float,
+) -> Scenario:
+    scenario = Scenario("ws_ingest")
+    stop = asyncio.Event()
+
+    async def subscribe(job_id: int):
+        try:
+            async with http.stream("GET", f"/api/v1/jobs/{job_id}/session/stream", timeout=None) as r:
+                event = None
+                async for line in r.aiter_lines():
+                    if stop.is_set():
+                        return
+                    if line.startswith("event: "):
+                        event = line[7:]
+                    elif line.startswith("data: ") and event == "stats_update":
+                        sent_at = ((json.loads(line[6:]).get("stats") or {}).get("sent_at"))
+                        if sent_at:
+                            scenario.record(time.time() - sent_at, True)
+        except httpx.HTTPError:
+            scenario.errors += 1
+
+    streams = [asyncio.create_task(subscribe(j)) for j in random.sample(job_ids, min(subscribers, len(job_ids)))]
+    before = await metric_value(http, "ws_messages_total", 'status="stats_update"')
+    sent_before = sum(a.sent["stats_update"] for a in agents)
+    started = time.perf_counter()
+    for agent in agents:
+        agent.sending_stats = True
+    await asyncio.sleep(duration)
+    for agent in agents:
+        agent.sending_stats = False
+    scenario.elapsed = time.perf_counter() - started
+    after = await metric_value(http, "ws_messages_total", 'status="stats_update"')
+    stop.set()
+    for task in streams:
+        task.cancel()
+    await asyncio.gather(*streams, return_exceptions=True)
+
+    sent = sum(a.sent["stats_update"] for a in agents) - sent_before
+    scenario.extra = {
+        "agent_msgs_sent": sent,
+        "server_msgs_ingested": int(after - before),
+        "ingest_per_s": round((after - before) / scenario.elapsed, 1),
+    }
+    return scenario
+
+
+async def wait_for(predicate: Callable[[], Awaitable[bool]], timeout: float, what: str):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if await predicate():
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {what}")
+
+
+def start_process(args: List[str], env: Dict[str, str], log_path: Path) -> subprocess.Popen:
+    log = open(log_path, "ab")
+    return subprocess.Popen(args, cwd=ROOT, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def run(args) -> Dict:
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    node_port, api_port = free_port(), free_port()
+    node_env = {
+        "FAKE_NODE_LATENCY_MS": str(args.latency_ms),
+        "FAKE_NODE_JITTER_MS": str(args.jitter_ms),
+        "FAKE_NODE_ERROR_RATE": str(args.error_rate),
+        "FAKE_NODE_HOSTS": str(args.agents),
+    }
+    api_env = {
+        "APTOS_NODE_URLS": f"http://127.0.0.1:{node_port}/v1",
+        "INDEXER_ENABLED": "false",
+        **dict(kv.split("=", 1) for kv in args.api_env),
+    }
+    uvicorn = [sys.executable, "-m", "uvicorn", "--host", "127.0.0.1", "--log-level", "warning", "--no-access-log"]
+    processes = [
+        start_process(
+            [*uvicorn, "--port", str(node_port), "benchmarks.load.fake_fullnode:app"],
+            node_env,
+            RESULTS_DIR / "fake_fullnode.log",
+        ),
+        start_process([*uvicorn, "--port", str(api_port), "app.main:app"], api_env, RESULTS_DIR / "api.log"),
+    ]
+    agents: List[SimulatedAgent] = []
+    limits = httpx.Limits(max_connections=args.concurrency + args.subscribers + 10)
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{api_port}", limits=limits, timeout=30
+        ) as http:
+            await wait_for(lambda: _ok(http, "/healthz"), 30, "the API to start")
+
+            hosts = [host_address(i) for i in range(args.agents)]
+            started = time.perf_counter()
+            connected = await connect_agents(
+                f"ws://127.0.0.1:{api_port}", hosts, args.stats_interval, args.connect_concurrency
+            )
+            connect_seconds = time.perf_counter() - started
+            agents = [a for a in connected if a is not None]
+            print(f"connected {len(agents)}/{args.agents} agents in {connect_seconds:.1f}s")
+
+            async def listings_complete() -> bool:
+                r = await http.get("/api/v1/listings", params={"limit": 1})
+                return r.status_code == 200 and r.json()["total"] >= len(agents)
+
+            await wait_for(listings_complete, 60, "all hosts to be listed")
+
+            # Job N runs on host N (FAKE_NODE_HOSTS == --agents).
+            job_ids = list(range(args.agents))
+            scenarios: List[Scenario] = []
+
+            s = Scenario("start")
+            await each_once(
+                s, args.concurrency, job_ids,
+                lambda j: http.post(f"/api/v1/jobs/{j}/start", params={"wait": 5}),
+            )
+            scenarios.append(s)
+
+            scenarios.append(await ws_ingest(http, agents, job_ids, args.subscribers, args.duration))
+
+            s = Scenario("session")
+            await closed_loop(
+                s, args.concurrency, args.duration,
+                lambda: http.get(f"/api/v1/jobs/{random.choice(job_ids)}/session"),
+            )
+            scenarios.append(s)
+
+            s = Scenario("listings")
+            await closed_loop(
+                s, args.concurrency, args.duration,
+                lambda: http.get("/api/v1/listings", params={"limit": 20}),
+            )
+            scenarios.append(s)
+
+            s = Scenario("stop")
+            await each_once(
+                s, args.concurrency, job_ids,
+                lambda j: http.post(f"/api/v1/jobs/{j}/stop", params={"wait": 5}),
+            )
+            scenarios.append(s)
+    finally:
+        await asyncio.gather(*(a.close() for a in agents), return_exceptions=True)
+        for p in processes:
+            p.terminate()
+        for p in processes:
+            try:
+                p.wait(10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+
+    return {
+        "connect": {"agents": len(agents), "seconds": round(connect_seconds, 2)},
+        "scenarios": {s.name: s.summary() for s in scenarios},
+    }
+
+
+async def _ok(http: httpx.AsyncClient, path: str) -> bool:
+    return (await http.get(path)).status_code == 200
+
+
+def git_revision() -> Dict[str, object]:
+    def git(*cmd: str) -> str:
+        return subprocess.run(["git", *cmd], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+
+    return {"commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain", "app"))}
+
+
+def print_report(entry: Dict, previous: Optional[Dict]):
+    print(f"\ncommit {entry['commit']}{' (dirty)' if entry['dirty'] else ''}  {entry['config']}")
+    if previous:
+        print(f"compared with {previous['commit']} ({previous['timestamp']})")
+    header = f"{'scenario':<11}{'requests':>9}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, s in entry["results"]["scenarios"].items():
+        print(
+            f"{name:<11}{s['requests']:>9}{s['errors']:>8}{s['rps']:>10}"
+            f"{s['p50_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}"
+        )
+        if previous and name in previous["results"]["scenarios"]:
+            p = previous["results"]["scenarios"][name]
+            deltas = [
+                f"{key} {_change(p[key], s[key])}" for key in ("rps", "p50_ms", "p99_ms") if p.get(key)
+            ]
+            print(f"{'':<11}vs prev: " + ", ".join(deltas))
+        if "ingest_per_s" in s:
+            print(
+                f"{'':<11}agents sent {s['agent_msgs_sent']}, server ingested "
+                f"{s['server_msgs_ingested']} ({s['ingest_per_s']}/s); latency is agent -> SSE"
+            )
+
+
+def _change(old: float, new: float) -> str:
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--agents", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=10, help="seconds per timed scenario")
+    parser.add_argument("--concurrency", type=int, default=50, help="concurrent HTTP clients")
+    parser.add_argument("--subscribers", type=int, default=50, help="SSE streams during ws_ingest")
+    parser.add_argument("--stats-interval", type=float, default=1.0, help="seconds between stats_update per agent")
+    parser.add_argument("--connect-concurrency", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--jitter-ms", type=float, default=5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--api-env", action="append", default=[], metavar="NAME=VALUE")
+    parser.add_argument("--results", type=Path, default=RESULTS_DIR / "history.jsonl")
+    parser.add_argument("--compare", action="store_true", help="compare with the previous run of this config")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    config = {
+        k: getattr(args, k)
+        for k in (
+            "agents", "duration", "concurrency", "subscribers", "stats_interval",
+            "latency_ms", "jitter_ms", "error_rate", "api_env",
+        )
+    }
+    results = asyncio.run(run(args))
+    entry = {
+        **git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": config,
+        "results": results,
+    }
+
+    previous = None
+    if args.compare and args.results.exists():
+        history = [json.loads(line) for line in args.results.read_text().splitlines() if line.strip()]
+        previous = next((h for h in reversed(history) if h["config"] == config), None)
+    print_report(entry, previous)
+
+    if not args.no_save:
+        args.results.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.results, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import asyncio
+import time
+
+import httpx
+
+from app.clients.aptos import AptosClient
+from app.clients.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+PAYLOAD = {"function": "0x1::m::f", "type_arguments": [], "arguments": ["1"]}
+
+
+class FakeFullnode:
+    """MockTransport handler that answers /view after injected latency and failures."""
+
+    def __init__(self, fail_first=0, status=503, latency=0.0):
+        self.fail_first = fail_first
+        self.status = status
+        self.latency = latency
+        self.calls = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.calls <= self.fail_first:
+            if self.status is None:
+                raise httpx.ConnectError("connection refused", request=request)
+            return httpx.Response(self.status)
+        return httpx.Response(200, json=["ok"])
+
+
+def _client(node, attempts=3, failures=5, reset=10.0):
+    return AptosClient(
+        "http://fake-node/v1",
+        transport=httpx.MockTransport(node),
+        retry=RetryPolicy(attempts, base_delay=0.001, max_delay=0.002),
+        breaker_factory=lambda url: CircuitBreaker(url, failures, reset),
+    )
+
+
+def test_transient_errors_are_retried():
+    async def run():
+        for status in (503, 429, None):
+            node = FakeFullnode(fail_first=2, status=status)
+            client = _client(node)
+            assert await client.view(PAYLOAD, cache=False) == ["ok"]
+            assert node.calls == 3
+            assert client.status()["retries"] == 2
+            assert client.endpoints[0].breaker.state == "closed"
+
+    asyncio.run(run())
+
+
+def test_client_errors_are_not_retried():
+    async def run():
+        node = FakeFullnode(fail_first=5, status=400)
+        client = _client(node)
+        try:
+            await client.view(PAYLOAD, cache=False)
+        except httpx.HTTPStatusError as e:
+            assert e.response.status_code == 400
+        assert node.calls == 1
+        assert client.endpoints[0].breaker.snapshot()["failures"] == 0
+
+    asyncio.run(run())
+
+
+def test_breaker_opens_fails_fast_and_recovers():
+    async def run():
+        node = FakeFullnode(fail_first=4, status=500)
+        client = _client(node, attempts=2, failures=4, reset=0.05)
+        for _ in range(2):
+            try:
+                await client.view(PAYLOAD, cache=False)
+            except httpx.HTTPStatusError:
+                pass
+        assert client.endpoints[0].breaker.state == "open" and node.calls == 4
+
+        started = time.monotonic()
+        try:
+            await client.view(PAYLOAD, cache=False)
+        except CircuitOpenError:
+            pass
+        else:
+            raise AssertionError("expected the circuit to be open")
+        assert node.calls == 4 and time.monotonic() - started < 0.01
+
+        await asyncio.sleep(0.06)  # half-open: one probe goes through and succeeds
+        assert await client.view(PAYLOAD, cache=False) == ["ok"]
+        assert client.endpoints[0].breaker.state == "closed"
+
+    asyncio.run(run())
+
+
+def test_read_timeout_against_a_stalled_node():
+    """Real socket: the node accepts the connection but answers too late."""
+
+    async def run():
+        async def handle(reader, writer):
+            await reader.readuntil(b"\r\n\r\n")
+            await asyncio.sleep(0.2)
+            writer.close()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        client = AptosClient(
+            f"http://127.0.0.1:{port}/v1",
+            timeout=httpx.Timeout(0.05, connect=1.0),
+            retry=RetryPolicy(2, base_delay=0.001, max_delay=0.002),
+            breaker_factory=lambda url: CircuitBreaker(url, 5, 10),
+        )
+        started = time.monotonic()
+        try:
+            await client.view(PAYLOAD, cache=False)
+        except httpx.ReadTimeout:
+            pass
+        else:
+            raise AssertionError("expected a read timeout")
+        assert time.monotonic() - started < 0.19
+        assert client.status()["attempts"] == 2
+        await client.close()
+        server.close()
+
+    asyncio.run(run())
+
+
+class MultiNode:
+    """Fake fullnodes keyed by host: per-node latency, failures, and a one-off stall."""
+
+    def __init__(self, latency=None, failing=()):
+        self.latency = latency or {}
+        self.failing = set(failing)
+        self.stall_next = 0.0
+        self.calls = {}
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        self.calls[host] = self.calls.get(host, 0) + 1
+        stall, self.stall_next = self.stall_next, 0.0
+        await asyncio.sleep(stall or self.latency.get(host, 0.0))
+        if host in self.failing:
+            return httpx.Response(503)
+        return httpx.Response(200, json=[host])
+
+
+def _multi(node, hedge=False):
+    return AptosClient(
+        base_urls=["http://a/v1", "http://b/v1"],
+        transport=httpx.MockTransport(node),
+        retry=RetryPolicy(3, base_delay=0.001, max_delay=0.002),
+        breaker_factory=lambda url: CircuitBreaker(url, 5, 10),
+        hedge=hedge,
+    )
+
+
+def test_routes_to_the_faster_node():
+    async def run():
+        node = MultiNode(latency={"a": 0.02, "b": 0.001})
+        client = _multi(node)
+        for _ in range(30):
+            await client.view(PAYLOAD, cache=False)
+        assert node.calls["b"] > 25
+        stats = {e["url"]: e for e in client.status()["endpoints"]}
+        assert stats["http://a/v1"]["ewma_latency_ms"] > stats["http://b/v1"]["ewma_latency_ms"]
+
+    asyncio.run(run())
+
+
+def test_retries_fail_over_to_another_node():
+    async def run():
+        node = MultiNode(failing={"a"})
+        client = _multi(node)
+        for _ in range(10):
+            assert await client.view(PAYLOAD, cache=False) == ["b"]
+        a = client.endpoints[0]
+        assert a.stats["errors"] >= 1 and a.ewma_error > 0
+        assert client.status()["errors"] == 0
+
+    asyncio.run(run())
+
+
+def test_hedge_beats_a_stalled_node():
+    async def run():
+        node = MultiNode()
+        client = _multi(node, hedge=True)
+        for endpoint in client.endpoints:
+            for _ in range(20):
+                endpoint.record_success(0.001)
+
+        node.stall_next = 0.5  # whichever node gets the primary call hangs
+        started = time.monotonic()
+        await client.view(PAYLOAD, cache=False)
+        assert time.monotonic() - started < 0.2
+        assert client.status()["hedges"] == 1 and client.status()["hedge_wins"] == 1
+        assert sum(e.stats["cancelled"] for e in client.endpoints) == 1
+
+    asyncio.run(run())
+
+
+def test_open_breaker_is_503_on_every_route(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app.clients.aptos import aptos_client
+    from app.main import app
+
+    async def view(payload, cache=True):
+        raise CircuitOpenError("aptos", 4.2)
+
+    monkeypatch.setattr(aptos_client, "view", view)
+    c = TestClient(app)
+    for method, path in [
+        ("GET", "/api/v1/jobs/7"),
+        ("POST", "/api/v1/jobs/7/start"),
+        ("POST", "/api/v1/jobs/7/stop"),
+        ("GET", "/api/v1/hosts/0xhost"),
+        ("GET", "/api/v1/listings/0xhost"),
+        ("GET", "/api/v1/reputation/0xhost"),
+        ("GET", "/api/v1/renters/0xrenter/jobs"),
+    ]:
+        r = c.request(method, path)
+        assert r.status_code == 503, (path, r.status_code)
+        assert r.headers["Retry-After"] == "4"
+
+
+def test_cancelled_caller_settles_the_unhedged_attempt():
+    async def run():
+        node = MultiNode()
+        client = _multi(node, hedge=True)
+        for endpoint in client.endpoints:
+            for _ in range(20):
+                endpoint.record_success(1.0)  # hedge delay far in the future
+
+        node.stall_next = 5.0
+        caller = asyncio.create_task(client.view(PAYLOAD, cache=False))
+        await asyncio.sleep(0.02)  # the primary attempt is in flight
+        caller.cancel()
+        try:
+            await caller
+        except asyncio.CancelledError:
+            pass
+        assert [e.in_flight for e in client.endpoints] == [0, 0]
+        assert sum(e.stats["cancelled"] for e in client.endpoints) == 1
+        assert client.status()["hedges"] == 0
+
+    asyncio.run(run())
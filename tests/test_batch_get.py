@@ -0,0 +1,65 @@
+import httpx
+from fastapi.testclient import TestClient
+
+from app.clients.aptos import aptos_client
+from app.clients.resilience import CircuitOpenError
+from app.config import get_settings
+from app.main import app
+
+SET = get_settings()
+
+
+def _raw_job(i):
+    return {
+        "job_id": str(i), "renter_address": "0xrenter", "host_address": "0xhost",
+        "start_time": "1000", "max_end_time": "2000", "total_escrow_amount": "100",
+        "claimed_amount": "0", "is_active": True,
+    }
+
+
+def test_jobs_batch_dedupes_and_reports_per_item(monkeypatch):
+    calls = []
+
+    async def view(payload, cache=True):
+        job_id = int(payload["arguments"][0])
+        calls.append(job_id)
+        if job_id == 3:
+            return []
+        if job_id == 4:
+            raise CircuitOpenError("aptos", 2.0)
+        if job_id == 5:
+            request = httpx.Request("POST", "http://node/v1/view")
+            raise httpx.HTTPStatusError("bad gateway", request=request, response=httpx.Response(502, request=request))
+        return [_raw_job(job_id)]
+
+    monkeypatch.setattr(aptos_client, "view", view)
+    r = TestClient(app).post("/api/v1/jobs:batchGet", json={"ids": [1, 2, 1, 3, 4, 5, 2]})
+    assert r.status_code == 200
+    body = r.json()
+    assert sorted(calls) == [1, 2, 3, 4, 5]
+    assert list(body["items"]) == ["1", "2"]
+    assert body["items"]["2"]["job_id"] == 2
+    assert body["not_found"] == ["3"]
+    assert body["errors"]["4"]["status"] == 503
+    assert body["errors"]["5"]["status"] == 502
+
+
+def test_batch_limits(monkeypatch):
+    monkeypatch.setattr(SET, "BATCH_GET_MAX_IDS", 2)
+    c = TestClient(app)
+    assert c.post("/api/v1/hosts:batchGet", json={"ids": ["0xa", "0xb", "0xc"]}).status_code == 422
+    assert c.post("/api/v1/reputation:batchGet", json={"ids": []}).status_code == 422
+
+
+def test_reputation_batch(monkeypatch):
+    async def view(payload, cache=True):
+        host = payload["arguments"][0]
+        if host == "0xnew":
+            return [{"vec": []}]
+        return [{"vec": [{"completed_jobs": "3", "total_uptime_seconds": "60"}]}]
+
+    monkeypatch.setattr(aptos_client, "view", view)
+    body = TestClient(app).post("/api/v1/reputation:batchGet", json={"ids": ["0xold", "0xnew"]}).json()
+    assert body["items"] == {"0xold": {"completed_jobs": 3, "total_uptime_seconds": 60}}
+    assert body["not_found"] == ["0xnew"]
+    assert body["errors"] == {}
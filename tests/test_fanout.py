@@ -0,0 +1,87 @@
+import asyncio
+
+import httpx
+
+from app.clients.ratelimit import BULK, INTERACTIVE, call_priority
+from app.utils.fanout import AdaptiveLimiter, FanOutExecutor
+
+
+def _status_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://node/view")
+    return httpx.HTTPStatusError("boom", request=request, response=httpx.Response(status, request=request))
+
+
+def test_in_flight_is_bounded():
+    limiter = AdaptiveLimiter(initial=4, min_limit=1, max_limit=4, target_latency=1.0)
+    executor = FanOutExecutor(limiter)
+    peak = 0
+    active = 0
+
+    async def call(item):
+        nonlocal peak, active
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.001)
+        active -= 1
+        return item * 2
+
+    res = asyncio.run(executor.map(call, range(100)))
+    assert peak <= 4
+    assert res.results == {i: i * 2 for i in range(100)}
+    assert res.skipped == 0
+
+
+def test_limit_backs_off_on_429_and_reports_skipped():
+    limiter = AdaptiveLimiter(initial=32, min_limit=2, max_limit=64, target_latency=0.0001)
+    executor = FanOutExecutor(limiter)
+
+    async def call(item):
+        if item % 2:
+            raise _status_error(429)
+        return item
+
+    res = asyncio.run(executor.map(call, range(20)))
+    assert limiter.limit < 32
+    assert limiter.stats["overloads"] == 10
+    assert res.skipped == 10
+    assert executor.stats()["last_skipped"] == 10
+
+
+def test_deadline_marks_remaining_items_not_started():
+    limiter = AdaptiveLimiter(initial=1, min_limit=1, max_limit=1, target_latency=1.0)
+    executor = FanOutExecutor(limiter)
+
+    async def call(item):
+        await asyncio.sleep(0.05)
+        return item
+
+    res = asyncio.run(executor.map(call, range(10), deadline=0.02))
+    assert 0 in res.results
+    assert len(res.not_started) >= 8
+    assert res.skipped == len(res.not_started) + len(res.errors)
+
+
+def test_interactive_batch_overtakes_queued_bulk_work():
+    limiter = AdaptiveLimiter(initial=2, min_limit=2, max_limit=2, target_latency=1.0)
+    executor = FanOutExecutor(limiter)
+    done = []
+
+    async def call(item):
+        await asyncio.sleep(0.005)
+        done.append(item)
+        return item
+
+    async def run():
+        with call_priority(BULK):
+            refresh = asyncio.create_task(executor.map(call, [f"bulk{i}" for i in range(20)]))
+        await asyncio.sleep(0.001)  # the refresh holds both slots, the rest queue
+        with call_priority(INTERACTIVE):
+            batch = await executor.map(call, ["user0", "user1"])
+        assert batch.skipped == 0
+        # Only the bulk calls already in flight (and at most one more round)
+        # finished before the user's batch.
+        assert done.index("user1") <= 5
+        await refresh
+        assert executor.stats()["waiting"] == {"interactive": 0, "normal": 0, "bulk": 0}
+
+    asyncio.run(run())
@@ -0,0 +1,132 @@
+import asyncio
+
+import orjson
+
+from app.services.shared_state import InMemoryStateBackend
+from app.websockets import SUPERSEDED_CLOSE_CODE, ConnectionManager, HostQueueFull
+
+
+class _GatedSocket:
+    """Sends block until `gate` is set; `hang=True` never completes."""
+
+    def __init__(self, hang=False):
+        self.sent = []
+        self.gate = asyncio.Event()
+        self.hang = hang
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        if self.hang:
+            await asyncio.Event().wait()
+        await self.gate.wait()
+        self.sent.append(orjson.loads(text)["i"])
+
+    async def close(self, code=1000):
+        self.closed = code
+
+
+async def _drain():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_drop_oldest_keeps_latest_and_never_blocks_sender():
+    async def run():
+        manager = ConnectionManager(InMemoryStateBackend(), queue_size=2, overflow="drop_oldest")
+        sock = _GatedSocket()
+        await manager.connect(sock, "0xhost")
+        await manager.send_to_host({"i": 0}, "0xhost")
+        await _drain()  # writer takes 0 and blocks on the socket
+        for i in range(1, 6):
+            await manager.send_to_host({"i": i}, "0xhost")
+        # 1..3 were evicted
+        sock.gate.set()
+        await _drain()
+        assert sock.sent == [0, 4, 5]
+        stats = manager.queue_stats()["0xhost"]
+        assert (stats["dropped"], stats["sent"], stats["depth"]) == (3, 3, 0)
+
+    asyncio.run(run())
+
+
+def test_reject_policy_raises_when_full():
+    async def run():
+        manager = ConnectionManager(InMemoryStateBackend(), queue_size=1, overflow="reject")
+        await manager.connect(_GatedSocket(), "0xhost")
+        await manager.send_to_host({"i": 0}, "0xhost")
+        await _drain()  # writer takes 0
+        await manager.send_to_host({"i": 1}, "0xhost")
+        try:
+            await manager.send_to_host({"i": 2}, "0xhost")
+        except HostQueueFull:
+            pass
+        else:
+            raise AssertionError("expected HostQueueFull")
+        assert manager.queue_stats()["0xhost"]["rejected"] == 1
+
+    asyncio.run(run())
+
+
+def test_send_timeout_closes_socket():
+    async def run():
+        manager = ConnectionManager(InMemoryStateBackend(), send_timeout=0.01)
+        sock = _GatedSocket(hang=True)
+        await manager.connect(sock, "0xhost")
+        await manager.send_to_host({"i": 0}, "0xhost")
+        await asyncio.sleep(0.05)
+        assert sock.closed == 1011
+        stats = manager.queue_stats()["0xhost"]
+        assert stats["send_timeouts"] == 1 and stats["closed"]
+        try:
+            await manager.send_to_host({"i": 1}, "0xhost")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("closed connection should refuse sends")
+
+    asyncio.run(run())
+
+
+def test_broadcast_local_and_remote_hosts():
+    async def run():
+        state = InMemoryStateBackend()
+        a = ConnectionManager(state, worker_id="a")
+        b = ConnectionManager(state, worker_id="b")
+        await a.start()
+        await b.start()
+        socks = {h: _GatedSocket() for h in ("0x1", "0x2", "0x3")}
+        for s in socks.values():
+            s.gate.set()
+        await a.connect(socks["0x1"], "0x1")
+        await b.connect(socks["0x2"], "0x2")
+        await b.connect(socks["0x3"], "0x3")
+        await _drain()
+
+        result = await a.broadcast({"i": 7})
+        assert result == {"queued": 1, "routed": 2, "rejected": 0, "offline": 0}
+        await _drain()
+        assert all(s.sent == [7] for s in socks.values())
+
+        await a.stop()
+        await b.stop()
+
+    asyncio.run(run())
+
+
+def test_reconnect_closes_superseded_socket():
+    async def run():
+        manager = ConnectionManager(InMemoryStateBackend())
+        old, new = _GatedSocket(), _GatedSocket()
+        await manager.connect(old, "0xhost")
+        await manager.connect(new, "0xhost")
+        assert old.closed == SUPERSEDED_CLOSE_CODE
+        assert new.closed is None
+
+        # The old handler's cleanup must not drop the new connection.
+        await manager.disconnect("0xhost", old)
+        assert manager.active_connections["0xhost"].websocket is new
+
+    asyncio.run(run())
@@ -0,0 +1,29 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils.http_cache import etag_matches, stats
+
+
+def test_etag_matching():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_listings_conditional_get():
+    c = TestClient(app)
+    first = c.get("/api/v1/listings")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert "max-age" in first.headers["cache-control"]
+
+    second = c.get("/api/v1/listings", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.headers["etag"] == etag
+    assert second.content == b""
+
+    other_page = c.get("/api/v1/listings?limit=5", headers={"If-None-Match": etag})
+    assert other_page.status_code == 200
+    assert stats["listings"]["304"] >= 1
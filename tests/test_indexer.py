@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+import httpx
+
+from app.clients.aptos import AptosClient
+from app.services.indexer import EventIndexer, parse_streams
+from app.utils.fanout import make_upstream_fanout
+
+ADDR = "0xmkt"
+
+# Recorded event pages, keyed by event handle field.
+EVENTS = {
+    "job_events": [
+        {"version": "100", "sequence_number": "0", "type": f"{ADDR}::escrow::JobCreatedEvent",
+         "data": {"job_id": "1", "renter": "0xrenter", "host_address": "0xhost"}},
+        {"version": "105", "sequence_number": "1", "type": f"{ADDR}::escrow::JobCreatedEvent",
+         "data": {"job_id": "2", "renter": "0xrenter", "host_address": "0xhost"}},
+        {"version": "110", "sequence_number": "2", "type": f"{ADDR}::escrow::JobClaimedEvent",
+         "data": {"job_id": "1"}},
+    ],
+    "reputation_events": [
+        {"version": "111", "sequence_number": "0", "type": f"{ADDR}::reputation::ReputationUpdatedEvent",
+         "data": {"host": "0xhost"}},
+    ],
+}
+
+JOBS = {
+    "1": {"job_id": "1", "renter_address": "0xrenter", "host_address": "0xhost", "start_time": "10",
+          "max_end_time": "100", "total_escrow_amount": "900", "claimed_amount": "900", "is_active": False},
+    "2": {"job_id": "2", "renter_address": "0xrenter", "host_address": "0xhost", "start_time": "20",
+          "max_end_time": "200", "total_escrow_amount": "1800", "claimed_amount": "0", "is_active": True},
+}
+
+
+def fake_node(calls):
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.method == "GET" and "/events/" in request.url.path:
+            field = request.url.path.rsplit("/", 1)[-1]
+            start = int(request.url.params["start"])
+            limit = int(request.url.params["limit"])
+            return httpx.Response(200, json=EVENTS.get(field, [])[start:start + limit])
+        if request.url.path.endswith("/view"):
+            body = json.loads(request.content)
+            fn = body["function"].rsplit("::", 1)[-1]
+            arg = body["arguments"][0]
+            if fn == "get_job":
+                return httpx.Response(200, json=[JOBS[arg]])
+            if fn == "get_listing_view":
+                return httpx.Response(200, json=[{"is_available": False, "price_per_second": "9"}])
+            if fn == "get_host_reputation":
+                return httpx.Response(200, json=[{"vec": [{"completed_jobs": "1", "total_uptime_seconds": "90"}]}])
+        return httpx.Response(404)
+
+    return handler
+
+
+def _indexer(tmp_path, calls, page_size=2):
+    client = AptosClient("http://fake-node/v1", transport=httpx.MockTransport(fake_node(calls)))
+    streams = parse_streams("escrow::EscrowEvents/job_events,reputation::ReputationEvents/reputation_events", ADDR)
+    return EventIndexer(
+        client=client,
+        db_path=str(tmp_path / "index.sqlite3"),
+        streams=streams,
+        page_size=page_size,
+        poll_interval=60,
+        fanout=make_upstream_fanout(),
+        module_address=ADDR,
+    )
+
+
+def test_indexer_builds_read_model_and_checkpoints(tmp_path):
+    calls = []
+    idx = _indexer(tmp_path, calls)
+
+    async def run():
+        await idx.poll_once()
+        rm = idx.read_model_if_fresh(max_staleness=60)
+        assert rm is not None
+        assert [j["job_id"] for j in rm.jobs_by_renter("0xrenter")] == [1, 2]
+        assert rm.get_job(2)["is_active"] is True
+        assert rm.get_listing_view("0xhost")["price_per_second"] == "9"
+        assert rm.get_reputation_view("0xhost")["vec"][0]["completed_jobs"] == "1"
+        assert rm.checkpoint(idx.streams[0].key) == 3
+        assert rm.checkpoint(idx.streams[1].key) == 1
+
+        # Nothing new upstream: only the head of each stream is re-read.
+        calls.clear()
+        await idx.poll_once()
+        assert all("/events/" in c for c in calls)
+        await idx.stop()
+
+    asyncio.run(run())
+
+
+def test_indexer_resumes_from_checkpoint(tmp_path):
+    calls = []
+    asyncio.run(_run_and_stop(_indexer(tmp_path, calls)))
+    calls.clear()
+
+    resumed = _indexer(tmp_path, calls)
+    asyncio.run(_run_and_stop(resumed))
+    # Resumed at the stored sequence numbers: no entity re-fetches.
+    assert not any(c.endswith("/view") for c in calls)
+
+
+def test_stale_indexer_is_not_used(tmp_path):
+    idx = _indexer(tmp_path, [])
+    assert idx.read_model_if_fresh() is None
+
+    async def run():
+        await idx.poll_once()
+        idx.synced_at -= 3600
+        assert idx.read_model_if_fresh(max_staleness=10) is None
+        await idx.stop()
+
+    asyncio.run(run())
+
+
+async def _run_and_stop(idx):
+    await idx.poll_once()
+    await idx.stop()
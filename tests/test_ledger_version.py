@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.cache.memory_cache import cache, cache_get
+from app.cache.view_cache import ViewCache, view_cache_key
+from app.clients.aptos import AptosClient, aptos_client
+from app.main import app
+from app.services.indexer import EventIndexer, parse_streams
+from app.utils.fanout import make_upstream_fanout
+from app.utils.ledger import LedgerVersionUnavailable, observe_ledger, pinned_ledger
+
+from tests.test_indexer import ADDR, fake_node
+
+PAYLOAD = {"function": "0x1::m::f", "type_arguments": [], "arguments": ["1"]}
+
+
+def _node(seen_params):
+    def handler(request: httpx.Request) -> httpx.Response:
+        pinned = request.url.params.get("ledger_version")
+        seen_params.append(pinned)
+        if pinned == "5":
+            return httpx.Response(410, json={"error_code": "version_pruned"})
+        return httpx.Response(
+            200,
+            json=[f"at-{pinned or 'head'}"],
+            headers={"X-Aptos-Ledger-Version": "1000", "X-Aptos-Ledger-TimestampUsec": "1700000000000000"},
+        )
+
+    return handler
+
+
+def test_client_records_and_pins_ledger_version():
+    cache.clear()
+    params = []
+    client = AptosClient("http://fake-node/v1", transport=httpx.MockTransport(_node(params)))
+
+    async def run():
+        with observe_ledger() as seen:
+            assert await client.view(PAYLOAD) == ["at-head"]
+            assert await client.view(PAYLOAD) == ["at-head"]  # cache hit keeps its version
+        assert seen.oldest == 1000
+        assert client.ledger_version == 1000
+
+        with observe_ledger() as seen, pinned_ledger(900):
+            assert await client.view(PAYLOAD) == ["at-900"]  # separate cache entry
+        assert seen.oldest == 900
+
+        with pytest.raises(LedgerVersionUnavailable) as err, pinned_ledger(5):
+            await client.view(PAYLOAD)
+        assert err.value.status_code == 410
+        await client.close()
+
+    asyncio.run(run())
+    assert params == [None, "900", "5"]
+
+
+def test_invalidate_before_keeps_newer_entries():
+    cache.clear()
+    vc = ViewCache(ttls={"f": 30})
+
+    async def loader(payload):
+        return ["v"], 100
+
+    async def run():
+        await vc.get_or_load_versioned(PAYLOAD, loader)
+        assert not await vc.invalidate_before(PAYLOAD, 100)
+        assert await vc.invalidate_before(PAYLOAD, 101)
+
+    asyncio.run(run())
+    assert vc.stats["invalidations"] == 1
+
+
+def test_indexer_drops_entries_older_than_indexed_writes(tmp_path):
+    cache.clear()
+    vc = ViewCache(ttls={"get_job": 30})
+    client = AptosClient("http://fake-node/v1", transport=httpx.MockTransport(fake_node([])))
+    idx = EventIndexer(
+        client=client,
+        db_path=str(tmp_path / "index.sqlite3"),
+        streams=parse_streams("escrow::EscrowEvents/job_events", ADDR),
+        page_size=10,
+        poll_interval=60,
+        fanout=make_upstream_fanout(),
+        module_address=ADDR,
+        view_cache=vc,
+    )
+    dropped = []
+    idx.add_invalidation_listener(lambda fn, arg: dropped.append((fn, arg)))
+    job_1 = idx._payload("escrow::get_job", "1")
+
+    async def stale(payload):
+        return ["stale"], 90
+
+    async def run():
+        await vc.get_or_load_versioned(job_1, stale)
+        await idx.poll_once()
+        await idx.stop()
+        await client.close()
+
+    asyncio.run(run())
+    assert idx.stats["invalidated"] >= 1
+    assert ("get_job", "1") in dropped and ("get_jobs_by_renter", "0xrenter") in dropped
+    assert cache_get(view_cache_key(job_1)) is None
+
+
+def test_responses_report_ledger_version(monkeypatch):
+    cache.clear()
+    pins = []
+    raw_job = {
+        "job_id": "7", "renter_address": "0xrenter", "host_address": "0xhost", "start_time": "1",
+        "max_end_time": "2", "total_escrow_amount": "3", "claimed_amount": "0", "is_active": True,
+    }
+
+    async def view_at(payload, ledger_version=None):
+        pins.append(ledger_version)
+        return [raw_job], ledger_version or 42
+
+    monkeypatch.setattr(aptos_client, "_view_at", view_at)
+    c = TestClient(app)
+    r = c.get("/api/v1/jobs/7")
+    assert r.headers["X-Aptos-Ledger-Version"] == "42"
+    r = c.get("/api/v1/jobs/7", params={"ledger_version": 40})
+    assert r.headers["X-Aptos-Ledger-Version"] == "40"
+    r = c.post("/api/v1/jobs:batchGet", json={"ids": [7], "ledger_version": 41})
+    assert r.json()["items"]["7"]["job_id"] == 7
+    assert r.headers["X-Aptos-Ledger-Version"] == "41"
+    assert pins == [None, 40, 41]
+    assert "X-Aptos-Ledger-Version" not in c.get("/healthz").headers
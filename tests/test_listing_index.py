@@ -0,0 +1,68 @@
+import random
+
+from app.models.schemas import Listing, PhysicalSpecs
+from app.services.listing_index import ListingIndex
+
+GPUS = ["RTX 4090", "RTX 3090", "A100", "H100"]
+
+
+def _random_listing(rng: random.Random, i: int) -> Listing:
+    return Listing(
+        host_address=f"0x{i:06x}",
+        listing_type="Physical",
+        price_per_second=rng.randint(1, 200),
+        is_available=True,
+        physical=PhysicalSpecs(
+            gpu_model=rng.choice(GPUS), cpu_cores=rng.choice([4, 8, 16, 32, 64]), ram_gb=rng.choice([16, 32, 64, 128])
+        ),
+    )
+
+
+def _brute_force(listings, gpu, ranges, field, descending):
+    def value(l, f):
+        return l.price_per_second if f == "price_per_second" else getattr(l.physical, f)
+
+    out = [
+        l for l in listings
+        if (gpu is None or l.physical.gpu_model.lower() == gpu.lower())
+        and all((lo is None or value(l, f) >= lo) and (hi is None or value(l, f) <= hi) for f, (lo, hi) in ranges.items())
+    ]
+    return sorted(out, key=lambda l: (value(l, field), l.host_address), reverse=descending)
+
+
+def test_search_matches_brute_force_across_pages():
+    rng = random.Random(7)
+    listings = [_random_listing(rng, i) for i in range(2000)]
+    index = ListingIndex()
+    for l in listings:
+        index.upsert(l)
+    # Churn: drop some, reprice others.
+    for l in listings[:200]:
+        index.remove(l.host_address)
+    listings = listings[200:]
+    for i, l in enumerate(listings[:100]):
+        listings[i] = l.model_copy(update={"price_per_second": l.price_per_second + 1})
+        index.upsert(listings[i])
+
+    queries = [
+        (None, {}, "price_per_second", False),
+        ("rtx 4090", {"price_per_second": (None, 50), "cpu_cores": (16, None)}, "price_per_second", False),
+        ("A100", {"ram_gb": (64, None)}, "cpu_cores", True),
+        (None, {"cpu_cores": (64, 64), "ram_gb": (128, 128)}, "price_per_second", True),
+        (None, {"price_per_second": (100, 101)}, "ram_gb", False),
+    ]
+    for gpu, ranges, field, descending in queries:
+        expected = _brute_force(listings, gpu, ranges, field, descending)
+        got, after = [], None
+        while True:
+            page, after = index.search(ranges, gpu_model=gpu, sort_field=field, descending=descending, limit=37, after=after)
+            got.extend(page)
+            if after is None:
+                break
+        assert [l.host_address for l in got] == [l.host_address for l in expected]
+
+
+def test_unknown_gpu_returns_nothing():
+    index = ListingIndex()
+    index.upsert(_random_listing(random.Random(1), 1))
+    assert index.search({}, gpu_model="Voodoo 2") == ([], None)
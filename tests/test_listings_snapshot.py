@@ -0,0 +1,167 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models.schemas import Listing, PhysicalSpecs
+from app.services.listings_snapshot import ListingsSnapshot
+from app.utils.fanout import AdaptiveLimiter, FanOutExecutor, make_upstream_fanout
+from app.utils.pagination import decode_cursor, encode_cursor, keyset_paginate
+
+
+def _listing(host: str, price: int = 10) -> Listing:
+    return Listing(
+        host_address=host,
+        listing_type="Physical",
+        price_per_second=price,
+        is_available=True,
+        physical=PhysicalSpecs(gpu_model="RTX 4090", cpu_cores=16, ram_gb=64),
+    )
+
+
+def test_snapshot_tracks_connects_and_revalidation():
+    online = {}
+    chain = {"0xa": _listing("0xa"), "0xb": _listing("0xb")}
+    fetches = []
+
+    async def fetch(host):
+        fetches.append(host)
+        return chain.get(host)
+
+    snap = ListingsSnapshot(fetch, online.keys, refresh_interval=60, fanout=make_upstream_fanout())
+
+    async def run():
+        await snap.ensure_fresh()
+        assert snap.listings() == []
+
+        online["0xa"] = object()
+        snap.on_connect("0xa")
+        online["0xb"] = object()
+        snap.on_connect("0xb")
+        await asyncio.sleep(0.01)
+        assert [l.host_address for l in snap.listings()] == ["0xa", "0xb"]
+
+        # Reads do not touch the node.
+        n = len(fetches)
+        snap.listings()
+        assert len(fetches) == n
+
+        del online["0xa"]
+        snap.on_disconnect("0xa")
+        assert [l.host_address for l in snap.listings()] == ["0xb"]
+
+        # Host went unavailable on-chain: dropped on the next re-validation.
+        chain["0xb"] = None
+        await snap.refresh_all()
+        assert snap.listings() == []
+
+    asyncio.run(run())
+    stats = snap.stats()
+    assert stats["refresh_count"] == 2
+    assert stats["last_refresh_duration_seconds"] is not None
+    assert stats["age_seconds"] is not None
+
+
+def test_keyset_pages_stay_consistent_across_versions():
+    online = {f"0x{i:02d}": object() for i in range(10)}
+
+    async def fetch(host):
+        return _listing(host)
+
+    snap = ListingsSnapshot(fetch, online.keys, refresh_interval=60, fanout=make_upstream_fanout())
+    asyncio.run(snap.refresh_all())
+
+    first = snap.current()
+    page, next_key = keyset_paginate(first.items, first.keys, limit=4)
+    cursor = encode_cursor(first.version, next_key)
+
+    # A host ahead of the cursor disconnects and a new one joins mid-walk.
+    del online["0x05"]
+    snap.on_disconnect("0x05")
+    snap._apply("0x00a", _listing("0x00a"))
+    assert snap.version != first.version
+
+    version, after = decode_cursor(cursor)
+    pinned = snap.at_version(version)
+    assert pinned is first
+    rest, _ = keyset_paginate(pinned.items, pinned.keys, limit=100, after=after)
+    hosts = [l.host_address for l in page + rest]
+    assert hosts == sorted(f"0x{i:02d}" for i in range(10))
+
+
+def test_cold_start_requests_share_one_refresh():
+    online = {f"0x{i:02d}": object() for i in range(5)}
+    fetches = []
+
+    async def fetch(host):
+        fetches.append(host)
+        await asyncio.sleep(0.01)
+        return _listing(host)
+
+    snap = ListingsSnapshot(fetch, online.keys, refresh_interval=60, fanout=make_upstream_fanout())
+
+    async def run():
+        await asyncio.gather(*(snap.ensure_fresh() for _ in range(20)))
+
+    asyncio.run(run())
+    assert len(fetches) == 5
+    assert snap.refresh_count == 1
+    assert len(snap.listings()) == 5
+
+
+def test_connect_storm_goes_through_the_fanout_limiter():
+    online = {f"0x{i:02d}": object() for i in range(20)}
+    in_flight = peak = 0
+
+    async def fetch(host):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.005)
+        in_flight -= 1
+        return _listing(host)
+
+    fanout = FanOutExecutor(AdaptiveLimiter(initial=2, min_limit=1, max_limit=2, target_latency=1))
+    snap = ListingsSnapshot(fetch, online.keys, refresh_interval=60, fanout=fanout)
+
+    async def run():
+        for host in online:
+            snap.on_connect(host)
+        while snap._connecting is not None:
+            await asyncio.sleep(0.005)
+
+    asyncio.run(run())
+    assert peak <= 2
+    assert len(snap.listings()) == 20
+
+
+def test_listings_rejects_a_cursor_with_a_non_string_key():
+    c = TestClient(app)
+    for key in ({"a": 1}, 5, ["0xa"]):
+        r = c.get("/api/v1/listings", params={"cursor": encode_cursor(0, key)})
+        assert r.status_code == 400
+
+
+def test_search_cursor_is_pinned_to_its_sort_and_filters():
+    from app.routers.listings import listings_snapshot
+
+    hosts = [f"0x{i:02d}" for i in range(5)]
+    listings_snapshot.refreshed_at = listings_snapshot.refreshed_at or 1.0
+    for i, host in enumerate(hosts):
+        listings_snapshot._apply(host, _listing(host, price=10 + i))
+    c = TestClient(app)
+    try:
+        first = c.get("/api/v1/listings/search", params={"limit": 2, "max_price": 100}).json()
+        cursor = first["next_cursor"]
+        r = c.get("/api/v1/listings/search", params={"limit": 2, "max_price": 100, "cursor": cursor})
+        assert r.status_code == 200
+        assert [l["host_address"] for l in r.json()["items"]] == ["0x02", "0x03"]
+
+        assert c.get("/api/v1/listings/search", params={"sort": "price_desc", "cursor": cursor}).status_code == 400
+        assert c.get("/api/v1/listings/search", params={"max_price": 50, "cursor": cursor}).status_code == 400
+        for key in ({"a": 1}, [10, "0x00"], {"sort": "price_asc", "filters": "", "after": {"x": 1}}):
+            bad = encode_cursor(0, key)
+            assert c.get("/api/v1/listings/search", params={"cursor": bad}).status_code == 400
+    finally:
+        for host in hosts:
+            listings_snapshot._apply(host, None)
@@ -0,0 +1,82 @@
+import io
+import logging
+from unittest import mock
+
+from app.logging_config import RateLimitFilter, redact, setup_logging, stop_logging
+
+
+def _record(msg, *args, level=logging.INFO, name="app.routers.ws"):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+def test_rate_limit_per_call_site_reports_suppressed_and_keeps_warnings():
+    limit = RateLimitFilter(per_second=2)
+    with mock.patch("app.logging_config.time.monotonic", return_value=100.0):
+        passed = [limit.filter(_record("[WS] %s -> status=%s", h, "stats_update")) for h in range(5)]
+        assert passed == [True, True, False, False, False]
+        # Another template has its own budget; warnings are never dropped.
+        assert limit.filter(_record("[session] Job %s is ready", 1))
+        assert limit.filter(_record("[WS] %s -> status=%s", 9, "x", level=logging.WARNING))
+
+    with mock.patch("app.logging_config.time.monotonic", return_value=101.5):
+        record = _record("[WS] %s -> status=%s", 7, "stats_update")
+        assert limit.filter(record)
+    assert record.getMessage() == "[WS] 7 -> status=stats_update (+3 similar suppressed)"
+    assert limit.suppressed == 3
+
+
+def test_redaction_masks_tokens_in_any_shape():
+    assert redact("session_ready: job=1 url=https://h token=abc123") == "session_ready: job=1 url=https://h token=***"
+    assert redact("{'public_url': 'u', 'token': 'abc123'}") == "{'public_url': 'u', 'token': '***'}"
+    assert redact('{"token": "abc123", "job_id": 1}') == '{"token": "***", "job_id": 1}'
+    assert redact("Authorization: Bearer eyJhbGciOi.x-y") == "Authorization: Bearer ***"
+
+
+def test_queue_pipeline_levels_and_lazy_formatting():
+    out = io.StringIO()
+    formatted = []
+
+    class Probe:
+        def __str__(self):
+            formatted.append(1)
+            return "probe"
+
+    try:
+        setup_logging(level="INFO", levels={"app.noisy": "WARNING"}, rate_limit_per_second=0, stream=out)
+        logging.getLogger("app.noisy").info("dropped by level %s", Probe())
+        logging.getLogger("app.quiet").debug("dropped by root level %s", Probe())
+        logging.getLogger("app.routers.jobs").info("job %s session %s", 7, {"token": "abc"})
+        stop_logging()
+        lines = out.getvalue().splitlines()
+        assert len(lines) == 1
+        assert lines[0].endswith("| INFO | app.routers.jobs | job 7 session {'token': '***'}")
+        assert formatted == []  # filtered records are never formatted
+    finally:
+        logging.getLogger("app.noisy").setLevel(logging.NOTSET)
+        setup_logging()
+
+
+def test_uvicorn_loggers_join_the_queue_and_access_lines_are_not_limited():
+    out, direct = io.StringIO(), io.StringIO()
+    # What uvicorn's LOGGING_CONFIG leaves behind before the app is imported.
+    for name in ("uvicorn.error", "uvicorn.access"):
+        logging.getLogger(name).addHandler(logging.StreamHandler(direct))
+        logging.getLogger(name).propagate = False
+    try:
+        setup_logging(level="INFO", levels={}, rate_limit_per_second=1, stream=out)
+        for i in range(5):
+            logging.getLogger("uvicorn.access").info('%s - "%s %s HTTP/%s" %d', "1.2.3.4", "GET", f"/{i}", "1.1", 200)
+        logging.getLogger("uvicorn.error").info("Application startup complete.")
+        stop_logging()
+        assert direct.getvalue() == ""
+        lines = out.getvalue().splitlines()
+        assert len(lines) == 6
+        assert lines[4].endswith('| INFO | uvicorn.access | 1.2.3.4 - "GET /4 HTTP/1.1" 200')
+
+        # --no-access-log: uvicorn strips the handlers and stops propagation.
+        access = logging.getLogger("uvicorn.access")
+        access.handlers, access.propagate = [], False
+        setup_logging(level="INFO", levels={}, stream=out)
+        assert not access.hasHandlers()
+    finally:
+        setup_logging()
@@ -0,0 +1,47 @@
+import httpx
+from fastapi.testclient import TestClient
+
+from app.clients.aptos import aptos_client
+from app.main import app
+from app.utils import metrics
+from app.utils.metrics import Registry
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    hist = registry.histogram("lat_seconds", "Latency.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(value, "/a")
+    text = registry.render()
+    assert 'lat_seconds_bucket{route="/a",le="0.1"} 2' in text
+    assert 'lat_seconds_bucket{route="/a",le="1"} 3' in text
+    assert 'lat_seconds_bucket{route="/a",le="+Inf"} 4' in text
+    assert 'lat_seconds_count{route="/a"} 4' in text
+    assert "# TYPE lat_seconds histogram" in text
+
+
+def test_metrics_endpoint(monkeypatch):
+    raw_job = {
+        "job_id": "3", "renter_address": "0xr", "host_address": "0xh", "start_time": "1",
+        "max_end_time": "2", "total_escrow_amount": "3", "claimed_amount": "0", "is_active": True,
+    }
+
+    async def request(method, url, hedge=False, **kwargs):
+        return httpx.Response(200, json=[raw_job], request=httpx.Request(method, "http://node/v1" + url))
+
+    monkeypatch.setattr(aptos_client, "_request", request)
+    c = TestClient(app)
+    c.get("/api/v1/jobs/3", params={"ledger_version": 1})
+    c.get("/definitely/not/a/route")
+    metrics.record_ws_message("stats_update")
+    metrics.record_ws_message("made_up_status")
+
+    r = c.get("/metrics")
+    assert r.headers["content-type"].startswith("text/plain")
+    text = r.text
+    assert 'http_requests_total{method="GET",route="/api/v1/jobs/{job_id}",status="200"}' in text
+    assert 'route="unmatched",status="404"' in text
+    assert 'aptos_view_duration_seconds_count{function="get_job",outcome="ok"}' in text
+    assert 'ws_messages_total{status="stats_update"}' in text
+    assert 'ws_messages_total{status="other"}' in text
+    assert "view_cache_hit_ratio" in text and "\nsessions " in text and "ws_connected_hosts" in text
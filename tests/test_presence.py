@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+import orjson
+
+from app.services.shared_state import InMemoryStateBackend
+from app.websockets import ConnectionManager
+
+
+class _FakeSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(orjson.loads(text))
+
+    async def close(self, code=1000):
+        self.closed = code
+
+
+async def _drain():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_silent_host_is_evicted_and_listeners_fire():
+    async def run():
+        state = InMemoryStateBackend()
+        manager = ConnectionManager(state, presence_ttl=30)
+        gone = []
+        manager.add_listener(on_disconnect=gone.append)
+        live, dead = _FakeSocket(), _FakeSocket()
+        await manager.connect(live, "0xlive")
+        await manager.connect(dead, "0xdead")
+
+        for host_address in ("0xdead", "0xlive"):
+            manager.touch(host_address, pong=True)
+            manager.active_connections[host_address].last_seen -= 60
+        manager.touch("0xlive")  # e.g. a stats frame arrived
+        await manager.heartbeat_once()
+        await _drain()
+
+        assert manager.online_hosts == {"0xlive"}
+        assert gone == ["0xdead"]
+        assert dead.closed == 1011
+        assert await state.online_hosts() == {"0xlive": manager.worker_id}
+        assert live.sent[-1]["action"] == "ping"
+        presence = manager.presence()
+        assert presence["evictions"] == 1 and presence["online"] == 1
+        assert presence["hosts"]["0xlive"]["local"]
+
+    asyncio.run(run())
+
+
+def test_remote_hosts_expire_without_reannouncement():
+    async def run():
+        state = InMemoryStateBackend()
+        a = ConnectionManager(state, worker_id="a", presence_ttl=30)
+        b = ConnectionManager(state, worker_id="b", presence_ttl=30)
+        await a.start()
+        await b.start()
+        await b.connect(_FakeSocket(), "0xhost")
+        await _drain()
+        assert a.is_online("0xhost")
+
+        # b's announcements keep it alive on a...
+        a._remote_seen["0xhost"] -= 60
+        await b.heartbeat_once()
+        await _drain()
+        await a.heartbeat_once()
+        assert a.is_online("0xhost")
+
+        # ...until b goes quiet (e.g. the worker died without unregistering)
+        a._remote_seen["0xhost"] = time.monotonic() - 60
+        await a.heartbeat_once()
+        assert not a.is_online("0xhost")
+        assert a.presence()["remote_expired"] == 1
+        try:
+            await a.send_to_host({"action": "start_session"}, "0xhost")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("expired host should not be routed to")
+
+        await a.stop()
+        await b.stop()
+
+    asyncio.run(run())
+
+
+def test_eviction_spares_agents_without_pings_and_can_be_disabled():
+    async def run():
+        state = InMemoryStateBackend()
+        manager = ConnectionManager(state, heartbeat_interval=15, presence_ttl=30)
+        await manager.connect(_FakeSocket(), "0xlegacy")  # never answers pings
+        manager.active_connections["0xlegacy"].last_seen -= 600
+        await manager.heartbeat_once()
+        assert manager.is_online("0xlegacy")
+
+        off = ConnectionManager(state, worker_id="off", heartbeat_interval=0, presence_ttl=0)
+        await off.connect(_FakeSocket(), "0xhost")
+        off.touch("0xhost", pong=True)
+        off.active_connections["0xhost"].last_seen -= 600
+        await off.heartbeat_once()
+        assert off.is_online("0xhost")
+        await off.start()
+        assert len(off._tasks) == 2  # no heartbeat loop
+        await off.stop()
+
+        try:
+            ConnectionManager(state, heartbeat_interval=15, presence_ttl=10)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("a TTL shorter than the ping interval should be rejected")
+
+    asyncio.run(run())
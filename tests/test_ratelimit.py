@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+from app.clients.ratelimit import BULK, INTERACTIVE, PriorityTokenBucket, call_priority, current_priority
+
+
+def test_interactive_jumps_queued_bulk_calls():
+    async def run():
+        bucket = PriorityTokenBucket(rate=100, burst=1)
+        order = []
+
+        async def call(name, priority):
+            with call_priority(priority):
+                await bucket.acquire()
+            order.append(name)
+
+        bulk = [asyncio.create_task(call(f"bulk{i}", BULK)) for i in range(4)]
+        await asyncio.sleep(0)  # bulk0 takes the burst token, the rest queue
+        interactive = asyncio.create_task(call("user", INTERACTIVE))
+        await asyncio.gather(*bulk, interactive)
+
+        assert order[0] == "bulk0" and order[1] == "user"
+        snap = bucket.snapshot()
+        assert snap[BULK]["queued"] == 3 and snap[INTERACTIVE]["queued"] == 1
+        assert snap[BULK]["wait_ms_max"] > snap[INTERACTIVE]["wait_ms_max"]
+
+    asyncio.run(run())
+
+
+def test_rate_is_enforced_and_zero_disables():
+    async def run():
+        bucket = PriorityTokenBucket(rate=200, burst=1)
+        started = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(11)))
+        assert time.monotonic() - started >= 0.045  # 10 refills at 5ms
+
+        unlimited = PriorityTokenBucket(rate=0)
+        await asyncio.gather(*(unlimited.acquire() for _ in range(1000)))
+
+    asyncio.run(run())
+
+
+def test_priority_is_inherited_by_spawned_tasks():
+    async def run():
+        with call_priority(BULK):
+            inner = asyncio.create_task(_read_priority())
+        assert current_priority() == "normal"
+        assert await inner == BULK
+
+    async def _read_priority():
+        return current_priority()
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_does_not_leak_tokens():
+    async def run():
+        bucket = PriorityTokenBucket(rate=50, burst=1)
+        await bucket.acquire()
+        waiter = asyncio.create_task(bucket.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert bucket.snapshot()["normal"]["waiting"] == 0
+        await asyncio.wait_for(bucket.acquire(), timeout=0.1)
+
+    asyncio.run(run())
@@ -0,0 +1,85 @@
+import orjson
+from fastapi.testclient import TestClient
+
+from app.clients.aptos import aptos_client
+from app.main import app
+from app.routers import renters
+
+RENTER = "0xrenter"
+
+
+def _raw_job(i):
+    return {
+        "job_id": str(i), "renter_address": RENTER, "host_address": "0xhost",
+        "start_time": str(1000 + i), "max_end_time": str(2000 + i), "total_escrow_amount": "100",
+        "claimed_amount": "0", "is_active": i % 2 == 0,
+    }
+
+
+def _fake_view(calls, fail=False):
+    async def view(payload, cache=True):
+        calls.append(payload["function"])
+        if fail:
+            raise RuntimeError("node down")
+        return [[_raw_job(i) for i in range(25, 0, -1)]]
+
+    return view
+
+
+def test_paginated_filtered_and_cached(monkeypatch):
+    calls = []
+    monkeypatch.setattr(aptos_client, "view", _fake_view(calls))
+    renters._parsed_jobs.clear()
+    c = TestClient(app)
+
+    ids, cursor = [], None
+    while True:
+        params = {"limit": 10, "active": "true"} | ({"cursor": cursor} if cursor else {})
+        body = c.get(f"/api/v1/renters/{RENTER}/jobs", params=params).json()
+        ids += [j["job_id"] for j in body["items"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert ids == list(range(2, 26, 2))
+    assert len(calls) == 1  # parsed once, paged from the cache
+
+    newest = c.get(f"/api/v1/renters/{RENTER}/jobs", params={"order": "desc", "limit": 3}).json()
+    assert [j["job_id"] for j in newest["items"]] == [25, 24, 23]
+    ranged = c.get(
+        f"/api/v1/renters/{RENTER}/jobs", params={"started_after": 1010, "started_before": 1013}
+    ).json()
+    assert [j["job_id"] for j in ranged["items"]] == [10, 11, 12]
+    assert c.get(f"/api/v1/renters/{RENTER}/jobs", params={"cursor": "nope"}).status_code == 400
+    # A cursor from an ascending walk can't resume a descending one.
+    asc_cursor = c.get(f"/api/v1/renters/{RENTER}/jobs", params={"limit": 3}).json()["next_cursor"]
+    params = {"order": "desc", "cursor": asc_cursor}
+    assert c.get(f"/api/v1/renters/{RENTER}/jobs", params=params).status_code == 400
+
+
+def test_ndjson_stream(monkeypatch):
+    monkeypatch.setattr(aptos_client, "view", _fake_view([]))
+    monkeypatch.setattr(renters, "NDJSON_BATCH", 4)
+    renters._parsed_jobs.clear()
+    c = TestClient(app)
+    r = c.get(f"/api/v1/renters/{RENTER}/jobs", headers={"Accept": "application/x-ndjson"})
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [orjson.loads(line) for line in r.content.splitlines()]
+    assert [j["job_id"] for j in lines] == list(range(1, 26))
+    assert "x-next-cursor" not in r.headers
+
+    ids, cursor = [], None
+    while True:
+        params = {"format": "ndjson", "order": "desc", "limit": 10} | ({"cursor": cursor} if cursor else {})
+        r = c.get(f"/api/v1/renters/{RENTER}/jobs", params=params)
+        ids += [orjson.loads(line)["job_id"] for line in r.content.splitlines()]
+        cursor = r.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert ids == list(range(25, 0, -1))
+
+
+def test_upstream_errors_are_not_swallowed(monkeypatch):
+    monkeypatch.setattr(aptos_client, "view", _fake_view([], fail=True))
+    renters._parsed_jobs.clear()
+    r = TestClient(app).get(f"/api/v1/renters/{RENTER}/jobs")
+    assert r.status_code == 502
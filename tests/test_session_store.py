@@ -0,0 +1,108 @@
+import asyncio
+
+from app.services.session_store import SessionStore
+
+
+def _record(max_end_time=None, error=None):
+    meta = {"start_time": 0, "max_end_time": max_end_time} if max_end_time else None
+    return {"public_url": "https://h/s", "token": "t", "stats": None, "_billing_meta": meta, "error": error}
+
+
+def test_expiry_follows_max_end_time_without_heap_churn():
+    store = SessionStore(ttl=1000, error_ttl=10, grace=5)
+    store.set(1, _record(max_end_time=100), now=0)
+    store.set(2, _record(), now=0)  # no billing meta yet: ttl
+    store.set(3, _record(error="boom"), now=0)  # errored: error_ttl
+    for t in range(1, 10):  # stats_update every second
+        store.set(1, {**_record(max_end_time=100), "stats": {"t": t}}, now=t)
+    assert len(store._heap) == 3
+
+    assert store.expire(now=20) == 1  # job 3 (error_ttl)
+    assert 3 not in store and store.get(1, now=20)["stats"] == {"t": 9}
+    assert store.get(1, now=105) is None  # max_end_time + grace, even before a sweep
+
+    # Job 2 keeps sliding while it is written; it expires ttl after the last write.
+    store.set(2, _record(), now=900)
+    assert store.expire(now=1500) == 0 and 2 in store
+    assert store.expire(now=1900) == 1 and len(store) == 0
+    assert store.stats["expired"] == 3
+
+
+def test_lru_cap_evicts_least_recently_used():
+    store = SessionStore(max_sessions=2)
+    store.set(1, _record())
+    store.set(2, _record())
+    store.get(1)
+    store.set(3, _record())
+    assert list(store) == [1, 3]
+    assert store.stats["evicted"] == 1
+
+
+def test_snapshot_and_warm_restart(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+
+    async def run():
+        store = SessionStore(snapshot_path=path, grace=0)
+        store.set(1, _record(max_end_time=10**10))
+        store.set(2, _record(max_end_time=10**10))
+        store.set(3, _record(max_end_time=10**10))
+        assert await store.snapshot() == 3
+        assert await store.snapshot() == 0  # nothing changed
+
+        store.pop(2)
+        store.set(3, {**_record(max_end_time=10**10), "stats": {"gpu_util": 50}})
+        store.set(4, _record(max_end_time=1))  # already past max_end_time on restart
+        assert await store.snapshot() == 3
+        store.close()
+
+        restarted = SessionStore(snapshot_path=path)
+        assert restarted.load() == 2
+        assert restarted.get(3)["stats"] == {"gpu_util": 50}
+        assert 2 not in restarted and 4 not in restarted
+        restarted.close()
+
+    asyncio.run(run())
+
+
+def test_session_ready_record_expires_at_job_end(monkeypatch):
+    import time
+
+    from fastapi.testclient import TestClient
+
+    from app.clients.aptos import aptos_client
+    from app.main import app
+    from app.services.shared_state import shared_state
+
+    job = {
+        "job_id": "31", "renter_address": "0xr", "host_address": "0xh", "start_time": "1000",
+        "max_end_time": "5000", "total_escrow_amount": "4000", "claimed_amount": "0", "is_active": True,
+    }
+
+    async def view(payload, cache=True):
+        return [job]
+
+    monkeypatch.setattr(aptos_client, "view", view)
+    with TestClient(app).websocket_connect("/ws/0xh") as ws:
+        ws.send_json({"status": "session_ready", "job_id": 31, "public_url": "https://h/s", "token": "t"})
+        for _ in range(100):
+            if 31 in shared_state.sessions:
+                break
+            time.sleep(0.01)
+    store = shared_state.sessions
+    assert store._deadlines[31] == 5000 + store.grace  # not now + ttl
+    record = store.pop(31)
+    assert record["_billing_meta"]["max_end_time"] == 5000
+    assert record["_billing_meta"]["price_per_second"] == 1
+
+
+def test_start_stop_churn_does_not_grow_the_heap():
+    store = SessionStore()
+    for job_id in range(10_000):
+        store.set(job_id, _record(max_end_time=10**10))
+        store.pop(job_id)
+    assert len(store._heap) <= 64 + 1 and not store._scheduled
+    # Snapshots are off, so nothing is queued for a write that never happens.
+    assert not store._dirty and not store._deleted
+    assert store.status()["pending_writes"] == 0
+    store.set(1, _record(max_end_time=100))
+    assert store.expire(now=200) == 1
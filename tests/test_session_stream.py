@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import orjson
+
+from app.routers import jobs
+from app.services.session_events import SessionEventBus, session_events
+from app.services.shared_state import shared_state
+
+
+class _Request:
+    async def is_disconnected(self):
+        return False
+
+
+def _parse(chunk: bytes):
+    event, data = chunk.decode().strip().split("\n")
+    return event.removeprefix("event: "), orjson.loads(data.removeprefix("data: "))
+
+
+def test_stream_pushes_ready_stats_and_stop():
+    job_id = 4242
+    now = int(time.time())
+
+    async def run():
+        response = await jobs.stream_session(job_id, _Request())
+        it = response.body_iterator
+
+        assert _parse(await it.__anext__())[0] == "session_pending"
+
+        # What the WS handler does on session_ready (billing meta pre-warmed to
+        # avoid a chain call in the test).
+        shared_state.sessions[job_id] = {
+            "public_url": "https://host/jupyter",
+            "token": "t",
+            "stats": None,
+            "_billing_meta": {
+                "start_time": now - 10,
+                "max_end_time": now + 100,
+                "total_escrow_amount": 1100,
+                "price_per_second": 10,
+            },
+            "error": None,
+        }
+        session_events.publish(job_id, {"status": "session_ready", "job_id": job_id})
+        event, data = _parse(await it.__anext__())
+        assert event == "session_ready"
+        assert data["public_url"] == "https://host/jupyter"
+        assert data["uptime_seconds"] >= 10
+
+        shared_state.sessions[job_id]["stats"] = {"gpu_util": 93}
+        session_events.publish(job_id, {"status": "stats_update", "job_id": job_id})
+        event, data = _parse(await it.__anext__())
+        assert event == "stats_update"
+        assert data["stats"] == {"gpu_util": 93}
+
+        shared_state.sessions.pop(job_id)
+        session_events.publish(job_id, {"status": "session_stopped", "job_id": job_id})
+        assert _parse(await it.__anext__())[0] == "session_stopped"
+        try:
+            await it.__anext__()
+        except StopAsyncIteration:
+            pass
+        else:
+            raise AssertionError("stream should close after session_stopped")
+
+    asyncio.run(run())
+    assert session_events.subscriber_count() == 0
+
+
+def test_slow_subscriber_drops_oldest():
+    async def run():
+        bus = SessionEventBus(queue_size=2)
+        q = bus.subscribe(1)
+        for i in range(5):
+            bus.publish(1, {"i": i})
+        assert [q.get_nowait()["i"], q.get_nowait()["i"]] == [3, 4]
+        assert bus.stats["dropped"] == 3
+
+    asyncio.run(run())
@@ -0,0 +1,381 @@
+import asyncio
+
+import orjson
+
+from app.services.session_events import SessionEventBus
+from app.services.shared_state import InMemoryStateBackend
+from app.websockets import ConnectionManager
+
+
+class _FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(orjson.loads(text))
+
+    async def close(self, code=1000):
+        self.closed = code
+
+
+async def _drain():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def test_command_routed_to_owning_worker():
+    async def run():
+        state = InMemoryStateBackend()
+        a = ConnectionManager(state, worker_id="a")
+        b = ConnectionManager(state, worker_id="b")
+        await a.start()
+        await b.start()
+
+        sock = _FakeSocket()
+        await b.connect(sock, "0xhost")
+        await asyncio.sleep(0)
+        assert "0xhost" in a.online_hosts
+        assert "0xhost" not in a.active_connections
+
+        await a.send_to_host({"action": "start_session", "job_id": 7}, "0xhost")
+        await _drain()
+        assert sock.sent == [{"action": "start_session", "job_id": 7}]
+
+        await b.disconnect("0xhost")
+        await asyncio.sleep(0)
+        assert "0xhost" not in a.online_hosts
+        try:
+            await a.send_to_host({"action": "stop_session"}, "0xhost")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("send to an offline host should fail")
+
+        await a.stop()
+        await b.stop()
+
+    asyncio.run(run())
+
+
+def test_session_events_relayed_across_workers():
+    async def run():
+        state = InMemoryStateBackend()
+        a = SessionEventBus(state, worker_id="a")
+        b = SessionEventBus(state, worker_id="b")
+        await a.start()
+        await b.start()
+        qa, qb = a.subscribe(1), b.subscribe(1)
+
+        await state.set_session(1, {"public_url": "u"})
+        await a.broadcast(1, {"status": "session_ready", "job_id": 1})
+        await asyncio.sleep(0)
+
+        assert qa.qsize() == 1 and qb.qsize() == 1  # not delivered twice on the origin
+        assert await state.get_session(1) == {"public_url": "u"}
+        await a.stop()
+        await b.stop()
+
+    asyncio.run(run())
+
+
+class _AgentSocket(_FakeSocket):
+    """Replies to each command through `reply(message)`, like ws.py does."""
+
+    def __init__(self, manager, host_address, echo_id=True):
+        super().__init__()
+        self.manager = manager
+        self.host_address = host_address
+        self.echo_id = echo_id
+
+    async def send_text(self, text):
+        await super().send_text(text)
+        message = orjson.loads(text)
+        reply = {"status": "session_ready", "job_id": message["job_id"]}
+        if self.echo_id:
+            reply["command_id"] = message["command_id"]
+        asyncio.create_task(self.manager.handle_reply(self.host_address, reply))
+
+
+
+class _FlakyState(InMemoryStateBackend):
+    """Each channel's first subscription dies as a dropped connection would."""
+
+    def __init__(self):
+        super().__init__()
+        self.subscriptions = {}
+
+    async def subscribe(self, channel):
+        n = self.subscriptions[channel] = self.subscriptions.get(channel, 0) + 1
+        if n == 1:
+            raise ConnectionError("connection reset")
+        async for message in super().subscribe(channel):
+            yield message
+
+
+def test_dropped_subscriptions_are_reopened():
+    async def run():
+        state = _FlakyState()
+        bus_a = SessionEventBus(state, worker_id="a")
+        bus_b = SessionEventBus(state, worker_id="b")
+        await bus_b.start()
+        a = ConnectionManager(state, worker_id="a", heartbeat_interval=0)
+        b = ConnectionManager(state, worker_id="b", heartbeat_interval=0)
+        await a.start()
+        await b.start()
+        # Past the first reconnect backoff.
+        await asyncio.sleep(0.15)
+
+        sock = _FakeSocket()
+        await b.connect(sock, "0xhost")
+        await asyncio.sleep(0)
+        await a.send_to_host({"action": "start_session", "job_id": 7}, "0xhost")
+        queue = bus_b.subscribe(7)
+        await bus_a.broadcast(7, {"status": "ready"})
+        await _drain()
+        assert sock.sent == [{"action": "start_session", "job_id": 7}]
+        assert queue.get_nowait() == {"status": "ready"}
+        assert all(n >= 2 for n in state.subscriptions.values())
+
+        for stop in (a.stop, b.stop, bus_b.stop):
+            await stop()
+
+    asyncio.run(run())
+
+
+def test_command_to_a_host_whose_owner_is_gone_fails():
+    async def run():
+        state = InMemoryStateBackend()
+        a = ConnectionManager(state, worker_id="a", heartbeat_interval=0)
+        await a.start()
+        # A crashed worker's registry entry, still within presence_ttl.
+        await state.register_host("0xhost", "dead")
+        a._set_online("0xhost", True)
+        try:
+            await a.send_to_host({"action": "start_session", "job_id": 7}, "0xhost")
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("nobody received the routed command")
+        assert "0xhost" not in a.online_hosts
+        assert await a.broadcast({"action": "ping"}, ["0xhost"]) == {
+            "queued": 0, "routed": 0, "rejected": 0, "offline": 1,
+        }
+        await a.stop()
+
+    asyncio.run(run())
+
+def test_request_resolves_with_agent_reply():
+    async def run():
+        state = InMemoryStateBackend()
+        manager = ConnectionManager(state, worker_id="a")
+        for echo_id in (True, False):
+            await manager.connect(_AgentSocket(manager, "0xhost", echo_id=echo_id), "0xhost")
+            reply = await manager.request(
+                {"action": "start_session", "job_id": 3}, "0xhost", expects=("session_ready",), timeout=1
+            )
+            assert reply["status"] == "session_ready"
+
+        await manager.connect(_FakeSocket(), "0xhost")  # never answers
+        try:
+            await manager.request({"action": "start_session", "job_id": 3}, "0xhost", ("session_ready",), 0.01)
+        except asyncio.TimeoutError:
+            pass
+        else:
+            raise AssertionError("expected a timeout")
+
+        stats = manager.command_stats()["0xhost"]
+        assert (stats["sent"], stats["acked"], stats["timeouts"], stats["in_flight"]) == (3, 2, 1, 0)
+        assert stats["latency_ms_avg"] is not None
+
+    asyncio.run(run())
+
+
+def test_request_reply_forwarded_across_workers():
+    async def run():
+        state = InMemoryStateBackend()
+        a = ConnectionManager(state, worker_id="a")
+        b = ConnectionManager(state, worker_id="b")
+        await a.start()
+        await b.start()
+        await b.connect(_AgentSocket(b, "0xhost", echo_id=False), "0xhost")
+        await _drain()  # presence reaches a
+
+        reply = await a.request({"action": "start_session", "job_id": 9}, "0xhost", ("session_ready",), 1)
+        assert reply == {"status": "session_ready", "job_id": 9}
+        assert a.command_stats()["0xhost"]["acked"] == 1
+        assert not a._pending and not b._pending
+
+        await a.stop()
+        await b.stop()
+
+    asyncio.run(run())
+
+
+
+def test_unanswered_relays_expire_on_heartbeat():
+    async def run():
+        state = InMemoryStateBackend()
+        a = ConnectionManager(state, worker_id="a", heartbeat_interval=0)
+        b = ConnectionManager(state, worker_id="b", heartbeat_interval=0)
+        await a.start()
+        await b.start()
+        await b.connect(_FakeSocket(), "0xhost")
+        await _drain()
+
+        try:
+            await a.request({"action": "start_session", "job_id": 9}, "0xhost", ("session_ready",), 0.01)
+        except asyncio.TimeoutError:
+            pass
+        assert len(b._pending) == 1
+        # No further routed command arrives; the heartbeat sweep drops it.
+        await b.heartbeat_once()
+        assert not b._pending
+
+        await a.stop()
+        await b.stop()
+
+    asyncio.run(run())
+
+def test_update_session_merges_fields():
+    async def run():
+        state = InMemoryStateBackend()
+        assert not await state.update_session(1, {"stats": {"gpu_util": 1}})
+        assert await state.get_session(1) is None  # no record resurrected
+
+        await state.set_session(1, {"public_url": "u", "stats": None, "_billing_meta": None})
+        # A billing write based on an older read must not drop a newer stats write.
+        stale = await state.get_session(1)
+        assert await state.update_session(1, {"stats": {"gpu_util": 50}})
+        stale["_billing_meta"] = {"max_end_time": 10**10}
+        assert await state.update_session(1, {"_billing_meta": stale["_billing_meta"]})
+        record = await state.get_session(1)
+        assert record["stats"] == {"gpu_util": 50}
+        assert record["_billing_meta"] == {"max_end_time": 10**10}
+
+    asyncio.run(run())
+
+
+class _FakeRedis:
+    """
+    The slice of redis.asyncio the session methods of RedisStateBackend use,
+    with key expiry driven by `now`. The update script is emulated in Python.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.hashes = {}
+        self.expire_at = {}
+        self.zsets = {}
+
+    def _live(self, key):
+        if key in self.expire_at and self.expire_at[key] <= self.now * 1000:
+            self.hashes.pop(key, None)
+            self.expire_at.pop(key)
+        return self.hashes.get(key)
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    async def hgetall(self, key):
+        return dict(self._live(key) or {})
+
+    async def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.hashes.pop(key, None)
+            self.expire_at.pop(key, None)
+
+    async def exists(self, key):
+        return int(self._live(key) is not None)
+
+    async def pexpireat(self, key, ms):
+        self.expire_at[key] = ms
+
+    async def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    async def zrem(self, key, member):
+        self.zsets.get(key, {}).pop(member, None)
+
+    async def zremrangebyscore(self, key, low, high):
+        zset = self.zsets.get(key, {})
+        for member in [m for m, score in zset.items() if score <= high]:
+            del zset[member]
+
+    async def zcard(self, key):
+        return len(self.zsets.get(key, {}))
+
+    async def zpopmin(self, key, count):
+        zset = self.zsets.get(key, {})
+        popped = sorted(zset.items(), key=lambda kv: kv[1])[:count]
+        for member, _ in popped:
+            del zset[member]
+        return [(member.encode(), score) for member, score in popped]
+
+    async def eval(self, script, numkeys, key, index_key, deadline_ms, job_id, *pairs):
+        if self._live(key) is None:
+            return 0
+        self.hashes[key].update(dict(zip(pairs[::2], pairs[1::2])))
+        if deadline_ms != "":
+            self.expire_at[key] = deadline_ms
+            self.zsets[index_key][job_id] = deadline_ms / 1000
+        return 1
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append(getattr(self.client, name)(*args, **kwargs))
+            return self
+
+        return queue
+
+    async def execute(self):
+        return [await call for call in self.calls]
+
+
+def test_redis_sessions_expire_at_job_end_and_are_capped(monkeypatch):
+    from app.services import shared_state as module
+    from app.services.shared_state import RedisStateBackend
+
+    redis = _FakeRedis()
+    monkeypatch.setattr(module.time, "time", lambda: redis.now)
+    state = RedisStateBackend(redis, max_sessions=2, ttl=100, error_ttl=10, grace=5)
+
+    async def run():
+        await state.set_session(1, {"token": "t", "_billing_meta": {"max_end_time": 2000}})
+        await state.set_session(2, {"token": "t", "_billing_meta": None})  # ttl: 1100
+        assert redis.expire_at["axess:session:1"] == 2005_000
+        assert await state.update_session(2, {"stats": {"gpu_util": 1}})
+        assert redis.expire_at["axess:session:2"] == 1100_000  # stats don't move the deadline
+        assert await state.update_session(2, {"error": "boom"})
+        assert redis.expire_at["axess:session:2"] == 1010_000
+
+        redis.now = 1050.0
+        assert await state.get_session(2) is None
+        assert await state.session_count() == 1
+
+        # Past max_sessions the record closest to expiry is dropped.
+        await state.set_session(3, {"token": "t", "_billing_meta": {"max_end_time": 3000}})
+        await state.set_session(4, {"token": "t", "_billing_meta": {"max_end_time": 4000}})
+        assert await state.get_session(1) is None
+        assert await state.session_count() == 2
+        assert (await state.delete_session(3))["token"] == "t"
+        assert await state.session_count() == 1
+
+    asyncio.run(run())
@@ -0,0 +1,69 @@
+from app.services.session_events import SessionEventBus
+from app.services.stats_series import StatsSeries, StatsStore
+
+TIERS = [(1, 10), (10, 6), (60, 5)]
+T0 = 1_699_999_980  # multiple of 60
+
+
+def test_downsampling_across_tiers():
+    series = StatsSeries(TIERS)
+    for s in range(300):
+        series.add({"gpu_util": s, "gpu": {"temp": 50}, "name": "x"}, ts=T0 + s)
+    assert series.fields == ["gpu_util", "gpu.temp"]
+
+    fine = series.query(since=T0 + 295)
+    assert fine["resolution"] == 1
+    assert fine["t"] == [T0 + s for s in range(295, 300)]
+    assert fine["series"]["gpu_util"] == [295, 296, 297, 298, 299]
+
+    coarse = series.query()
+    assert coarse["resolution"] == 60
+    assert coarse["t"] == [T0 + 60 * i for i in range(5)]
+    assert coarse["series"]["gpu_util"][0] == 29.5  # mean of 0..59
+    assert coarse["series"]["gpu.temp"] == [50.0] * 5
+
+    # history older than the 1s tier is served from a coarser one
+    assert series.query(since=T0 + 240)["resolution"] == 10
+    assert series.query(since=T0 + 200)["resolution"] == 60  # 10s tier only holds 6 buckets
+    # re-aggregation to a resolution between tiers
+    regrouped = series.query(since=T0 + 240, resolution=30)
+    assert regrouped["resolution"] == 30
+    assert regrouped["t"] == [T0 + 240, T0 + 270]
+    assert regrouped["series"]["gpu_util"] == [254.5, 284.5]
+
+
+def test_memory_is_fixed_per_series():
+    series = StatsSeries(TIERS, max_fields=2)
+    series.add({"a": 1, "b": 2}, ts=T0)
+    size = series.nbytes()
+    for s in range(1, 5000):
+        series.add({"a": s, "b": s, "c": s}, ts=T0 + s)
+    assert series.nbytes() == size
+    assert series.fields == ["a", "b"]
+    assert series.ignored_fields == 4999
+
+
+def test_store_follows_session_events():
+    store = StatsStore(TIERS)
+    bus = SessionEventBus()
+    bus.add_listener(store.on_session_event)
+    bus.publish(1, {"status": "stats_update", "job_id": 1, "stats": {"gpu_util": 93}})
+    assert store.get(1).query()["series"]["gpu_util"] == [93.0]
+    assert store.stats()["sessions"] == 1
+    bus.publish(1, {"status": "session_stopped", "job_id": 1})
+    assert store.get(1) is None
+
+
+def test_store_drops_idle_errored_and_excess_series():
+    store = StatsStore(TIERS, max_sessions=2, idle_ttl=60)
+    store.record(1, {"gpu_util": 1}, ts=T0)
+    store.record(2, {"gpu_util": 1}, ts=T0 + 30)
+    store.record(2, {"gpu_util": 2}, ts=T0 + 90)  # job 1 went quiet 90s ago
+    assert store.get(1) is None and store.expired == 1
+
+    store.record(3, {"gpu_util": 1}, ts=T0 + 91)
+    store.record(4, {"gpu_util": 1}, ts=T0 + 92)
+    assert store.get(2) is None and store.evicted == 1
+
+    store.on_session_event(3, {"status": "session_error", "job_id": 3})
+    assert store.get(3) is None and store.get(4) is not None
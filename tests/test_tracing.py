@@ -0,0 +1,95 @@
+import asyncio
+
+import orjson
+from fastapi.testclient import TestClient
+
+from app.clients.aptos import aptos_client
+from app.main import app
+from app.utils.tracing import Trace, TracingMiddleware, TraceRecorder, _current, span
+
+
+def test_spans_form_a_tree_and_are_noops_outside_a_trace():
+    with span("orphan") as s:
+        assert s is None
+
+    trace = Trace("request", {})
+    token = _current.set(trace.root)
+
+    async def item(i):
+        with span("fanout.item", item=i):
+            await asyncio.sleep(0.001 * i)
+
+    async def run():
+        with span("fanout"):
+            await asyncio.gather(*(asyncio.create_task(item(i)) for i in range(1, 4)))
+
+    try:
+        asyncio.run(run())
+    finally:
+        _current.reset(token)
+        trace.root.end = trace.root.start + 1
+
+    (fanout,) = trace.root.children
+    assert [c.attrs["item"] for c in fanout.children] == [1, 2, 3]
+    total, n, slowest = trace.summary()["fanout.item"]
+    assert n == 3 and slowest >= 0.003
+    assert 'fanout.item;dur=' in trace.server_timing() and 'desc="n=3' in trace.server_timing()
+
+
+def test_recorder_keeps_slowest_and_samples_to_jsonl(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    recorder = TraceRecorder(sample_rate=1.0, path=str(path), slowest_n=2)
+    for ms in (5, 50, 1, 20):
+        trace = Trace("request", {"path": f"/{ms}"})
+        trace.root.end = trace.root.start + ms / 1000
+        recorder.record(trace)
+    assert recorder._writer is not None  # the file is written off the calling thread
+    recorder.close()
+    assert recorder._writer is None
+    assert [t["attrs"]["path"] for t in recorder.slowest()] == ["/50", "/20"]
+    lines = path.read_bytes().splitlines()
+    assert len(lines) == 4 and orjson.loads(lines[0])["name"] == "request"
+
+
+def test_server_timing_header(monkeypatch):
+    raw_job = {
+        "job_id": "9", "renter_address": "0xr", "host_address": "0xh", "start_time": "1",
+        "max_end_time": "2", "total_escrow_amount": "3", "claimed_amount": "0", "is_active": True,
+    }
+
+    async def view_at(payload, ledger_version=None):
+        return [raw_job], None
+
+    monkeypatch.setattr(aptos_client, "_view_at", view_at)
+    r = TestClient(app).get("/api/v1/jobs/9", params={"ledger_version": 3})
+    timing = r.headers["server-timing"]
+    assert timing.startswith("total;dur=")
+    for name in ("view.get_job", "parse", "render"):
+        assert f"{name};dur=" in timing
+
+
+def test_streamed_responses_stay_out_of_the_slowest_heap():
+    recorder = TraceRecorder(slowest_n=2)
+
+    def endpoint(content_type, delay):
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", content_type)]})
+            await asyncio.sleep(delay)
+            await send({"type": "http.response.body", "body": b""})
+        return TracingMiddleware(app, recorder)
+
+    async def sink(message):
+        pass
+
+    async def run():
+        for path, content_type, delay in (
+            ("/json", b"application/json", 0.001),
+            ("/events", b"text/event-stream", 0.02),
+            ("/ndjson", b"application/x-ndjson; charset=utf-8", 0.02),
+        ):
+            scope = {"type": "http", "method": "GET", "path": path}
+            await endpoint(content_type, delay)(scope, None, sink)
+
+    asyncio.run(run())
+    assert recorder.stats["traced"] == 3
+    assert [t["attrs"]["path"] for t in recorder.slowest()] == ["/json"]
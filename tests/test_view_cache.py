@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+from app.cache.memory_cache import cache
+from app.cache.redis_cache import RedisCache
+from app.cache.view_cache import ViewCache, view_cache_key
+
+
+def _payload(fn: str, *args):
+    return {"function": f"0x1::escrow::{fn}", "type_arguments": [], "arguments": list(args)}
+
+
+def test_key_normalizes_argument_types():
+    assert view_cache_key(_payload("get_job", 7)) == view_cache_key(_payload("get_job", "7"))
+    assert view_cache_key(_payload("get_job", 7)) != view_cache_key(_payload("get_job", 8))
+
+
+def test_concurrent_misses_are_coalesced():
+    cache.clear()
+    vc = ViewCache(ttls={"get_job": 30})
+    calls = 0
+
+    async def loader(payload):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return [{"job_id": payload["arguments"][0]}]
+
+    async def run():
+        results = await asyncio.gather(*(vc.get_or_load(_payload("get_job", "1"), loader) for _ in range(500)))
+        assert all(r == [{"job_id": "1"}] for r in results)
+        # Served from the TTL cache afterwards.
+        await vc.get_or_load(_payload("get_job", "1"), loader)
+
+    asyncio.run(run())
+    assert calls == 1
+    assert vc.stats["l1_misses"] == 500
+    assert vc.stats["coalesced"] == 499
+    assert vc.stats["l1_hits"] == 1
+
+
+def test_zero_ttl_disables_caching_and_errors_propagate():
+    cache.clear()
+    vc = ViewCache(ttls={"get_job": 0})
+    calls = 0
+
+    async def loader(payload):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("node down")
+        return ["ok"]
+
+    async def run():
+        try:
+            await vc.get_or_load(_payload("get_job", "1"), loader)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("expected upstream error")
+        assert await vc.get_or_load(_payload("get_job", "1"), loader) == ["ok"]
+        assert await vc.get_or_load(_payload("get_job", "1"), loader) == ["ok"]
+
+    asyncio.run(run())
+    assert calls == 3
+    assert vc.stats["errors"] == 1
+
+
+class FakeRedis:
+    """In-process stand-in for redis.asyncio.Redis (get/set/delete only)."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, px=None):
+        self.data[key] = value
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def aclose(self):
+        pass
+
+
+def test_l2_is_shared_between_workers():
+    cache.clear()
+    shared = RedisCache(FakeRedis())
+    worker_a = ViewCache(ttls={"get_job": 30}, l2=shared)
+    worker_b = ViewCache(ttls={"get_job": 30}, l2=shared)
+    calls = 0
+
+    async def loader(payload):
+        nonlocal calls
+        calls += 1
+        return [{"job_id": "1", "is_active": True}]
+
+    async def run():
+        assert await worker_a.get_or_load(_payload("get_job", "1"), loader) == [{"job_id": "1", "is_active": True}]
+        cache.clear()  # worker B has its own, cold L1
+        assert await worker_b.get_or_load(_payload("get_job", "1"), loader) == [{"job_id": "1", "is_active": True}]
+
+    asyncio.run(run())
+    assert calls == 1
+    assert worker_a.stats["l2_misses"] == 1
+    assert worker_b.stats["l2_hits"] == 1
+
+
+def test_l2_errors_fall_back_to_upstream():
+    cache.clear()
+
+    class BrokenRedis(FakeRedis):
+        async def get(self, key):
+            raise ConnectionError("redis down")
+
+    vc = ViewCache(ttls={"get_job": 30}, l2=RedisCache(BrokenRedis()))
+
+    async def loader(payload):
+        return ["ok"]
+
+    assert asyncio.run(vc.get_or_load(_payload("get_job", "1"), loader)) == ["ok"]
+    assert vc.stats["l2_errors"] == 1
+
+
+def test_hung_l2_times_out_and_write_through_does_not_block():
+    cache.clear()
+
+    class HungRedis(FakeRedis):
+        async def get(self, key):
+            await asyncio.Event().wait()
+
+        async def set(self, key, value, px=None):
+            await asyncio.Event().wait()
+
+    vc = ViewCache(ttls={"get_job": 30}, l2=RedisCache(HungRedis()), l2_timeout=0.02)
+
+    async def loader(payload):
+        return ["ok"]
+
+    async def run():
+        started = time.monotonic()
+        assert await vc.get_or_load(_payload("get_job", "1"), loader) == ["ok"]
+        # One get timeout; the set is still pending in the background.
+        assert time.monotonic() - started < 0.04
+        assert vc._l2_writes
+        await asyncio.sleep(0.05)
+        assert not vc._l2_writes
+
+    asyncio.run(run())
+    assert vc.stats["l2_timeouts"] == 2 and vc.stats["l2_errors"] == 2